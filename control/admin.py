@@ -15,6 +15,8 @@ test_admin.register(Course)
 test_admin.register(Discipline)
 test_admin.register(Lesson)
 test_admin.register(Group)
+test_admin.register(Enrollment)
+test_admin.register(Job)
 test_admin.register(User)
 test_admin.register(Profile)
 test_admin.register(Test)
@@ -5,3 +5,11 @@ class ControlConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = "control"
     verbose_name = "Контроль результатов обучения"
+
+    def ready(self):
+        # Подключение обработчиков сигналов, сбрасывающих кеши
+        import control.outline
+        import control.catalogue
+        import control.search
+        # Регистрация функций фоновых задач
+        import control.tasks
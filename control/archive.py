@@ -0,0 +1,69 @@
+import io
+import os
+import zipfile
+
+from django.utils import timezone
+
+from control.models import Enrollment, ResultFile
+
+
+class ZipStream(io.RawIOBase):
+    # Поток без возможности перемотки: zipfile пишет в него, а генератор
+    # сразу отдает записанные байты клиенту, не накапливая архив целиком
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def stream_zip(entries):
+    # entries - пары (имя в архиве, FieldFile); файлы читаются из хранилища частями
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, field in entries:
+            info = zipfile.ZipInfo(name, date_time=timezone.localtime().timetuple()[:6])
+            with field.open('rb'), archive.open(info, 'w', force_zip64=True) as target:
+                for chunk in field.chunks():
+                    target.write(chunk)
+                    yield stream.pop()
+            yield stream.pop()
+    yield stream.pop()
+
+
+def submission_entries(filetask, group=None, ungraded=False):
+    # Имена файлов: <группа>/<Фамилия Имя Отчество> (<логин>).<расширение>
+    results = ResultFile.objects.filter(filetask=filetask).select_related('user__profile').order_by('pk')
+    if group is not None:
+        results = results.filter(user__enrollment__group=group, user__enrollment__status=Enrollment.STUDENT)
+    if ungraded:
+        results = results.filter(accepted__isnull=True)
+    groups = Enrollment.user_groups(filetask.lesson.discipline.course_id, group=group)
+
+    used = set()
+    for result in results.iterator():
+        if not result.file:
+            continue
+        user = result.user
+        folder = "Администратор" if user.is_staff else groups.get(user.pk, "Без группы")
+        student = '{0} {1} {2} ({3})'.format(user.last_name, user.first_name, user.profile.patronymic,
+                                             user.username).replace('  ', ' ')
+        name = '{0}/{1}{2}'.format(folder, student, os.path.splitext(result.file.name)[1]).replace('\\', '_')
+        candidate, number = name, 1
+        while candidate in used:
+            number += 1
+            base, ext = os.path.splitext(name)
+            candidate = '{0} {1}{2}'.format(base, number, ext)
+        used.add(candidate)
+        yield candidate, result.file
@@ -0,0 +1,125 @@
+import json
+import platform
+import statistics
+import time
+from collections import namedtuple
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from control.models import Enrollment, ResultTest
+
+# Сценарий замера: имя, пользователь, метод, адрес, данные запроса и подготовка, не входящая в замер.
+# prepare(client) возвращает данные POST-запроса или None.
+Scenario = namedtuple('Scenario', ['name', 'user', 'method', 'url', 'prepare'])
+
+Measurement = namedtuple('Measurement', ['median_ms', 'p95_ms', 'min_ms', 'max_ms', 'queries', 'status'])
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def scenarios(dataset):
+    course = dataset.courses[0]
+    group = next(group for group in dataset.groups if group.course_id == course.pk)
+    student = Enrollment.objects.filter(group=group, status=Enrollment.STUDENT).order_by('pk').first().user
+    test = next(test for test in dataset.tests if test.lesson.discipline.course_id == course.pk)
+    lesson = test.lesson
+    test_url = reverse('test', kwargs={'slug': course.slug, 'pk': test.pk})
+
+    def fresh_attempts(client):
+        ResultTest.objects.filter(user=student).delete()
+
+    def started_attempt(client):
+        fresh_attempts(client)
+        response = client.get(test_url)
+        payload = response.context['questions']
+        data = {'deadline': response.context['deadline']}
+        for question in payload:
+            data[str(question.id)] = str(question.answers[0].id)
+        return data
+
+    return [
+        Scenario('index', student, 'get', reverse('index'), None),
+        Scenario('course', student, 'get', reverse('course', kwargs={'slug': course.slug}), None),
+        Scenario('lesson', student, 'get', reverse('lesson', kwargs={'slug': course.slug, 'pk': lesson.pk}), None),
+        Scenario('test_get', student, 'get', test_url, fresh_attempts),
+        Scenario('test_post', student, 'post', test_url, started_attempt),
+        Scenario('group_statistics', dataset.admin, 'get', reverse('group_statistics', kwargs={'pk': group.pk}),
+                 None),
+        Scenario('group_plan', dataset.admin, 'get', reverse('group_plan', kwargs={'pk': group.pk}), None),
+        Scenario('test_results', dataset.admin, 'get', reverse('test_results', kwargs={'pk': test.pk}), None),
+    ]
+
+
+def measure(scenario, repeat, warmup=2):
+    client = Client()
+    client.force_login(scenario.user)
+    timings = []
+    queries = 0
+    status = None
+    for iteration in range(warmup + repeat):
+        data = scenario.prepare(client) if scenario.prepare else None
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            if scenario.method == 'post':
+                response = client.post(scenario.url, data or {})
+            else:
+                response = client.get(scenario.url)
+            elapsed = time.perf_counter() - start
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            queries = len(captured)
+            status = response.status_code
+    return Measurement(round(statistics.median(timings), 2), round(percentile(timings, 0.95), 2),
+                       round(min(timings), 2), round(max(timings), 2), queries, status)
+
+
+def run_benchmarks(dataset, repeat, only=None):
+    results = {}
+    for scenario in scenarios(dataset):
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = measure(scenario, repeat)._asdict()
+    return results
+
+
+def report(config, repeat, results):
+    return {
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'config': config._asdict(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_report(path, data):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+
+
+def compare(previous, current, threshold):
+    # Сценарии, у которых медиана выросла больше чем на threshold (доля) или увеличилось число запросов
+    regressions = []
+    for name, after in current['results'].items():
+        before = previous['results'].get(name)
+        if before is None:
+            continue
+        ratio = after['median_ms'] / before['median_ms'] if before['median_ms'] else 1.0
+        if ratio > 1 + threshold or after['queries'] > before['queries']:
+            regressions.append((name, before, after, ratio))
+    return regressions
@@ -0,0 +1,67 @@
+import datetime
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from control.metrics import cache_lookup
+from control.models import Course, Group, Direction, Enrollment
+from control.renditions import rendition_url
+from study_control.settings import CATALOGUE_TIMEOUT
+
+
+# Карточка курса на главной странице
+CatalogueCourse = namedtuple('CatalogueCourse', ['id', 'name', 'direction_id', 'image', 'image_webp', 'description',
+                                                 'url'])
+
+Catalogue = namedtuple('Catalogue', ['courses', 'available', 'directions'])
+
+CATALOGUE_KEY = 'course_catalogue'
+
+
+def build_catalogue():
+    courses = [CatalogueCourse(course.pk, course.name, course.direction_id,
+                               rendition_url(course.image, 'card'), rendition_url(course.image, 'card', 'WEBP'),
+                               Truncator(strip_tags(course.description)).chars(50),
+                               course.get_absolute_url())
+               for course in Course.objects.all()]
+    available = set(Group.objects.filter(study_start__gt=timezone.now()).values_list('course_id', flat=True))
+    directions = list(Direction.objects.all().values_list('pk', 'name'))
+    return Catalogue(courses, [course for course in courses if course.id in available], directions)
+
+
+def seconds_to_midnight():
+    # Набор на курс закрывается по дате начала обучения - список доступных курсов меняется в полночь
+    now = timezone.localtime()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(),
+                                         tzinfo=now.tzinfo)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+def course_catalogue():
+    catalogue = cache_lookup('catalogue', cache.get(CATALOGUE_KEY))
+    if catalogue is None:
+        catalogue = build_catalogue()
+        cache.set(CATALOGUE_KEY, catalogue, min(CATALOGUE_TIMEOUT, seconds_to_midnight()))
+    return catalogue
+
+
+def my_courses(catalogue, user):
+    # Единственная часть главной страницы, вычисляемая на каждый запрос
+    ids = set(Enrollment.objects.filter(user=user, status=Enrollment.STUDENT, group__study_end__gt=timezone.now())
+              .values_list('course_id', flat=True))
+    return [course for course in catalogue.courses if course.id in ids]
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Direction)
+@receiver(post_delete, sender=Direction)
+def catalogue_changed(sender, instance, **kwargs):
+    cache.delete(CATALOGUE_KEY)
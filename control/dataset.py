@@ -0,0 +1,180 @@
+import datetime
+import random
+from collections import deque, namedtuple
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Max
+from django.utils import timezone
+
+from control.models import Profile, Direction, Course, Discipline, Lesson, Test, Question, Answer, FileTask, \
+    Group, Enrollment, LessonPlan, TestPlan, FilePlan, ResultTest, ResultFile
+from control.versions import version_answers
+
+# Размеры синтетического набора данных. Количества дисциплин, занятий, групп и т.д. задаются
+# на один родительский объект: disciplines - на курс, lessons - на дисциплину, students - на группу.
+DatasetConfig = namedtuple('DatasetConfig', [
+    'seed', 'directions', 'courses', 'teachers', 'disciplines', 'lessons', 'questions', 'answers',
+    'groups', 'students', 'attempts', 'batch_size',
+])
+DatasetConfig.__new__.__defaults__ = (1, 3, 10, 5, 3, 5, 10, 4, 2, 30, 1, 1000)
+
+# Итог генерации: созданные объекты, по которым строятся сценарии замеров
+Dataset = namedtuple('Dataset', ['admin', 'teachers', 'students', 'courses', 'groups', 'lessons', 'tests', 'files'])
+
+PASSWORD = 'password'
+
+WORDS = ['алгоритм', 'данные', 'функция', 'цикл', 'массив', 'строка', 'класс', 'объект', 'модуль', 'запрос',
+         'таблица', 'индекс', 'сеть', 'протокол', 'сервер', 'клиент', 'память', 'процесс', 'поток', 'файл']
+
+
+def bulk(model, objects, batch_size):
+    # bulk_create с получением первичных ключей и на MySQL, где bulk_create их не возвращает
+    before = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    return list(model.objects.filter(pk__gt=before).order_by('pk'))
+
+
+class DatasetBuilder:
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.label = 's{0}'.format(config.seed)
+        self.now = timezone.now()
+        self.today = datetime.date.today()
+
+    def text(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def users(self, prefix, count, is_staff=False):
+        password = make_password(PASSWORD)
+        users = bulk(User, [User(username='{0}-{1}-{2}'.format(self.label, prefix, number), password=password,
+                                 first_name='Имя{0}'.format(number), last_name='{0} {1}'.format(prefix, number),
+                                 email='{0}{1}@example.com'.format(prefix, number), is_staff=is_staff)
+                            for number in range(count)], self.config.batch_size)
+        Profile.objects.bulk_create([Profile(user=user, patronymic='Отчество') for user in users],
+                                    batch_size=self.config.batch_size)
+        return users
+
+    def build(self):
+        config = self.config
+        size = config.batch_size
+        rng = self.rng
+
+        admin = User.objects.create_superuser('{0}-admin'.format(self.label), 'admin@example.com', PASSWORD)
+        teachers = self.users('teacher', config.teachers, is_staff=True)
+
+        directions = bulk(Direction, [Direction(name='Направление {0}'.format(number))
+                                      for number in range(config.directions)], size)
+        courses = bulk(Course, [Course(name='Курс {0} {1}'.format(self.label, number),
+                                       slug='{0}-course-{1}'.format(self.label, number),
+                                       description='<p>{0}</p>'.format(self.text(60)),
+                                       owner=rng.choice(teachers), direction=rng.choice(directions))
+                                for number in range(config.courses)], size)
+        disciplines = bulk(Discipline, [Discipline(name='Дисциплина {0}'.format(number), course=course,
+                                                   teacher=rng.choice(teachers))
+                                        for course in courses for number in range(config.disciplines)], size)
+        lessons = bulk(Lesson, [Lesson(name='Занятие {0}'.format(number), discipline=discipline,
+                                       description='<p>{0}</p>'.format(self.text(120)))
+                                for discipline in disciplines for number in range(config.lessons)], size)
+        discipline_course = {discipline.pk: discipline.course_id for discipline in disciplines}
+        self.lesson_course = {lesson.pk: discipline_course[lesson.discipline_id] for lesson in lessons}
+        tests = bulk(Test, [Test(lesson=lesson, name='Тест: {0}'.format(lesson.name)) for lesson in lessons], size)
+        files = bulk(FileTask, [FileTask(lesson=lesson, name='Задание: {0}'.format(lesson.name), filetypes='1',
+                                         description='<p>{0}</p>'.format(self.text(30)))
+                                for lesson in lessons], size)
+        questions = bulk(Question, [Question(test=test, text='<p>{0}?</p>'.format(self.text(12)))
+                                    for test in tests for number in range(config.questions)], size)
+        Answer.objects.bulk_create([Answer(question=question, text=self.text(3), correct=number == 0)
+                                    for question in questions for number in range(config.answers)], batch_size=size)
+
+        start = self.today - datetime.timedelta(days=10)
+        groups = bulk(Group, [Group(name='Группа {0}-{1}'.format(course.pk, number), course=course,
+                                    max_users=config.students + 10, study_start=start,
+                                    study_end=self.today + datetime.timedelta(days=60))
+                              for course in courses for number in range(config.groups)], size)
+        students = self.users('student', config.students * len(groups))
+        members = {}
+        enrollments = []
+        for index, group in enumerate(groups):
+            members[group.pk] = students[index * config.students:(index + 1) * config.students]
+            enrollments += [Enrollment(user=student, group=group, course_id=group.course_id,
+                                       status=Enrollment.STUDENT) for student in members[group.pk]]
+        Enrollment.objects.bulk_create(enrollments, batch_size=size)
+        Group.recount_seats([group.pk for group in groups])
+
+        self.plans(groups, lessons, tests, files)
+        self.results(groups, members, tests, files)
+        return Dataset(admin, teachers, students, courses, groups, lessons, tests, files)
+
+    def plans(self, groups, lessons, tests, files):
+        size = self.config.batch_size
+        course_lessons = {}
+        for lesson in lessons:
+            course_lessons.setdefault(self.lesson_course[lesson.pk], []).append(lesson)
+        lessonplans = bulk(LessonPlan, [LessonPlan(lesson=lesson, group=group,
+                                                   start=self.now - datetime.timedelta(days=1))
+                                        for group in groups for lesson in course_lessons.get(group.course_id, [])],
+                           size)
+        test_of = {test.lesson_id: test for test in tests}
+        file_of = {filetask.lesson_id: filetask for filetask in files}
+        begin, end = self.now - datetime.timedelta(hours=1), self.now + datetime.timedelta(days=7)
+        TestPlan.objects.bulk_create([TestPlan(test=test_of[plan.lesson_id], lessonplan=plan, start=begin, end=end)
+                                      for plan in lessonplans], batch_size=size)
+        FilePlan.objects.bulk_create([FilePlan(file=file_of[plan.lesson_id], lessonplan=plan, start=begin, end=end)
+                                      for plan in lessonplans], batch_size=size)
+
+    def results(self, groups, members, tests, files):
+        # Отправленные и оцененные попытки тестов с выбранными ответами и решения файловых заданий
+        size = self.config.batch_size
+        rng = self.rng
+        versions = {test.pk: test.get_version().pk for test in tests}
+        structure = version_answers(list(versions.values()))
+        course_tests, course_files = {}, {}
+        for test in tests:
+            course_tests.setdefault(self.lesson_course[test.lesson_id], []).append(test)
+        for filetask in files:
+            course_files.setdefault(self.lesson_course[filetask.lesson_id], []).append(filetask)
+
+        attempts = []
+        uploads = []
+        for group in groups:
+            for student in members[group.pk]:
+                for test in course_tests.get(group.course_id, []):
+                    attempts += [ResultTest(test=test, user=student, start_time=self.now, end_time=self.now,
+                                            version_id=versions[test.pk], submitted=True)
+                                 for _ in range(self.config.attempts)]
+                for filetask in course_files.get(group.course_id, []):
+                    uploads.append(ResultFile(filetask=filetask, user=student,
+                                              file='files/{0}/{1}.txt'.format(filetask.pk, student.pk),
+                                              accepted=rng.choice([None, True, False])))
+        attempts = bulk(ResultTest, attempts, size)
+        through = ResultTest.given_answers.through
+        given = []
+        for result in attempts:
+            for answers in structure.get(result.version_id, []):
+                if answers:
+                    given.append(through(resulttest_id=result.pk, answersnapshot_id=rng.choice(answers)))
+            if len(given) >= size:
+                through.objects.bulk_create(given, batch_size=size)
+                given = []
+        through.objects.bulk_create(given, batch_size=size)
+        deque(ResultTest.grade_pending(ResultTest.objects.filter(submitted=True, percent__isnull=True), size),
+              maxlen=0)
+        ResultFile.objects.bulk_create(uploads, batch_size=size)
+
+
+def build_dataset(config=None):
+    return DatasetBuilder(config or DatasetConfig()).build()
+
+
+def add_dataset_arguments(parser):
+    defaults = DatasetConfig()
+    for field in DatasetConfig._fields:
+        parser.add_argument('--{0}'.format(field.replace('_', '-')), type=int, default=getattr(defaults, field),
+                            dest=field)
+
+
+def dataset_config(options):
+    return DatasetConfig(**{field: options[field] for field in DatasetConfig._fields})
@@ -0,0 +1,32 @@
+import time
+from datetime import timedelta
+
+from django.core import signing
+
+from study_control.settings import TEST_DEADLINE_GRACE
+
+SALT = 'control.deadline'
+
+
+def make_deadline(result, test):
+    # Подписанный срок сдачи попытки: вычисляется один раз при начале теста
+    deadline = result.start_time + timedelta(minutes=test.time)
+    return signing.dumps({'r': result.pk, 'd': int(deadline.timestamp())}, salt=SALT)
+
+
+def read_deadline(token):
+    # Возвращает (id попытки, срок в секундах от эпохи) или None, если подпись неверна
+    try:
+        data = signing.loads(token or '', salt=SALT)
+        return int(data['r']), int(data['d'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+def seconds_left(deadline):
+    return max(0, deadline - int(time.time()))
+
+
+def is_expired(deadline):
+    # Небольшой запас на задержку автоматической отправки формы по истечении таймера
+    return time.time() > deadline + TEST_DEADLINE_GRACE
@@ -0,0 +1,171 @@
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from control.archive import ZipStream
+from control.models import Enrollment, ResultTest
+from control.progress import ProgressMatrix
+
+# Количество строк, формируемых между отправками данных клиенту
+ROWS_PER_CHUNK = 500
+
+XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+     '</workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+
+SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+
+SHEET_TAIL = '</sheetData></worksheet>'
+
+# Управляющие символы недопустимы в XML
+ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Символы, недопустимые в имени листа Excel, и имя листа, если от названия ничего не осталось
+ILLEGAL_SHEET = re.compile(r'[\[\]:*?/\\]')
+DEFAULT_SHEET = 'Лист1'
+
+
+class Echo:
+    # Псевдобуфер для csv.writer: строка сразу возвращается генератору
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(Echo(), delimiter=';')
+    # BOM, чтобы Excel распознал UTF-8
+    yield '\ufeff'
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool) or value is None:
+        value = '' if value is None else ('Да' if value else 'Нет')
+    if isinstance(value, (int, float)):
+        return '<c><v>{0}</v></c>'.format(value)
+    text = escape(ILLEGAL_XML.sub('', str(value)))
+    return '<c t="inlineStr"><is><t xml:space="preserve">{0}</t></is></c>'.format(text)
+
+
+def sheet_name(title):
+    # Имя листа: без запрещенных символов и апострофов по краям, не длиннее 31 символа
+    name = ILLEGAL_SHEET.sub('', ILLEGAL_XML.sub('', str(title)))[:31].strip().strip("'")
+    return name or DEFAULT_SHEET
+
+
+def xlsx_stream(rows, sheet):
+    # Книга из одного листа; строки листа пишутся в архив по мере формирования
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS:
+            archive.writestr(name, content.format(sheet=escape(sheet_name(sheet), {'"': '&quot;'})))
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as target:
+            target.write(SHEET_HEAD.encode('utf-8'))
+            for number, row in enumerate(rows, 1):
+                target.write('<row>{0}</row>'.format(''.join(xlsx_cell(value) for value in row)).encode('utf-8'))
+                if number % ROWS_PER_CHUNK == 0:
+                    yield stream.pop()
+            target.write(SHEET_TAIL.encode('utf-8'))
+    yield stream.pop()
+
+
+def export_response(rows, filename, fmt, sheet):
+    if fmt == 'xlsx':
+        response = StreamingHttpResponse(
+            xlsx_stream(rows, sheet),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    else:
+        fmt = 'csv'
+        response = StreamingHttpResponse(csv_stream(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="{0}.{1}"'.format(filename, fmt)
+    return response
+
+
+def write_export(rows, path, fmt, sheet):
+    # Та же выгрузка, записанная в файл (фоновая задача)
+    stream = xlsx_stream(rows, sheet) if fmt == 'xlsx' else csv_stream(rows)
+    with open(path, 'wb') as file:
+        for chunk in stream:
+            file.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+
+def format_datetime(value):
+    if value:
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    return ''
+
+
+def test_result_rows(test):
+    # Результаты теста без выполняемых сейчас попыток; попытки читаются из БД пачками через iterator()
+    groups = Enrollment.user_groups(test.lesson.discipline.course_id)
+    yield ['Учащийся', 'Группа', 'Начало', 'Завершение', 'Набранный процент', 'Тест сдан']
+    results = ResultTest.objects.filter(test=test, percent__isnull=False).select_related('user__profile') \
+        .order_by('pk')
+    for result in results.iterator(chunk_size=2000):
+        user = result.user
+        group = "Администратор" if user.is_staff else groups.get(user.pk, '')
+        yield ['{0} {1} {2}'.format(user.last_name, user.first_name, user.profile.patronymic), group,
+               format_datetime(result.start_time), format_datetime(result.end_time), result.percent, result.passed]
+
+
+def gradebook_rows(group):
+    # Ведомость группы: учащиеся по строкам, запланированные задания по столбцам
+    matrix = ProgressMatrix(group)
+    header = ['Учащийся']
+    for discipline, lessons in matrix.planned_disciplines():
+        for lesson in lessons:
+            for test in matrix.tests[lesson.pk]:
+                if test.pk in matrix.planned_tests:
+                    header.append('{0} / {1} / {2}'.format(discipline.name, lesson.name, test.name))
+            for filetask in matrix.files[lesson.pk]:
+                if filetask.pk in matrix.planned_files:
+                    header.append('{0} / {1} / {2}'.format(discipline.name, lesson.name, filetask.name))
+    yield header
+    for row in matrix.rows():
+        student = row.student
+        cells = ['{0} {1} {2}'.format(student.last_name, student.first_name, student.profile.patronymic)]
+        for lesson_row in row.lessons:
+            cells.extend('Пройден' if status.passed else 'Не пройден' for status in lesson_row.tests)
+            cells.extend('Пройден' if status.passed else ('На проверке' if status.sended else 'Не пройден')
+                         for status in lesson_row.files)
+        yield cells
@@ -0,0 +1,124 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import django
+from django.db import connection, connections
+from django.utils import timezone
+
+from control.models import Job, ResultTest
+from control.uploads import remove_stale_partials
+from study_control.settings import JOBS_CONCURRENCY, JOBS_POLL_INTERVAL, JOBS_TIMEOUT
+
+logger = logging.getLogger('control.jobs')
+
+# Функции задач по имени; регистрируются декоратором task в control.tasks
+TASKS = {}
+
+
+def task(name=None):
+    # Функция задачи получает объект Job (для job.report) и параметры задачи
+    def register(function):
+        TASKS[name or function.__name__] = function
+        return function
+    return register
+
+
+def execute(job):
+    # Выполнение взятой задачи: результат или ошибка с повтором сохраняются в задаче
+    function = TASKS.get(job.name)
+    try:
+        if function is None:
+            raise LookupError('Неизвестная задача: {0}'.format(job.name))
+        result = function(job, **job.get_params())
+    except Exception:
+        logger.exception('%s: попытка %d из %d', job, job.attempts, job.max_attempts)
+        job.fail(traceback.format_exc())
+    else:
+        job.finish(result)
+    return job
+
+
+def run_job(job_id):
+    # Точка входа в потоке или процессе пула: собственное соединение с БД закрывается после задачи
+    try:
+        return execute(Job.objects.get(pk=job_id)).status
+    finally:
+        connection.close()
+
+
+def run_eager(job):
+    # JOBS_EAGER: задача выполняется сразу, в текущем запросе
+    Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, started=timezone.now(), heartbeat=timezone.now(),
+                                         attempts=job.attempts + 1, worker='eager')
+    job.refresh_from_db()
+    return execute(job)
+
+
+def setup_process():
+    # Процесс пула, запущенный методом spawn, заново настраивает Django
+    django.setup()
+
+
+class Worker:
+    # Опрашивает очередь и выполняет задачи в пуле потоков или процессов.
+    # Пока задача выполняется, обработчик обновляет ее heartbeat; задачи
+    # остановившихся обработчиков возвращаются в очередь через JOBS_TIMEOUT.
+
+    def __init__(self, concurrency=JOBS_CONCURRENCY, processes=False, poll_interval=JOBS_POLL_INTERVAL,
+                 once=False):
+        self.concurrency = concurrency
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.once = once
+        self.name = '{0}:{1}'.format(socket.gethostname(), os.getpid())[:64]
+        self.stopped = False
+        self.completed = 0
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def executor(self):
+        if self.processes:
+            # Дочерние процессы не должны наследовать открытые соединения с БД
+            connections.close_all()
+            return ProcessPoolExecutor(max_workers=self.concurrency, initializer=setup_process)
+        return ThreadPoolExecutor(max_workers=self.concurrency)
+
+    def run(self):
+        running = {}
+        last_check = 0.0
+        with self.executor() as pool:
+            while not self.stopped:
+                if time.monotonic() - last_check >= self.poll_interval * 10:
+                    last_check = time.monotonic()
+                    if Job.requeue_stale(JOBS_TIMEOUT):
+                        logger.warning('Задачи остановившихся обработчиков возвращены в очередь')
+                    # Попытки тестов, которые учащиеся не отправили до истечения времени
+                    ResultTest.close_expired()
+                    if remove_stale_partials():
+                        logger.info('Удалены незавершенные загрузки решений')
+                while len(running) < self.concurrency and not self.stopped:
+                    job = Job.claim(self.name)
+                    if job is None:
+                        break
+                    running[pool.submit(run_job, job.pk)] = job.pk
+                if not running:
+                    if self.once:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    self.completed += 1
+                    if future.exception() is not None:
+                        logger.error('Задача #%d: %s', job_id, future.exception())
+                Job.heartbeat_many(list(running.values()))
+            # При остановке дожидаемся начатых задач
+            for future in running:
+                future.exception()
+        return self.completed
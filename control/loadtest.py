@@ -0,0 +1,184 @@
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import build_opener, HTTPCookieProcessor, HTTPRedirectHandler, Request
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from control.benchmark import percentile
+
+# Поля страницы теста, которые читает test_base.js
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+DEADLINE_INPUT = re.compile(r'name="deadline" value="([^"]*)"')
+ANSWER_INPUT = re.compile(r'<input class="(radio|check)" name="(\d+)" type="\w+" value="(\d+)"')
+
+# Итоги по одному адресу: число запросов, ошибки, пропускная способность и задержки
+EndpointReport = namedtuple('EndpointReport', ['requests', 'errors', 'error_rate', 'throughput', 'p50_ms', 'p95_ms',
+                                               'p99_ms'])
+
+Response = namedtuple('Response', ['status', 'text'])
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # Перенаправления возвращаются как есть, чтобы проверять ответ на вход в систему
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpSession:
+    # Браузер учащегося для запущенного сервера: собственные cookie (сессия и csrftoken)
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+    def request(self, path, data=None, headers=None):
+        body = urlencode(data, doseq=True).encode() if data is not None else None
+        request = Request(self.base_url + path, data=body, headers=headers or {})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return Response(response.status, response.read().decode('utf-8', 'replace'))
+        except HTTPError as error:
+            return Response(error.code, error.read().decode('utf-8', 'replace'))
+
+    def get(self, path):
+        return self.request(path)
+
+    def post(self, path, data, ajax=False):
+        return self.request(path, data, {'X-Requested-With': 'XMLHttpRequest'} if ajax else None)
+
+
+class WsgiSession:
+    # Браузер учащегося для WSGI-приложения в том же процессе, с проверкой CSRF как на сервере
+
+    def __init__(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def get(self, path):
+        response = self.client.get(path)
+        return Response(response.status_code, response.content.decode('utf-8', 'replace'))
+
+    def post(self, path, data, ajax=False):
+        extra = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if ajax else {}
+        response = self.client.post(path, data, **extra)
+        return Response(response.status_code, response.content.decode('utf-8', 'replace'))
+
+    def close(self):
+        connection.close()
+
+
+class LoadStats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, endpoint, elapsed, ok):
+        with self.lock:
+            self.timings.setdefault(endpoint, []).append(elapsed * 1000)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + (0 if ok else 1)
+
+    def report(self):
+        duration = (self.finished or time.perf_counter()) - self.started
+        reports = {}
+        for endpoint, timings in self.timings.items():
+            errors = self.errors.get(endpoint, 0)
+            reports[endpoint] = EndpointReport(len(timings), errors, round(errors / len(timings), 4),
+                                               round(len(timings) / duration, 2) if duration else 0.0,
+                                               round(percentile(timings, 0.5), 2), round(percentile(timings, 0.95), 2),
+                                               round(percentile(timings, 0.99), 2))
+        return duration, reports
+
+
+class VirtualStudent:
+    # Прохождение теста как в браузере: вход, страница теста, периодическая синхронизация времени, отправка ответов
+
+    def __init__(self, session, stats, username, password, test_url, syncs, think, rng):
+        self.session = session
+        self.stats = stats
+        self.username = username
+        self.password = password
+        self.test_url = test_url
+        self.syncs = syncs
+        self.think = think
+        self.rng = rng
+
+    def call(self, endpoint, check, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = method(*args, **kwargs)
+        except (URLError, OSError):
+            self.stats.add(endpoint, time.perf_counter() - start, False)
+            return None
+        ok = check(response)
+        self.stats.add(endpoint, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def run(self):
+        login_url = reverse('login')
+        page = self.call('login_page', lambda r: r.status == 200, self.session.get, login_url)
+        token = CSRF_INPUT.search(page.text) if page else None
+        if token is None:
+            return False
+        if self.call('login', lambda r: r.status == 302, self.session.post, login_url,
+                     {'csrfmiddlewaretoken': token.group(1), 'username': self.username,
+                      'password': self.password}) is None:
+            return False
+
+        page = self.call('test_get', lambda r: r.status == 200 and DEADLINE_INPUT.search(r.text) is not None,
+                         self.session.get, self.test_url)
+        if page is None:
+            return False
+        token = CSRF_INPUT.search(page.text).group(1)
+        deadline = DEADLINE_INPUT.search(page.text).group(1)
+
+        for _ in range(self.syncs):
+            time.sleep(self.think)
+            self.call('sync', lambda r: r.status == 200 and '"min"' in r.text, self.session.post, reverse('sync'),
+                      {'csrfmiddlewaretoken': token, 'deadline': deadline}, ajax=True)
+
+        answers = {}
+        for kind, question, answer in ANSWER_INPUT.findall(page.text):
+            answers.setdefault(question, []).append(answer)
+        data = {'csrfmiddlewaretoken': token, 'deadline': deadline, 'question_id': list(answers)}
+        for question, choices in answers.items():
+            data[question] = [self.rng.choice(choices)]
+        return self.call('test_post', lambda r: r.status == 200 and 'Тест' in r.text, self.session.post,
+                         self.test_url, data, ajax=True) is not None
+
+
+def simulate(usernames, password, test_url, base_url=None, concurrency=None, syncs=3, think=1.0, ramp=0.0, seed=1):
+    # Запуск виртуальных учащихся в пуле потоков; base_url - адрес сервера, иначе WSGI-приложение в процессе
+    stats = LoadStats()
+    rng = random.Random(seed)
+    seeds = [rng.random() for _ in usernames]
+    delay = ramp / len(usernames) if usernames else 0
+
+    def student(index, username):
+        time.sleep(index * delay)
+        session = HttpSession(base_url) if base_url else WsgiSession()
+        try:
+            return VirtualStudent(session, stats, username, password, test_url, syncs, think,
+                                  random.Random(seeds[index])).run()
+        finally:
+            if hasattr(session, 'close'):
+                session.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency or len(usernames) or 1) as pool:
+        completed = sum(1 for ok in pool.map(student, range(len(usernames)), usernames) if ok)
+    stats.finished = time.perf_counter()
+    duration, reports = stats.report()
+    return completed, duration, reports
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from control.benchmark import run_benchmarks, report, save_report, load_report, compare
+from control.dataset import add_dataset_arguments, dataset_config, build_dataset
+
+
+class Command(BaseCommand):
+    help = 'Замер времени основных страниц на синтетических данных во временной БД SQLite. ' \
+           'Запуск: manage.py benchmark --settings=study_control.settings_benchmark'
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров каждого сценария')
+        parser.add_argument('--only', nargs='*', help='Имена сценариев для замера')
+        parser.add_argument('--output', default='benchmark.json', help='Файл для сохранения результатов')
+        parser.add_argument('--compare', help='Файл результатов предыдущего запуска для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост медианы относительно предыдущего запуска (доля)')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Завершаться с ошибкой при обнаружении регрессий')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замеры выполняются на SQLite: укажите --settings=study_control.settings_benchmark')
+        config = dataset_config(options)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            dataset = build_dataset(config)
+            results = run_benchmarks(dataset, options['repeat'], options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        data = report(config, options['repeat'], results)
+        save_report(options['output'], data)
+        for name, result in results.items():
+            self.stdout.write('{0:<20} median {1:>9.2f} ms  p95 {2:>9.2f} ms  queries {3:>4}  status {4}'.format(
+                name, result['median_ms'], result['p95_ms'], result['queries'], result['status']))
+        self.stdout.write('Результаты сохранены в {0}'.format(options['output']))
+
+        if options['compare']:
+            regressions = compare(load_report(options['compare']), data, options['threshold'])
+            for name, before, after, ratio in regressions:
+                self.stdout.write(self.style.WARNING(
+                    '{0}: median {1} -> {2} ms (x{3:.2f}), queries {4} -> {5}'.format(
+                        name, before['median_ms'], after['median_ms'], ratio, before['queries'],
+                        after['queries'])))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('Регрессий не обнаружено.'))
+            elif options['fail_on_regression']:
+                raise CommandError('Обнаружены регрессии: {0}'.format(len(regressions)))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from control.search import rebuild_documents, create_index
+
+
+class Command(BaseCommand):
+    help = 'Заполнение таблицы поисковых документов и создание полнотекстового индекса (SQLite FTS5 / MySQL FULLTEXT)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество вопросов, индексируемых за один запрос')
+
+    def handle(self, *args, **options):
+        total = rebuild_documents(options['batch_size'])
+        self.stdout.write('Проиндексировано документов: {0}'.format(total))
+        if create_index():
+            self.stdout.write(self.style.SUCCESS('Готово. Полнотекстовый индекс создан.'))
+        else:
+            self.stdout.write(self.style.WARNING('СУБД без поддержки полнотекстового индекса, поиск будет идти через LIKE.'))
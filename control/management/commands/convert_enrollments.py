@@ -0,0 +1,41 @@
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+
+from control.models import Group, Enrollment
+
+# Таблицы прежних полей Group.students и Group.requests
+LEGACY_TABLES = (
+    ('control_group_students', Enrollment.STUDENT),
+    ('control_group_requests', Enrollment.REQUEST),
+)
+
+
+class Command(BaseCommand):
+    help = 'Перенос учащихся и заявок из прежних связей группы с пользователями в Enrollment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество записей, создаваемых за один запрос')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        existing = set(connection.introspection.table_names())
+        courses = dict(Group.objects.values_list('pk', 'course_id'))
+
+        total = 0
+        with transaction.atomic():
+            # Учащиеся переносятся первыми: при совпадении пары зачисление важнее заявки
+            for table, status in LEGACY_TABLES:
+                if table not in existing:
+                    self.stdout.write('Таблица {0} не найдена, пропускаю'.format(table))
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT group_id, user_id FROM {0} ORDER BY id'.format(
+                        connection.ops.quote_name(table)))
+                    rows = [Enrollment(group_id=group_id, course_id=courses[group_id], user_id=user_id, status=status)
+                            for group_id, user_id in cursor.fetchall() if group_id in courses]
+                Enrollment.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+                total += len(rows)
+                self.stdout.write('{0}: прочитано записей {1}'.format(table, len(rows)))
+            Group.recount_seats(list(courses))
+        self.stdout.write(self.style.SUCCESS('Готово. Всего перенесено записей: {0}'.format(total)))
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from control.models import ResultTest, ResultQuestion
+from control.versions import get_or_create_version, version_answers
+
+
+class Command(BaseCommand):
+    help = 'Перевод старых попыток (копии вопросов в ResultQuestion) на общие версии тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Количество попыток, переводимых за одну транзакцию')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        results = ResultTest.objects.filter(version__isnull=True, resultquestion__isnull=False).distinct()
+
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(results.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                self.convert(batch)
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write('Переведено попыток: {0}'.format(total))
+        self.stdout.write(self.style.SUCCESS('Готово. Всего переведено попыток: {0}'.format(total)))
+
+    def convert(self, batch):
+        contents = {result.pk: [] for result in batch}
+        given = {result.pk: [] for result in batch}
+        questions = ResultQuestion.objects.filter(test__in=batch).order_by('pk').prefetch_related('resultanswer')
+        for question in questions:
+            answers = sorted(question.resultanswer.all(), key=lambda answer: answer.pk)
+            contents[question.test_id].append((question.text, [(answer.text, answer.correct) for answer in answers]))
+            given[question.test_id].append([position for position, answer in enumerate(answers) if answer.given])
+
+        for result in batch:
+            result.version = get_or_create_version(result.test_id, contents[result.pk])
+        answers = version_answers({result.version_id for result in batch})
+
+        through = ResultTest.given_answers.through
+        rows = []
+        for result in batch:
+            for answer_ids, positions in zip(answers.get(result.version_id, []), given[result.pk]):
+                rows.extend(through(resulttest_id=result.pk, answersnapshot_id=answer_ids[position])
+                            for position in positions)
+        through.objects.bulk_create(rows, ignore_conflicts=True)
+        ResultTest.objects.bulk_update(batch, ['version'])
+        ResultQuestion.objects.filter(test__in=batch).delete()
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from control.models import ResultTest
+
+
+class Command(BaseCommand):
+    help = 'Пересчет сохраненных результатов тестов (процент, отметка о сдаче) пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество попыток, оцениваемых за один проход')
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать все попытки, а не только неоцененные')
+
+    def handle(self, *args, **options):
+        # Попытки, отправленные до появления отметки submitted: при отправке end_time сдвигается от start_time
+        marked = ResultTest.objects.filter(submitted=False, end_time__gt=F('start_time')).update(submitted=True)
+        self.stdout.write('Отмечено отправленных попыток: {0}'.format(marked))
+
+        closed = ResultTest.close_expired()
+        self.stdout.write('Закрыто попыток с истекшим временем: {0}'.format(closed))
+
+        # Выполняемые попытки не оцениваются
+        results = ResultTest.objects.filter(submitted=True)
+        if not options['all']:
+            results = results.filter(percent__isnull=True)
+
+        total = 0
+        for total in ResultTest.grade_pending(results, options['batch_size']):
+            self.stdout.write('Оценено попыток: {0}'.format(total))
+        self.stdout.write(self.style.SUCCESS('Готово. Всего оценено попыток: {0}'.format(total)))
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from control.dataset import PASSWORD
+from control.loadtest import simulate
+from control.models import Test, Enrollment, ResultTest
+
+
+class Command(BaseCommand):
+    help = 'Имитация одновременного прохождения теста группой учащихся (вход, тест, синхронизация, отправка)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('test', type=int, help='Идентификатор теста')
+        parser.add_argument('--students', type=int, default=30, help='Количество виртуальных учащихся')
+        parser.add_argument('--concurrency', type=int, help='Размер пула потоков (по умолчанию - все учащиеся)')
+        parser.add_argument('--syncs', type=int, default=3, help='Количество синхронизаций времени за попытку')
+        parser.add_argument('--think', type=float, default=1.0, help='Пауза между синхронизациями, сек.')
+        parser.add_argument('--ramp', type=float, default=0.0, help='Время, за которое стартуют все учащиеся, сек.')
+        parser.add_argument('--url', help='Адрес запущенного сервера; без него запросы идут в WSGI-приложение')
+        parser.add_argument('--password', default=PASSWORD, help='Пароль учащихся (как в seed_dataset)')
+        parser.add_argument('--reset-attempts', action='store_true',
+                            help='Удалить прежние попытки выбранных учащихся по этому тесту')
+        parser.add_argument('--output', help='Файл для сохранения результатов в JSON')
+
+    def handle(self, *args, **options):
+        test = Test.objects.select_related('lesson__discipline__course').filter(pk=options['test']).first()
+        if test is None:
+            raise CommandError('Тест не найден.')
+        course = test.lesson.discipline.course
+        enrollments = Enrollment.objects.filter(course=course, status=Enrollment.STUDENT).select_related('user') \
+            .order_by('pk')[:options['students']]
+        users = [enrollment.user for enrollment in enrollments]
+        if not users:
+            raise CommandError('На курсе нет учащихся.')
+        if options['reset_attempts']:
+            ResultTest.objects.filter(test=test, user__in=users).delete()
+
+        test_url = reverse('test', kwargs={'slug': course.slug, 'pk': test.pk})
+        completed, duration, reports = simulate([user.username for user in users], options['password'], test_url,
+                                                options['url'], options['concurrency'], options['syncs'],
+                                                options['think'], options['ramp'])
+
+        self.stdout.write('Учащихся: {0}, завершили тест: {1}, время: {2:.1f} с'.format(len(users), completed,
+                                                                                        duration))
+        for endpoint, report in reports.items():
+            self.stdout.write('{0:<12} запросов {1:>6}  ошибок {2:>5} ({3:.1%})  {4:>8.2f} rps  '
+                              'p50 {5:>8.2f}  p95 {6:>8.2f}  p99 {7:>8.2f} ms'.format(endpoint, *report))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'students': len(users), 'completed': completed, 'duration': duration,
+                           'endpoints': {endpoint: report._asdict() for endpoint, report in reports.items()}},
+                          file, ensure_ascii=False, indent=2)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from control.models import Group
+
+
+class Command(BaseCommand):
+    help = 'Пересчет занятых мест в группах по записям Enrollment'
+
+    def handle(self, *args, **options):
+        ids = list(Group.objects.values_list('pk', flat=True))
+        Group.recount_seats(ids)
+        self.stdout.write(self.style.SUCCESS('Готово. Пересчитано групп: {0}'.format(len(ids))))
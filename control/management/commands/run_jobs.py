@@ -0,0 +1,30 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from control.jobs import Worker
+from study_control.settings import JOBS_CONCURRENCY, JOBS_POLL_INTERVAL
+
+
+class Command(BaseCommand):
+    help = 'Обработчик фоновых задач: выполняет задачи из очереди в пуле потоков или процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=JOBS_CONCURRENCY,
+                            help='Количество одновременно выполняемых задач')
+        parser.add_argument('--processes', action='store_true',
+                            help='Выполнять задачи в пуле процессов вместо пула потоков')
+        parser.add_argument('--poll-interval', type=float, default=JOBS_POLL_INTERVAL,
+                            help='Пауза между опросами пустой очереди, сек.')
+        parser.add_argument('--once', action='store_true',
+                            help='Завершиться, когда в очереди не останется готовых к запуску задач')
+
+    def handle(self, *args, **options):
+        worker = Worker(options['concurrency'], options['processes'], options['poll_interval'], options['once'])
+        # По SIGTERM/SIGINT новые задачи не берутся, начатые выполняются до конца
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write('Обработчик {0} запущен: {1} {2}'.format(
+            worker.name, options['concurrency'], 'процессов' if options['processes'] else 'потоков'))
+        completed = worker.run()
+        self.stdout.write(self.style.SUCCESS('Готово. Выполнено задач: {0}'.format(completed)))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from control.dataset import add_dataset_arguments, dataset_config, build_dataset, PASSWORD
+
+
+class Command(BaseCommand):
+    help = 'Создание синтетического набора данных (курсы, группы, учащиеся, результаты) массовыми вставками'
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+
+    def handle(self, *args, **options):
+        config = dataset_config(options)
+        with transaction.atomic():
+            dataset = build_dataset(config)
+        self.stdout.write(self.style.SUCCESS(
+            'Готово. Курсов: {0}, групп: {1}, учащихся: {2}, тестов: {3}. Администратор: {4} / {5}'.format(
+                len(dataset.courses), len(dataset.groups), len(dataset.students), len(dataset.tests),
+                dataset.admin.username, PASSWORD)))
@@ -0,0 +1,249 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+
+from control.models import Test, ResultTest
+from study_control.settings import METRICS_DIR, METRICS_FLUSH_INTERVAL, METRICS_LATENCY_BUCKETS, \
+    METRICS_QUERY_BUCKETS, METRICS_TTL
+
+PREFIX = 'study_control_'
+
+# Показатели, накапливаемые в процессе: тип, описание и границы корзин гистограммы
+METRICS = {
+    'http_requests_total': ('counter', 'Обработанные запросы по имени URL и коду ответа.', None),
+    'http_request_duration_seconds': ('histogram', 'Время обработки запроса по имени URL.',
+                                      METRICS_LATENCY_BUCKETS),
+    'db_queries_total': ('counter', 'Выполненные SQL-запросы по имени URL.', None),
+    'db_query_seconds_total': ('counter', 'Суммарное время SQL-запросов по имени URL.', None),
+    'db_queries_per_request': ('histogram', 'Число SQL-запросов на один запрос по имени URL.',
+                               METRICS_QUERY_BUCKETS),
+    'submissions_total': ('counter', 'Отправленные ответы: tests - попытки тестов, files - решения заданий. '
+                                     'В минуту: rate(...[1m]) * 60.', None),
+    'upload_bytes_total': ('counter', 'Принятые байты загружаемых файлов.', None),
+    'cache_requests_total': ('counter', 'Обращения к кешу по имени кеша: hit - найдено, miss - построено заново.',
+                             None),
+}
+
+
+class Registry:
+    # Счетчики и гистограммы процесса. Состояние не чаще раза в METRICS_FLUSH_INTERVAL секунд
+    # записывается в METRICS_DIR/<pid>.json; при чтении файлы всех процессов суммируются.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        self.flushed = 0.0
+
+    def check_fork(self):
+        # После fork рабочий процесс не должен повторно учитывать данные родителя
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self.lock:
+            self.check_fork()
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['buckets'][bisect_left(buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            self.check_fork()
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, dict(labels), dict(series, buckets=list(series['buckets']))]
+                               for (name, labels), series in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.flushed < METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        # Запись во временный файл и замена, чтобы читатель не увидел недописанный файл
+        handle, path = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path, os.path.join(METRICS_DIR, '{0}.json'.format(self.pid)))
+
+
+REGISTRY = Registry()
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+def cache_lookup(cache_name, value):
+    # Учет обращения к кешу; value - результат cache.get
+    REGISTRY.inc('cache_requests_total', cache=cache_name, result='miss' if value is None else 'hit')
+    return value
+
+
+def observe_request(name, status, total_time, stats):
+    # Вызывается QueryBudgetMiddleware после каждого запроса
+    REGISTRY.inc('http_requests_total', view=name, status=str(status))
+    REGISTRY.observe('http_request_duration_seconds', total_time, view=name)
+    REGISTRY.inc('db_queries_total', stats.count, view=name)
+    REGISTRY.inc('db_query_seconds_total', stats.duration, view=name)
+    REGISTRY.observe('db_queries_per_request', stats.count, view=name)
+    REGISTRY.flush()
+
+
+def process_exists(pid):
+    # Проверка сигналом 0 возможна только в POSIX; в остальных системах возвращает None
+    if os.name != 'posix' or pid <= 0:
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю
+        pass
+    return True
+
+
+def prune():
+    # Удаляет файлы завершившихся процессов. Файл простаивающего, но живого процесса не удаляется:
+    # иначе его счетчики пропали бы из суммы до следующего запроса, и Prometheus принял бы это
+    # за сброс счетчика. По METRICS_TTL удаляются только файлы, процесс которых проверить нельзя
+    # (не POSIX), и недописанные временные файлы.
+    expired = time.time() - METRICS_TTL
+    for filename in os.listdir(METRICS_DIR):
+        name, extension = os.path.splitext(filename)
+        path = os.path.join(METRICS_DIR, filename)
+        if extension not in ('.json', '.tmp') or name == str(os.getpid()):
+            continue
+        exists = process_exists(int(name)) if extension == '.json' and name.isdigit() else None
+        try:
+            if exists is False or (exists is None and os.path.getmtime(path) < expired):
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def aggregate():
+    # Сумма показателей всех процессов, записавших файлы в METRICS_DIR
+    REGISTRY.flush(force=True)
+    prune()
+    counters, histograms = {}, {}
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename), encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in data['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            total = histograms.get(key)
+            if total is None or len(total['buckets']) != len(series['buckets']):
+                histograms[key] = series
+                continue
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], series['buckets'])]
+            total['sum'] += series['sum']
+            total['count'] += series['count']
+    return counters, histograms
+
+
+def active_attempts():
+    # Неотправленные попытки, начатые не раньше максимального времени на тест назад
+    longest = Test.objects.aggregate(longest=Max('time'))['longest'] or 0
+    since = timezone.now() - timedelta(minutes=longest)
+    return ResultTest.objects.filter(submitted=False, start_time__gte=since).count()
+
+
+def cache_ratios(counters):
+    requests = {}
+    for (name, labels), value in counters.items():
+        if name == 'cache_requests_total':
+            labels = dict(labels)
+            hits, total = requests.get(labels['cache'], (0, 0))
+            requests[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+    return {cache_name: hits / total for cache_name, (hits, total) in requests.items() if total}
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(key, escape(value)) for key, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def header(lines, name, kind, help_text):
+    lines.append('# HELP {0}{1} {2}'.format(PREFIX, name, help_text))
+    lines.append('# TYPE {0}{1} {2}'.format(PREFIX, name, kind))
+
+
+def render():
+    # Текстовый формат Prometheus 0.0.4
+    counters, histograms = aggregate()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        header(lines, name, kind, help_text)
+        if kind == 'counter':
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append('{0}{1}{2} {3}'.format(PREFIX, name, format_labels(labels), format_value(value)))
+            continue
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + [float('inf')], series['buckets']):
+                cumulative += count
+                lines.append('{0}{1}_bucket{2} {3}'.format(PREFIX, name, format_labels(
+                    labels + (('le', format_value(float(bound))),)), cumulative))
+            lines.append('{0}{1}_sum{2} {3}'.format(PREFIX, name, format_labels(labels),
+                                                    format_value(float(series['sum']))))
+            lines.append('{0}{1}_count{2} {3}'.format(PREFIX, name, format_labels(labels), series['count']))
+
+    header(lines, 'cache_hit_ratio', 'gauge', 'Доля найденных в кеше значений по имени кеша.')
+    for cache_name, ratio in sorted(cache_ratios(counters).items()):
+        lines.append('{0}cache_hit_ratio{1} {2}'.format(PREFIX, format_labels((('cache', cache_name),)),
+                                                        format_value(round(ratio, 4))))
+    header(lines, 'active_test_attempts', 'gauge', 'Начатые и еще не отправленные попытки тестов.')
+    lines.append('{0}active_test_attempts {1}'.format(PREFIX, active_attempts()))
+    return '\n'.join(lines) + '\n'
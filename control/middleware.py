@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from control import metrics
+from control.profiler import profile_request
+from study_control.settings import PROFILE_PARAMETER
+
+logger = logging.getLogger('control.budget')
+
+
+class QueryStats:
+    # Обертка для connection.execute_wrapper: количество запросов и суммарное время их выполнения
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class ViewTotals:
+    # Накопленные показатели одного представления в пределах процесса
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.total_time = 0.0
+        self.over_budget = 0
+
+
+_lock = threading.Lock()
+VIEW_TOTALS = {}
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+def query_budget(name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(name)
+
+
+def record(name, stats, total_time, over_budget):
+    with _lock:
+        totals = VIEW_TOTALS.setdefault(name, ViewTotals())
+        totals.requests += 1
+        totals.queries += stats.count
+        totals.sql_time += stats.duration
+        totals.total_time += total_time
+        totals.over_budget += int(over_budget)
+
+
+def server_timing(stats, total_time):
+    return 'db;dur={0:.1f};desc="{1} queries", total;dur={2:.1f}'.format(stats.duration * 1000, stats.count,
+                                                                         total_time * 1000)
+
+
+class QueryBudgetMiddleware:
+    # Число и время SQL-запросов и общее время обработки запроса по имени представления.
+    # Результат передается в заголовке Server-Timing и в показатели control.metrics;
+    # превышение QUERY_BUDGETS пишется в лог.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        total_time = time.perf_counter() - start
+
+        name = view_name(request)
+        budget = query_budget(name)
+        over_budget = budget is not None and stats.count > budget
+        if over_budget:
+            logger.warning('%s: %d SQL queries, budget %d (%s)', name, stats.count, budget, request.path)
+        record(name, stats, total_time, over_budget)
+        metrics.observe_request(name, response.status_code, total_time, stats)
+        response['Server-Timing'] = server_timing(stats, total_time)
+        return response
+
+
+class ProfilerMiddleware:
+    # Профилирование одного запроса сотрудника: адрес с параметром PROFILE_PARAMETER (?profile=1).
+    # Без параметра запрос проходит без каких-либо оберток.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_PARAMETER not in request.GET or not request.user.is_staff:
+            return self.get_response(request)
+        return profile_request(request, self.get_response)
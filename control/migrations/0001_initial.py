@@ -0,0 +1,452 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:09
+
+import control.models
+import datetime
+from django.conf import settings
+import django.contrib.auth.models
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import tinymce.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('text', models.CharField(max_length=256, verbose_name='Ответ')),
+                ('correct', models.BooleanField(default=False, verbose_name='Верный ответ')),
+            ],
+            options={
+                'verbose_name': 'Версия ответа',
+                'verbose_name_plural': 'Версии ответов',
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Course',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Наименование курса')),
+                ('image', models.ImageField(blank=True, upload_to=control.models.upload_course, verbose_name='Превью курса')),
+                ('description', tinymce.models.HTMLField(blank=True, default='', verbose_name='Описание курса')),
+                ('slug', models.SlugField(default='', unique=True)),
+            ],
+            options={
+                'verbose_name': 'Курс',
+                'verbose_name_plural': 'Курсы',
+            },
+        ),
+        migrations.CreateModel(
+            name='Direction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Направление')),
+            ],
+            options={
+                'verbose_name': 'Направление обучения',
+                'verbose_name_plural': 'Направления обучения',
+            },
+        ),
+        migrations.CreateModel(
+            name='Discipline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Наименование дисциплины')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discipline', to='control.course', verbose_name='Курс')),
+            ],
+            options={
+                'verbose_name': 'Дисциплина',
+                'verbose_name_plural': 'Дисциплины',
+            },
+        ),
+        migrations.CreateModel(
+            name='FileTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, verbose_name='Наименование задания')),
+                ('description', tinymce.models.HTMLField(blank=True, default='', verbose_name='Описание задания')),
+                ('filetypes', models.CharField(choices=[('1', 'Все типы файлов'), ('2', 'Изображения'), ('3', 'Документы')], max_length=20, verbose_name='Тип файла')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Group',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Наименование группы')),
+                ('max_users', models.PositiveIntegerField(default=30, verbose_name='Максимальное количество учащихся')),
+                ('study_start', models.DateField(verbose_name='Дата начала обучения')),
+                ('study_end', models.DateField(verbose_name='Дата конца обучения')),
+                ('occupied', models.PositiveIntegerField(default=0, editable=False, verbose_name='Занято мест')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group', to='control.course', verbose_name='Курс')),
+            ],
+            options={
+                'verbose_name': 'Группа',
+                'verbose_name_plural': 'Группы',
+            },
+        ),
+        migrations.CreateModel(
+            name='Lesson',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Наименование занятия')),
+                ('description', tinymce.models.HTMLField(blank=True, default='', verbose_name='Описание занятия')),
+                ('discipline', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson', to='control.discipline', verbose_name='Дисциплина')),
+            ],
+            options={
+                'verbose_name': 'Занятие',
+                'verbose_name_plural': 'Занятия',
+            },
+        ),
+        migrations.CreateModel(
+            name='LessonPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(blank=True, null=True, verbose_name='Время начала занятия')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lessonplan', to='control.group', verbose_name='Группа')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lessonplan', to='control.lesson', verbose_name='Занятие')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('text', tinymce.models.HTMLField(blank=True, default='', verbose_name='Вопрос')),
+            ],
+            options={
+                'verbose_name': 'Версия вопроса',
+                'verbose_name_plural': 'Версии вопросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='Test',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Наименование задания')),
+                ('tryes', models.PositiveIntegerField(default=3, verbose_name='Количество попыток')),
+                ('pass_percent', models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(10), django.core.validators.MaxValueValidator(100)], verbose_name='Мин. процент')),
+                ('time', models.PositiveIntegerField(default='5', verbose_name='Время на тест')),
+            ],
+            options={
+                'verbose_name': 'Тест',
+                'verbose_name_plural': 'Тесты',
+            },
+        ),
+        migrations.CreateModel(
+            name='TestVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Версия теста',
+                'verbose_name_plural': 'Версии тестов',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserFullName',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('auth.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TestVersionQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='control.questionsnapshot')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='control.testversion')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('version', 'position')},
+            },
+        ),
+        migrations.AddField(
+            model_name='testversion',
+            name='questions',
+            field=models.ManyToManyField(related_name='version', through='control.TestVersionQuestion', to='control.QuestionSnapshot'),
+        ),
+        migrations.AddField(
+            model_name='testversion',
+            name='test',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='version', to='control.test', verbose_name='Тест'),
+        ),
+        migrations.CreateModel(
+            name='TestPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(blank=True, null=True, verbose_name='Время начала контроля')),
+                ('end', models.DateTimeField(blank=True, null=True, verbose_name='Время конца контроля')),
+                ('lessonplan', models.ForeignKey(default='', on_delete=django.db.models.deletion.CASCADE, related_name='testplan', to='control.lessonplan', verbose_name='Группа')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='testplan', to='control.test', verbose_name='Тест')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='current_version',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='control.testversion'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='lesson',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test', to='control.lesson', verbose_name='Занятие'),
+        ),
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Курс'), ('lesson', 'Занятие'), ('question', 'Вопрос')], max_length=16, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Объект')),
+                ('title', models.CharField(max_length=256, verbose_name='Заголовок')),
+                ('body', models.TextField(blank=True, default='', verbose_name='Текст')),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='searchdocument', to='control.course', verbose_name='Курс')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ',
+                'verbose_name_plural': 'Поисковые документы',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResultTest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField(default=datetime.datetime(2026, 10, 18, 15, 9, 13, 700236), verbose_name='Время начала теста')),
+                ('end_time', models.DateTimeField(blank=True, null=True, verbose_name='Время завершения теста')),
+                ('percent', models.FloatField(blank=True, null=True, verbose_name='Набранный процент')),
+                ('passed', models.BooleanField(default=False, verbose_name='Тест сдан')),
+                ('questions_count', models.PositiveIntegerField(default=0, verbose_name='Количество вопросов')),
+                ('correct_count', models.PositiveIntegerField(default=0, verbose_name='Верных ответов')),
+                ('submitted', models.BooleanField(default=False, verbose_name='Ответы приняты')),
+                ('given_answers', models.ManyToManyField(blank=True, related_name='resulttest', to='control.AnswerSnapshot', verbose_name='Выбранные ответы')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resulttest', to='control.test', verbose_name='Тест')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resulttest', to=settings.AUTH_USER_MODEL, verbose_name='Учащийся')),
+                ('version', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resulttest', to='control.testversion', verbose_name='Версия теста')),
+            ],
+            options={
+                'verbose_name': 'Результат теста',
+                'verbose_name_plural': 'Результаты тестов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResultQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', tinymce.models.HTMLField(blank=True, default='', verbose_name='Вопрос')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resultquestion', to='control.resulttest')),
+            ],
+            options={
+                'verbose_name': 'Результат вопроса',
+                'verbose_name_plural': 'Результаты вопросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResultFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to=control.models.upload_file, verbose_name='Решение')),
+                ('accepted', models.BooleanField(default=None, null=True, verbose_name='Зачтен')),
+                ('filetask', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resultfile', to='control.filetask', verbose_name='Задание')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resultfile', to=settings.AUTH_USER_MODEL, verbose_name='Учащийся')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResultAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.CharField(max_length=256, verbose_name='Ответ')),
+                ('correct', models.BooleanField(default=False, verbose_name='Верный ответ')),
+                ('given', models.BooleanField(default=False, verbose_name='Дан ответ')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resultanswer', to='control.resultquestion', verbose_name='Название вопроса')),
+            ],
+            options={
+                'verbose_name': 'Результат ответа',
+                'verbose_name_plural': 'Результат ответов',
+            },
+        ),
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', tinymce.models.HTMLField(blank=True, default='', verbose_name='Вопрос')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question', to='control.test')),
+            ],
+            options={
+                'verbose_name': 'Вопрос',
+                'verbose_name_plural': 'Вопросы',
+            },
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('patronymic', models.CharField(blank=True, max_length=150, verbose_name='Отчество')),
+                ('birth_date', models.DateField(blank=True, null=True)),
+                ('about', tinymce.models.HTMLField(blank=True, default='', verbose_name='О себе')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Пользователь',
+                'verbose_name_plural': 'Пользователи',
+            },
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, verbose_name='Задача')),
+                ('params', models.TextField(default='{}', verbose_name='Параметры')),
+                ('key', models.CharField(blank=True, max_length=191, null=True, unique=True, verbose_name='Ключ')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Приоритет')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка')], default='queued', max_length=16, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='Максимум попыток')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Запуск не раньше')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Выполнено, %')),
+                ('message', models.CharField(blank=True, default='', max_length=256, verbose_name='Состояние')),
+                ('result', models.TextField(blank=True, default='', verbose_name='Результат')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('worker', models.CharField(blank=True, default='', max_length=64, verbose_name='Обработчик')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('heartbeat', models.DateTimeField(blank=True, null=True, verbose_name='Последний отклик')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='job', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+            },
+        ),
+        migrations.AddField(
+            model_name='filetask',
+            name='lesson',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filetask', to='control.lesson', verbose_name='Занятие'),
+        ),
+        migrations.CreateModel(
+            name='FilePlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(blank=True, null=True, verbose_name='Время начала контроля')),
+                ('end', models.DateTimeField(blank=True, null=True, verbose_name='Время конца контроля')),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fileplan', to='control.filetask', verbose_name='Задание')),
+                ('lessonplan', models.ForeignKey(default='', on_delete=django.db.models.deletion.CASCADE, related_name='fileplan', to='control.lessonplan', verbose_name='Группа')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('request', 'Заявка на зачисление'), ('student', 'Учащийся')], default='request', max_length=16, verbose_name='Статус')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Изменена')),
+                ('course', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='enrollment', to='control.course', verbose_name='Курс')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment', to='control.group', verbose_name='Группа')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Зачисление',
+                'verbose_name_plural': 'Зачисления',
+            },
+        ),
+        migrations.AddField(
+            model_name='discipline',
+            name='teacher',
+            field=models.ForeignKey(default=None, limit_choices_to={'is_staff': True}, null=True, on_delete=django.db.models.deletion.SET_DEFAULT, related_name='discipline', to='control.userfullname', verbose_name='Преподаватель'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='direction',
+            field=models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='course', to='control.direction', verbose_name='Направление'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='owner',
+            field=models.ForeignKey(default=None, limit_choices_to={'is_staff': True}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='owner', to='control.userfullname', verbose_name='Заведующий курсом'),
+        ),
+        migrations.AddField(
+            model_name='answersnapshot',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer', to='control.questionsnapshot', verbose_name='Версия вопроса'),
+        ),
+        migrations.CreateModel(
+            name='Answer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.CharField(max_length=256, verbose_name='Ответ')),
+                ('correct', models.BooleanField(default=False, verbose_name='Верный ответ')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer', to='control.question', verbose_name='Название вопроса')),
+            ],
+            options={
+                'verbose_name': 'Ответ',
+                'verbose_name_plural': 'Ответы',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='testversion',
+            unique_together={('test', 'digest')},
+        ),
+        migrations.AddIndex(
+            model_name='searchdocument',
+            index=models.Index(fields=['course', 'kind'], name='control_sea_course__f0c81b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchdocument',
+            unique_together={('kind', 'object_id')},
+        ),
+        migrations.AddIndex(
+            model_name='resulttest',
+            index=models.Index(fields=['test', 'user', 'passed'], name='control_res_test_id_85b84f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resulttest',
+            index=models.Index(fields=['percent'], name='control_res_percent_23625c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'priority', 'run_at'], name='control_job_status_b215be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['user', 'created'], name='control_job_user_id_63f6ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['user', 'course', 'status'], name='control_enr_user_id_459252_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['group', 'status'], name='control_enr_group_i_3f50aa_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='enrollment',
+            unique_together={('user', 'group')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='answersnapshot',
+            unique_together={('question', 'position')},
+        ),
+    ]
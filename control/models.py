@@ -1,21 +1,27 @@
 import datetime
+import json
+from collections import defaultdict, namedtuple
 
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
-from django.db.models import Q, Max
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q, Max, F, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from pytils.translit import slugify
 from tinymce import models as tinymce_models
 
-from study_control.settings import FILE_CHOISE_EXTENSIONS
+from control.renditions import delete_renditions
+from study_control.settings import FILE_CHOISE_EXTENSIONS, TEST_DEADLINE_GRACE, JOBS_EAGER, JOBS_MAX_ATTEMPTS, \
+    JOBS_RETRY_DELAY, JOBS_KEY_TTL
 
 
 class Profile(models.Model):
@@ -30,10 +36,12 @@ class Profile(models.Model):
         verbose_name_plural = _("Пользователи")
 
     def is_study(self, course):
-        return Group.objects.filter(course=course, study_end__gte=timezone.now(), students=self.user).first()
+        return Enrollment.find_group(self.user, Enrollment.STUDENT, course=course,
+                                     group__study_end__gte=timezone.now())
 
     def is_request(self, course):
-        return Group.objects.filter(course=course, study_start__gte=timezone.now(), requests=self.user).first()
+        return Enrollment.find_group(self.user, Enrollment.REQUEST, course=course,
+                                     group__study_start__gte=timezone.now())
 
 
 @receiver(post_save, sender=User)
@@ -95,12 +103,19 @@ class Course(models.Model):
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
+        image_changed = bool(self.image)
         if self.pk is not None:
             old_self = Course.objects.get(pk=self.pk)
+            image_changed = bool(self.image) and self.image != old_self.image
             if old_self.image and self.image != old_self.image:
+                delete_renditions(old_self.image.name)
                 old_self.image.delete(False)
-        return super().save(*args, **kwargs)
-
+        result = super().save(*args, **kwargs)
+        if image_changed:
+            # Копии создаются в фоне; до этого rendition_url создаст их при первом обращении
+            Job.enqueue('generate_renditions', {'name': self.image.name},
+                        key='generate_renditions:{0}'.format(self.image.name))
+        return result
 
     def is_owner(self, user):
         return self.owner == user
@@ -109,6 +124,7 @@ class Course(models.Model):
 @receiver(pre_delete, sender=Course)
 def image_delete(sender, instance, **kwargs):
     if instance.image.name:
+        delete_renditions(instance.image.name)
         instance.image.delete(False)
 
 
@@ -169,12 +185,24 @@ class Lesson(models.Model):
 class Group(models.Model):
     name = models.CharField(max_length=256, verbose_name="Наименование группы", )
     course = models.ForeignKey(Course, verbose_name="Курс", related_name='group', on_delete=models.CASCADE)
-    students = models.ManyToManyField(User, verbose_name="Учащиеся", related_name='stud_user', blank=True)
-    requests = models.ManyToManyField(User, verbose_name="Заявки на зачисление",
-                                      related_name='request_user', blank=True)
     max_users = models.PositiveIntegerField(default=30, verbose_name="Максимальное количество учащихся", )
     study_start = models.DateField(verbose_name="Дата начала обучения")
     study_end = models.DateField(verbose_name="Дата конца обучения")
+    # Занятые места: заявки и учащиеся. Поддерживается методами группы и сигналами Enrollment.
+    occupied = models.PositiveIntegerField(default=0, editable=False, verbose_name="Занято мест", )
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Курс в записях о зачислении хранится денормализованно
+        Enrollment.objects.filter(group=self).exclude(course_id=self.course_id).update(course_id=self.course_id)
+
+    @property
+    def students(self):
+        return User.objects.filter(enrollment__group=self, enrollment__status=Enrollment.STUDENT)
+
+    @property
+    def requests(self):
+        return User.objects.filter(enrollment__group=self, enrollment__status=Enrollment.REQUEST)
 
     def get_status(self):
         now = datetime.date.today()
@@ -186,13 +214,54 @@ class Group(models.Model):
             return "Обучение завершено"
 
     def add_students(self, querydict):
-        for key, value in querydict.items():
-            if int(value) == True:
-                self.students.add(User.objects.get(pk=int(key)))
-            self.requests.remove(User.objects.get(pk=int(key)))
+        # Рассмотрение заявок одной пачкой: {id пользователя: 1 - зачислить, 0 - отклонить}
+        decisions = {int(key): int(value) == True for key, value in querydict.items() if key.isdigit()}
+        accepted = [user_id for user_id, decision in decisions.items() if decision]
+        rejected = [user_id for user_id, decision in decisions.items() if not decision]
+        with transaction.atomic():
+            Group.objects.select_for_update().get(pk=self.pk)
+            requests = Enrollment.objects.filter(group_id=self.pk, status=Enrollment.REQUEST)
+            requests.filter(user_id__in=accepted).update(status=Enrollment.STUDENT, updated=timezone.now())
+            requests.filter(user_id__in=rejected).delete()
+            Group.recount_seats([self.pk])
+
+    def request_seat(self, user):
+        # Заявка занимает место в группе. Строка группы блокируется на время
+        # проверки, поэтому одновременные заявки не превышают max_users.
+        with transaction.atomic():
+            group = Group.objects.select_for_update().get(pk=self.pk)
+            if Enrollment.objects.filter(group_id=self.pk, user_id=user.pk).exists():
+                return True
+            if group.is_full():
+                return False
+            Enrollment.objects.create(group=group, user_id=user.pk, status=Enrollment.REQUEST)
+            Group.objects.filter(pk=self.pk).update(occupied=F('occupied') + 1)
+        self.occupied = group.occupied + 1
+        return True
+
+    def cancel_request(self, user):
+        self._release(user, Enrollment.REQUEST)
+
+    def remove_student(self, user):
+        self._release(user, Enrollment.STUDENT)
+
+    def _release(self, user, status):
+        # Число занятых мест пересчитывает сигнал enrollment_deleted
+        with transaction.atomic():
+            Group.objects.select_for_update().get(pk=self.pk)
+            Enrollment.objects.filter(group_id=self.pk, user_id=user.pk, status=status).delete()
+
+    @classmethod
+    def recount_seats(cls, ids):
+        enrolled = Enrollment.objects.filter(group=OuterRef('pk')).order_by() \
+            .values('group').annotate(count=Count('pk')).values('count')
+        cls.objects.filter(pk__in=ids).update(occupied=Coalesce(Subquery(enrolled), 0))
+
+    def free_seats(self):
+        return max(0, self.max_users - self.occupied)
 
     def is_full(self):
-        return self.max_users <= self.requests.count() + self.students.count()
+        return self.max_users <= self.occupied
 
     def __str__(self):
         return '{0} - {1}'.format(self.name, self.course)
@@ -202,6 +271,75 @@ class Group(models.Model):
         verbose_name_plural = _("Группы")
 
 
+class Enrollment(models.Model):
+    # Заявка или зачисление пользователя в группу курса
+    REQUEST = 'request'
+    STUDENT = 'student'
+    STATUSES = (
+        (REQUEST, "Заявка на зачисление"),
+        (STUDENT, "Учащийся"),
+    )
+
+    user = models.ForeignKey(User, related_name='enrollment', on_delete=models.CASCADE,
+                             verbose_name="Пользователь", )
+    group = models.ForeignKey(Group, related_name='enrollment', on_delete=models.CASCADE, verbose_name="Группа", )
+    course = models.ForeignKey(Course, related_name='enrollment', on_delete=models.CASCADE, editable=False,
+                               verbose_name="Курс", )
+    status = models.CharField(max_length=16, choices=STATUSES, default=REQUEST, verbose_name="Статус", )
+    created = models.DateTimeField(auto_now_add=True, verbose_name="Создана", )
+    updated = models.DateTimeField(auto_now=True, verbose_name="Изменена", )
+
+    def save(self, *args, **kwargs):
+        self.course_id = self.group.course_id
+        return super().save(*args, **kwargs)
+
+    @classmethod
+    def find_group(cls, user, status=STUDENT, **lookups):
+        # Одна выборка по индексу (user, course, status)
+        enrollment = cls.objects.filter(user=user, status=status, **lookups).select_related('group').order_by('pk').first()
+        return enrollment.group if enrollment else None
+
+    @classmethod
+    def user_groups(cls, course, users=None, group=None):
+        # {id пользователя: наименование группы} для учащихся курса одним запросом
+        enrollments = cls.objects.filter(course=course, status=cls.STUDENT)
+        if users is not None:
+            enrollments = enrollments.filter(user_id__in=users)
+        if group is not None:
+            enrollments = enrollments.filter(group=group)
+        names = {}
+        for user_id, name in enrollments.order_by('pk').values_list('user_id', 'group__name'):
+            names.setdefault(user_id, name)
+        return names
+
+    @classmethod
+    def attach_groups(cls, results, course):
+        # Заполняет get_user_group для списка результатов (ResultTest, ResultFile) одного курса
+        results = list(results)
+        names = cls.user_groups(course, users={result.user_id for result in results})
+        for result in results:
+            result._user_group = "Администратор" if result.user.is_staff else names.get(result.user_id, "")
+        return results
+
+    def __str__(self):
+        return '{0} - {1}'.format(self.user, self.group)
+
+    class Meta:
+        verbose_name = _("Зачисление")
+        verbose_name_plural = _("Зачисления")
+        unique_together = ('user', 'group')
+        indexes = [
+            models.Index(fields=['user', 'course', 'status']),
+            models.Index(fields=['group', 'status']),
+        ]
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    # Освобождение места: отмена заявки, исключение учащегося, админка, удаление пользователя
+    Group.recount_seats([instance.group_id])
+
+
 class Test(models.Model):
     lesson = models.ForeignKey(Lesson, related_name='test', on_delete=models.CASCADE, verbose_name="Занятие", )
     name = models.CharField(max_length=256, verbose_name="Наименование задания", )
@@ -210,19 +348,27 @@ class Test(models.Model):
                                                                        MaxValueValidator(100)],
                                                verbose_name="Мин. процент")
     time = models.PositiveIntegerField(default="5", verbose_name="Время на тест", )
+    # Актуальная версия содержимого теста, сбрасывается при изменении вопросов и ответов
+    current_version = models.ForeignKey('TestVersion', null=True, blank=True, editable=False, related_name='+',
+                                        on_delete=models.SET_NULL)
 
     def __str__(self):
         return self.name
 
     def is_passed(self, user):
-        for result in self.resulttest.filter(user=user, test=self):
-            if result.get_percent() > self.pass_percent:
-                return True
-        return False
+        # Попытки оцениваются при отправке или по истечении времени (ResultTest.close_expired)
+        return self.resulttest.filter(user=user, passed=True).exists()
 
     def get_plan(self, group):
         return TestPlan.objects.filter(lessonplan=self.lesson.get_plan(group=group)).first()
 
+    def get_version(self):
+        if self.current_version_id is None:
+            from control.versions import build_version
+            self.current_version = build_version(self)
+            Test.objects.filter(pk=self.pk).update(current_version=self.current_version)
+        return self.current_version
+
     def in_plan(self, group):
         plan = TestPlan.objects.filter(test=self, lessonplan__group=group).first()
         if plan:
@@ -271,6 +417,83 @@ class Answer(models.Model):
         verbose_name_plural = _("Ответы")
 
 
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    Test.objects.filter(pk=instance.test_id).update(current_version=None)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    Test.objects.filter(question=instance.question_id).update(current_version=None)
+
+
+class QuestionSnapshot(models.Model):
+    # Неизменяемая копия вопроса вместе с ответами.
+    # Одинаковые по содержимому вопросы хранятся один раз (digest - хеш содержимого).
+    digest = models.CharField(max_length=64, unique=True)
+    text = tinymce_models.HTMLField(blank=True, default='', verbose_name="Вопрос", )
+
+    def __str__(self):
+        return self.text
+
+    class Meta:
+        verbose_name = _("Версия вопроса")
+        verbose_name_plural = _("Версии вопросов")
+
+
+class AnswerSnapshot(models.Model):
+    question = models.ForeignKey(QuestionSnapshot, related_name='answer', on_delete=models.CASCADE,
+                                 verbose_name="Версия вопроса")
+    position = models.PositiveIntegerField(default=0)
+    text = models.CharField(max_length=256, verbose_name="Ответ")
+    correct = models.BooleanField(default=False, verbose_name="Верный ответ",)
+
+    def __str__(self):
+        return self.text
+
+    class Meta:
+        verbose_name = _("Версия ответа")
+        verbose_name_plural = _("Версии ответов")
+        ordering = ['position']
+        unique_together = ('question', 'position')
+
+
+class TestVersion(models.Model):
+    # Неизменяемая версия теста: упорядоченный набор версий вопросов
+    test = models.ForeignKey(Test, related_name='version', on_delete=models.CASCADE, verbose_name="Тест", )
+    digest = models.CharField(max_length=64)
+    created = models.DateTimeField(auto_now_add=True)
+    questions = models.ManyToManyField(QuestionSnapshot, through='TestVersionQuestion', related_name='version')
+
+    def __str__(self):
+        return '{0} ({1})'.format(self.test, self.digest[:8])
+
+    def get_questions(self):
+        return self.questions.order_by('testversionquestion__position').prefetch_related('answer')
+
+    class Meta:
+        verbose_name = _("Версия теста")
+        verbose_name_plural = _("Версии тестов")
+        unique_together = ('test', 'digest')
+
+
+class TestVersionQuestion(models.Model):
+    version = models.ForeignKey(TestVersion, on_delete=models.CASCADE)
+    question = models.ForeignKey(QuestionSnapshot, on_delete=models.CASCADE)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position']
+        unique_together = ('version', 'position')
+
+
+ReviewQuestion = namedtuple('ReviewQuestion', ['text', 'answers'])
+
+ReviewAnswer = namedtuple('ReviewAnswer', ['text', 'correct', 'given'])
+
+
 class ResultTest(models.Model):
     test = models.ForeignKey(Test, related_name='resulttest',
                              on_delete=models.CASCADE, verbose_name="Тест", )
@@ -278,6 +501,20 @@ class ResultTest(models.Model):
                              on_delete=models.CASCADE, verbose_name="Учащийся", )
     start_time = models.DateTimeField(verbose_name="Время начала теста", default=datetime.datetime.now())
     end_time = models.DateTimeField(verbose_name="Время завершения теста", null=True, blank=True, )
+    # Результат сохраняется при отправке попытки (write_attempt) или по истечении ее времени
+    # (close_expired); у выполняемых попыток он пуст, и при чтении их оценка не вычисляется
+    percent = models.FloatField(verbose_name="Набранный процент", null=True, blank=True, )
+    passed = models.BooleanField(verbose_name="Тест сдан", default=False, )
+    questions_count = models.PositiveIntegerField(verbose_name="Количество вопросов", default=0, )
+    correct_count = models.PositiveIntegerField(verbose_name="Верных ответов", default=0, )
+    # Ответы попытки приняты (отправлены учащимся): повторная отправка отклоняется
+    submitted = models.BooleanField(verbose_name="Ответы приняты", default=False, )
+    # Версия теста, которую видел учащийся, и выбранные им ответы.
+    # У попыток до перехода на версии вместо этого заполнены ResultQuestion / ResultAnswer.
+    version = models.ForeignKey(TestVersion, related_name='resulttest', null=True, blank=True,
+                                on_delete=models.CASCADE, verbose_name="Версия теста", )
+    given_answers = models.ManyToManyField(AnswerSnapshot, related_name='resulttest', blank=True,
+                                           verbose_name="Выбранные ответы", )
 
     def __str__(self):
         return "{0} - {1} {2} {3}".format(self.test.name, self.user.first_name,
@@ -286,34 +523,125 @@ class ResultTest(models.Model):
     class Meta:
         verbose_name = _("Результат теста")
         verbose_name_plural = _("Результаты тестов")
+        indexes = [
+            models.Index(fields=['test', 'user', 'passed']),
+            models.Index(fields=['percent']),
+        ]
 
     def get_time(self):
         return (self.end_time - datetime.timedelta(hours=self.start_time.hour, minutes=self.start_time.minute,
                                                    seconds=self.start_time.second)).time()
 
-    def get_percent(self):
-        questions = self.resultquestion.all()
-        count = questions.count()
-        points = 0
-        for question in questions:
-            flag = True
-            for answer in question.resultanswer.all():
-                if answer.correct != answer.given:
-                    flag = False
-                    break
-            if flag:
-                points += 1
-        try:
-            return round((points / count) * 100, 1)
-        except:
+    def set_score(self, count, points, pass_percent):
+        self.questions_count = count
+        self.correct_count = points
+        self.percent = round((points / count) * 100, 1) if count else 0
+        self.passed = self.percent >= pass_percent
+
+    def grade(self):
+        ResultTest.grade_many([self])
+        return self.percent
+
+    @classmethod
+    def grade_many(cls, results):
+        # Оценка пачки попыток: вопрос засчитан, если ни один его ответ
+        # не расходится с верным. Запросы не зависят от размера пачки.
+        results = list(results)
+        if not results:
+            return results
+        ids = [result.pk for result in results]
+        pass_percents = dict(Test.objects.filter(resulttest__in=ids).values_list('resulttest', 'pass_percent'))
+        counts = defaultdict(int)
+        points = defaultdict(int)
+
+        legacy = [result.pk for result in results if result.version_id is None]
+        failed = set(ResultAnswer.objects.filter(question__test_id__in=legacy).exclude(correct=F('given'))
+                     .values_list('question_id', flat=True))
+        for question_id, result_id in ResultQuestion.objects.filter(test_id__in=legacy).values_list('id', 'test_id'):
+            counts[result_id] += 1
+            if question_id not in failed:
+                points[result_id] += 1
+
+        versioned = [result for result in results if result.version_id is not None]
+        if versioned:
+            questions = defaultdict(list)
+            for version_id, question_id in TestVersionQuestion.objects.filter(
+                    version_id__in={result.version_id for result in versioned}).values_list('version_id',
+                                                                                           'question_id'):
+                questions[version_id].append(question_id)
+            answers = defaultdict(list)
+            for answer_id, question_id, correct in AnswerSnapshot.objects.filter(
+                    question__version__in={result.version_id for result in versioned}).distinct() \
+                    .values_list('id', 'question_id', 'correct'):
+                answers[question_id].append((answer_id, correct))
+            given = defaultdict(set)
+            for result_id, answer_id in cls.given_answers.through.objects.filter(
+                    resulttest_id__in=[result.pk for result in versioned]).values_list('resulttest_id',
+                                                                                     'answersnapshot_id'):
+                given[result_id].add(answer_id)
+            for result in versioned:
+                for question_id in questions[result.version_id]:
+                    counts[result.pk] += 1
+                    if all(correct == (answer_id in given[result.pk]) for answer_id, correct in answers[question_id]):
+                        points[result.pk] += 1
+
+        for result in results:
+            result.set_score(counts[result.pk], points[result.pk], pass_percents[result.pk])
+        cls.objects.bulk_update(results, ['percent', 'passed', 'questions_count', 'correct_count'])
+        return results
+
+    @classmethod
+    def close_expired(cls, now=None):
+        # Неотправленные попытки, время которых (с запасом TEST_DEADLINE_GRACE) истекло,
+        # закрываются без ответов - так же, как отправка после истечения времени
+        now = now or timezone.now()
+        grace = datetime.timedelta(seconds=TEST_DEADLINE_GRACE)
+        pending = cls.objects.filter(submitted=False, start_time__lt=now - grace).select_related('test')
+        expired = [result for result in pending
+                   if result.start_time + datetime.timedelta(minutes=result.test.time) + grace < now]
+        if not expired:
             return 0
-
+        # Попытку, которую учащийся успел отправить одновременно с закрытием, оценивает write_attempt
+        results = [result for result in expired
+                   if cls.objects.filter(pk=result.pk, submitted=False).update(submitted=True)]
+        for result in results:
+            result.end_time = result.start_time + datetime.timedelta(minutes=result.test.time)
+        cls.grade_many(results)
+        cls.objects.bulk_update(results, ['end_time'])
+        return len(results)
+
+    @classmethod
+    def grade_pending(cls, results, batch_size=500):
+        # Оценка попыток пачками по возрастанию pk; после каждой пачки
+        # возвращает количество оцененных к этому моменту попыток
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(results.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            cls.grade_many(batch)
+            last_pk = batch[-1].pk
+            total += len(batch)
+            yield total
+
+    def get_review(self):
+        # Вопросы и ответы попытки в том виде, в каком их видел учащийся
+        if self.version_id is None:
+            return [ReviewQuestion(question.text, list(question.resultanswer.all()))
+                    for question in self.resultquestion.all().prefetch_related('resultanswer')]
+        given = set(self.given_answers.values_list('pk', flat=True))
+        return [ReviewQuestion(question.text, [ReviewAnswer(answer.text, answer.correct, answer.pk in given)
+                                               for answer in question.answer.all()])
+                for question in self.version.get_questions()]
 
     def get_user_group(self):
+        if hasattr(self, '_user_group'):
+            return self._user_group
         if self.user.is_staff:
             return "Администратор"
-        intercept = self.user.stud_user.all() & self.test.lesson.discipline.course.group.all()
-        return intercept.first().name
+        group = Enrollment.find_group(self.user_id, course__discipline__lesson__test=self.test_id)
+        return group.name if group else ""
 
 
 class ResultQuestion(models.Model):
@@ -400,10 +728,12 @@ class ResultFile(models.Model):
         return super().save(*args, **kwargs)
 
     def get_user_group(self):
+        if hasattr(self, '_user_group'):
+            return self._user_group
         if self.user.is_staff:
             return "Администратор"
-        intercept = self.user.stud_user.all() & self.filetask.lesson.discipline.course.group.all()
-        return intercept.first().name
+        group = Enrollment.find_group(self.user_id, course__discipline__lesson__filetask=self.filetask_id)
+        return group.name if group else ""
 
 
 @receiver(pre_delete, sender=ResultFile)
@@ -457,4 +787,177 @@ class FilePlan(models.Model):
     def in_timerange(self):
         if self.start <= timezone.now() <= self.end:
             return True
-        return False
\ No newline at end of file
+        return False
+
+class SearchDocument(models.Model):
+    # Текст курсов, занятий и вопросов без HTML-разметки для полнотекстового поиска.
+    # Поддерживается сигналами из control.search, индекс создается командой build_search_index.
+    COURSE = 'course'
+    LESSON = 'lesson'
+    QUESTION = 'question'
+    KINDS = (
+        (COURSE, "Курс"),
+        (LESSON, "Занятие"),
+        (QUESTION, "Вопрос"),
+    )
+
+    kind = models.CharField(max_length=16, choices=KINDS, verbose_name="Тип", )
+    object_id = models.PositiveIntegerField(verbose_name="Объект", )
+    course = models.ForeignKey(Course, related_name='searchdocument', on_delete=models.CASCADE,
+                               verbose_name="Курс", )
+    title = models.CharField(max_length=256, verbose_name="Заголовок", )
+    body = models.TextField(blank=True, default='', verbose_name="Текст", )
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        if self.kind == self.COURSE:
+            return reverse('course', kwargs={'slug': self.course.slug})
+        if self.kind == self.LESSON:
+            return reverse('lesson', kwargs={'slug': self.course.slug, 'pk': self.object_id})
+        return reverse('question_edit', kwargs={'pk': self.object_id})
+
+    class Meta:
+        verbose_name = _("Поисковый документ")
+        verbose_name_plural = _("Поисковые документы")
+        unique_together = ('kind', 'object_id')
+        indexes = [
+            models.Index(fields=['course', 'kind']),
+        ]
+
+
+class Job(models.Model):
+    # Фоновая задача. Выполняется командой run_jobs (control.jobs), функции задач - в control.tasks.
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Выполнена"),
+        (FAILED, "Ошибка"),
+    )
+    ACTIVE = (QUEUED, RUNNING)
+
+    name = models.CharField(max_length=64, verbose_name="Задача", )
+    params = models.TextField(default='{}', verbose_name="Параметры", )
+    # Ключ идемпотентности: повторная постановка задачи с тем же ключом возвращает существующую
+    key = models.CharField(max_length=191, null=True, blank=True, unique=True, verbose_name="Ключ", )
+    priority = models.SmallIntegerField(default=0, verbose_name="Приоритет", )
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED, verbose_name="Статус", )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток", )
+    max_attempts = models.PositiveSmallIntegerField(default=JOBS_MAX_ATTEMPTS, verbose_name="Максимум попыток", )
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Запуск не раньше", )
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Выполнено, %", )
+    message = models.CharField(max_length=256, blank=True, default='', verbose_name="Состояние", )
+    result = models.TextField(blank=True, default='', verbose_name="Результат", )
+    error = models.TextField(blank=True, default='', verbose_name="Ошибка", )
+    user = models.ForeignKey(User, related_name='job', null=True, blank=True, on_delete=models.SET_NULL,
+                             verbose_name="Пользователь", )
+    worker = models.CharField(max_length=64, blank=True, default='', verbose_name="Обработчик", )
+    created = models.DateTimeField(auto_now_add=True, verbose_name="Создана", )
+    started = models.DateTimeField(null=True, blank=True, verbose_name="Начата", )
+    heartbeat = models.DateTimeField(null=True, blank=True, verbose_name="Последний отклик", )
+    finished = models.DateTimeField(null=True, blank=True, verbose_name="Завершена", )
+
+    def __str__(self):
+        return '{0} #{1}'.format(self.name, self.pk)
+
+    def get_params(self):
+        return json.loads(self.params)
+
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+
+    @classmethod
+    def enqueue(cls, name, params=None, key=None, priority=0, user=None, delay=0, max_attempts=None,
+                key_ttl=JOBS_KEY_TTL):
+        # Задача с тем же ключом возвращается, пока она в очереди, выполняется
+        # или завершилась успешно не раньше key_ttl секунд назад
+        if key is not None:
+            existing = cls.objects.filter(key=key).first()
+            if existing is not None:
+                recent = existing.finished and existing.finished > timezone.now() - datetime.timedelta(
+                    seconds=key_ttl)
+                if existing.status in cls.ACTIVE or (existing.status == cls.DONE and recent):
+                    return existing
+                cls.objects.filter(pk=existing.pk).update(key=None)
+        job = cls(name=name, params=json.dumps(params or {}, cls=DjangoJSONEncoder), key=key, priority=priority,
+                  user=user if user is not None and user.is_authenticated else None,
+                  run_at=timezone.now() + datetime.timedelta(seconds=delay),
+                  max_attempts=max_attempts or JOBS_MAX_ATTEMPTS)
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            # Ту же задачу одновременно поставил другой запрос
+            return cls.objects.get(key=key)
+        if JOBS_EAGER:
+            from control.jobs import run_eager
+            run_eager(job)
+        return job
+
+    @classmethod
+    def claim(cls, worker, candidates=10):
+        # Следующая задача по приоритету. Условное обновление статуса не дает
+        # двум обработчикам взять одну задачу и не требует блокировок строк.
+        now = timezone.now()
+        ids = cls.objects.filter(status=cls.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'pk') \
+            .values_list('pk', flat=True)[:candidates]
+        for pk in list(ids):
+            if cls.objects.filter(pk=pk, status=cls.QUEUED).update(status=cls.RUNNING, worker=worker, started=now,
+                                                                   heartbeat=now, attempts=F('attempts') + 1):
+                return cls.objects.get(pk=pk)
+        return None
+
+    def report(self, done, total=None, message=None):
+        # Ход выполнения для страницы задач; done - доля (0..1) или количество из total
+        self.progress = min(100, int(100 * done / total if total else 100 * done))
+        fields = {'progress': self.progress, 'heartbeat': timezone.now()}
+        if message is not None:
+            self.message = fields['message'] = message[:256]
+        Job.objects.filter(pk=self.pk).update(**fields)
+
+    def finish(self, result=None):
+        self.status = self.DONE
+        self.progress = 100
+        self.result = json.dumps(result, cls=DjangoJSONEncoder) if result is not None else ''
+        self.error = ''
+        self.finished = self.heartbeat = timezone.now()
+        self.save(update_fields=['status', 'progress', 'result', 'error', 'finished', 'heartbeat'])
+
+    def fail(self, error):
+        # Повтор с удвоением паузы, пока не исчерпаны попытки
+        self.error = error
+        if self.attempts < self.max_attempts:
+            self.status = self.QUEUED
+            self.run_at = timezone.now() + datetime.timedelta(seconds=JOBS_RETRY_DELAY * 2 ** (self.attempts - 1))
+        else:
+            self.status = self.FAILED
+            self.finished = timezone.now()
+        self.save(update_fields=['status', 'error', 'run_at', 'finished'])
+
+    @classmethod
+    def heartbeat_many(cls, ids):
+        cls.objects.filter(pk__in=ids, status=cls.RUNNING).update(heartbeat=timezone.now())
+
+    @classmethod
+    def requeue_stale(cls, timeout):
+        # Задачи остановившегося обработчика: отклика не было дольше timeout секунд
+        since = timezone.now() - datetime.timedelta(seconds=timeout)
+        stale = cls.objects.filter(status=cls.RUNNING, heartbeat__lt=since)
+        count = stale.filter(attempts__lt=F('max_attempts')).update(status=cls.QUEUED, worker='',
+                                                                     error='Обработчик не отвечает')
+        count += stale.update(status=cls.FAILED, finished=timezone.now(), error='Обработчик не отвечает')
+        return count
+
+    class Meta:
+        verbose_name = _("Фоновая задача")
+        verbose_name_plural = _("Фоновые задачи")
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_at']),
+            models.Index(fields=['user', 'created']),
+        ]
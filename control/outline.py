@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from control.metrics import cache_lookup
+from control.models import Discipline, Lesson, LessonPlan, Group
+from study_control.settings import COURSE_OUTLINE_TIMEOUT
+
+
+# Видимая учащемуся группы структура курса: дисциплины и занятия, включенные в расписание
+OutlineDiscipline = namedtuple('OutlineDiscipline', ['id', 'name', 'lessons'])
+
+OutlineLesson = namedtuple('OutlineLesson', ['id', 'name'])
+
+
+def outline_key(group_id):
+    return 'course_outline:{0}'.format(group_id)
+
+
+def build_outline(group):
+    planned = set(LessonPlan.objects.filter(group=group, start__isnull=False).values_list('lesson_id', flat=True))
+    lessons = {}
+    for pk, discipline_id, name in Lesson.objects.filter(discipline__course_id=group.course_id, pk__in=planned) \
+            .order_by('pk').values_list('pk', 'discipline_id', 'name'):
+        lessons.setdefault(discipline_id, []).append(OutlineLesson(pk, name))
+    return [OutlineDiscipline(pk, name, lessons[pk])
+            for pk, name in Discipline.objects.filter(course_id=group.course_id).order_by('pk').values_list('pk', 'name')
+            if pk in lessons]
+
+
+def course_outline(group):
+    # Одна структура на группу: все учащиеся группы используют общий результат
+    key = outline_key(group.pk)
+    outline = cache_lookup('course_outline', cache.get(key))
+    if outline is None:
+        outline = build_outline(group)
+        cache.set(key, outline, COURSE_OUTLINE_TIMEOUT)
+    return outline
+
+
+def invalidate_group_outlines(group_ids):
+    cache.delete_many([outline_key(group_id) for group_id in group_ids])
+
+
+def invalidate_course_outlines(course_id):
+    invalidate_group_outlines(Group.objects.filter(course_id=course_id).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=LessonPlan)
+@receiver(post_delete, sender=LessonPlan)
+def lesson_plan_changed(sender, instance, **kwargs):
+    invalidate_group_outlines([instance.group_id])
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_changed(sender, instance, **kwargs):
+    course_id = Discipline.objects.filter(pk=instance.discipline_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        invalidate_course_outlines(course_id)
+
+
+@receiver(post_save, sender=Discipline)
+@receiver(post_delete, sender=Discipline)
+def discipline_changed(sender, instance, **kwargs):
+    invalidate_course_outlines(instance.course_id)
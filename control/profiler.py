@@ -0,0 +1,180 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import time
+import uuid
+from collections import namedtuple
+
+from django.contrib import messages
+from django.db import connection
+from django.template.base import Template
+from django.urls import reverse
+from django.utils import timezone
+
+from study_control.settings import BASE_DIR, PROFILE_DIR, PROFILE_KEEP
+
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Строка сводки по функции: время в мс, без вызываемых (own) и вместе с ними (cumulative)
+FunctionRow = namedtuple('FunctionRow', ['function', 'calls', 'own_ms', 'cumulative_ms'])
+
+# Запрос, выполненный несколько раз: duplicates - сколько выполнений повторяют предыдущие с теми же параметрами
+RepeatedQuery = namedtuple('RepeatedQuery', ['sql', 'count', 'duplicates', 'duration_ms', 'templates', 'sources'])
+
+THIS_FILE = os.path.abspath(__file__)
+
+
+def current_template(frame):
+    # Ближайший по стеку шаблон, при отрисовке которого выполняется запрос
+    while frame is not None:
+        if frame.f_code.co_name == '_render':
+            template = frame.f_locals.get('self')
+            if isinstance(template, Template):
+                return template.origin.template_name or template.name
+        frame = frame.f_back
+    return None
+
+
+def current_source(frame):
+    # Ближайшая строка кода проекта (не Django и не сторонних библиотек)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(BASE_DIR) and filename != THIS_FILE and 'site-packages' not in filename:
+            return '{0}:{1} {2}'.format(os.path.relpath(filename, BASE_DIR), frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class QueryLog:
+    # Обертка для connection.execute_wrapper: каждый запрос с временем выполнения и местом вызова
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            frame = sys._getframe(1)
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params),
+                'many': many,
+                'duration_ms': round(duration * 1000, 3),
+                'template': current_template(frame),
+                'source': current_source(frame),
+            })
+
+
+def profile_path(profile_id, extension):
+    return os.path.join(PROFILE_DIR, '{0}.{1}'.format(profile_id, extension))
+
+
+def save_profile(profile, log, request, response, duration):
+    profile_id = uuid.uuid4().hex
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile.dump_stats(profile_path(profile_id, 'prof'))
+    match = getattr(request, 'resolver_match', None)
+    meta = {
+        'id': profile_id,
+        'created': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.view_name if match else None,
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'sql_ms': round(sum(query['duration_ms'] for query in log.queries), 2),
+        'queries': log.queries,
+    }
+    with open(profile_path(profile_id, 'json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    prune()
+    return profile_id
+
+
+def prune():
+    # Хранятся только PROFILE_KEEP последних профилей
+    for meta in list_profiles()[PROFILE_KEEP:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(profile_path(meta['id'], extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for filename in os.listdir(PROFILE_DIR):
+        if filename.endswith('.json'):
+            meta = load_profile(filename[:-len('.json')])
+            if meta is not None:
+                meta['queries_count'] = len(meta.pop('queries'))
+                profiles.append(meta)
+    return sorted(profiles, key=lambda meta: meta['created'], reverse=True)
+
+
+def load_profile(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id, 'json'), encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def top_functions(profile_id, limit):
+    stats = pstats.Stats(profile_path(profile_id, 'prof'))
+    rows = []
+    for (filename, line, name), (primitive, calls, own, cumulative, callers) in stats.stats.items():
+        if filename == '~':
+            function = name
+        else:
+            function = '{0}:{1}({2})'.format(os.path.relpath(filename, BASE_DIR) if filename.startswith(BASE_DIR)
+                                             else filename, line, name)
+        rows.append(FunctionRow(function, calls if calls == primitive else '{0}/{1}'.format(calls, primitive),
+                                round(own * 1000, 3), round(cumulative * 1000, 3)))
+    return sorted(rows, key=lambda row: row.cumulative_ms, reverse=True)[:limit]
+
+
+def repeated_queries(queries):
+    # Запросы с одинаковым SQL: совпадение параметров означает дубликат, различие - обычно N+1
+    groups = {}
+    for query in queries:
+        groups.setdefault(query['sql'], []).append(query)
+    repeated = []
+    for sql, group in groups.items():
+        if len(group) < 2:
+            continue
+        duplicates = len(group) - len({query['params'] for query in group})
+        duration = round(sum(query['duration_ms'] for query in group), 3)
+        repeated.append(RepeatedQuery(sql, len(group), duplicates, duration,
+                                      sorted({query['template'] for query in group if query['template']}),
+                                      sorted({query['source'] for query in group if query['source']})))
+    return sorted(repeated, key=lambda query: (query.count, query.duration_ms), reverse=True)
+
+
+def profile_request(request, get_response):
+    log = QueryLog()
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    with connection.execute_wrapper(log):
+        profile.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profile.disable()
+    duration = time.perf_counter() - start
+    profile_id = save_profile(profile, log, request, response, duration)
+    url = reverse('profile_detail', kwargs={'profile_id': profile_id})
+    response['X-Profile'] = url
+    messages.info(request, 'Профиль запроса сохранен: {0}'.format(url))
+    return response
@@ -0,0 +1,117 @@
+from collections import defaultdict, namedtuple
+
+from control.models import Discipline, Lesson, Test, FileTask, LessonPlan, TestPlan, FilePlan, ResultTest, \
+    ResultFile
+
+
+# Состояние одного задания для одного учащегося
+TaskStatus = namedtuple('TaskStatus', ['task', 'passed', 'sended'])
+
+# Строка таблицы успеваемости: занятие и состояния его заданий
+LessonRow = namedtuple('LessonRow', ['discipline', 'lesson', 'tests', 'files'])
+
+StudentRow = namedtuple('StudentRow', ['student', 'lessons'])
+
+
+class ProgressMatrix:
+    # Матрица успеваемости группы (учащийся x задание).
+    # Все данные загружаются фиксированным числом запросов, независимо от
+    # количества учащихся и заданий курса.
+
+    SENDED = "(Отправлен на оценку)"
+
+    def __init__(self, group):
+        self.group = group
+        self.students = list(group.students.all().select_related('profile'))
+        self._load_structure()
+        self._load_plans()
+        self._load_results()
+
+    def _load_structure(self):
+        course = self.group.course_id
+        self.disciplines = list(Discipline.objects.filter(course_id=course).order_by('pk'))
+        self.lessons = defaultdict(list)
+        for lesson in Lesson.objects.filter(discipline__course_id=course).order_by('pk'):
+            self.lessons[lesson.discipline_id].append(lesson)
+        self.tests = defaultdict(list)
+        for test in Test.objects.filter(lesson__discipline__course_id=course).order_by('pk'):
+            self.tests[test.lesson_id].append(test)
+        self.files = defaultdict(list)
+        for filetask in FileTask.objects.filter(lesson__discipline__course_id=course).order_by('pk'):
+            self.files[filetask.lesson_id].append(filetask)
+
+    def _load_plans(self):
+        # Аналог Lesson.in_plan / Test.in_plan / FileTask.in_plan для всей группы сразу
+        lesson_start = {}
+        for plan in LessonPlan.objects.filter(group=self.group).order_by('pk'):
+            lesson_start.setdefault(plan.lesson_id, plan.start)
+        self.planned_lessons = {pk for pk, start in lesson_start.items() if start}
+
+        self.planned_tests = set()
+        seen = set()
+        for plan in TestPlan.objects.filter(lessonplan__group=self.group).select_related('lessonplan').order_by('pk'):
+            if plan.test_id in seen:
+                continue
+            seen.add(plan.test_id)
+            if plan.lessonplan.start and plan.start and plan.end:
+                self.planned_tests.add(plan.test_id)
+
+        self.planned_files = set()
+        seen = set()
+        for plan in FilePlan.objects.filter(lessonplan__group=self.group).select_related('lessonplan').order_by('pk'):
+            if plan.file_id in seen:
+                continue
+            seen.add(plan.file_id)
+            if plan.lessonplan.start and plan.start and plan.end:
+                self.planned_files.add(plan.file_id)
+
+    def _load_results(self):
+        students = [student.pk for student in self.students]
+        tests = [test.pk for lesson_tests in self.tests.values() for test in lesson_tests]
+
+        results = ResultTest.objects.filter(user_id__in=students, test_id__in=tests)
+        self.passed_tests = set(results.filter(passed=True).values_list('user_id', 'test_id'))
+
+        self.file_results = {}
+        for result in ResultFile.objects.filter(user_id__in=students,
+                                                filetask__lesson__discipline__course_id=self.group.course_id) \
+                .order_by('pk').values('user_id', 'filetask_id', 'accepted'):
+            self.file_results.setdefault((result['user_id'], result['filetask_id']), result['accepted'])
+
+    def test_status(self, student, test):
+        return TaskStatus(test, (student.pk, test.pk) in self.passed_tests, "")
+
+    def file_status(self, student, filetask):
+        key = (student.pk, filetask.pk)
+        accepted = self.file_results.get(key)
+        sended = self.SENDED if key in self.file_results and accepted is None else ""
+        return TaskStatus(filetask, accepted is True, sended)
+
+    def planned_disciplines(self):
+        for discipline in self.disciplines:
+            lessons = [lesson for lesson in self.lessons[discipline.pk] if lesson.pk in self.planned_lessons]
+            if lessons:
+                yield discipline, lessons
+
+    def student_rows(self, student):
+        rows = []
+        for discipline, lessons in self.planned_disciplines():
+            for lesson in lessons:
+                tests = [self.test_status(student, test) for test in self.tests[lesson.pk]
+                         if test.pk in self.planned_tests]
+                files = [self.file_status(student, filetask) for filetask in self.files[lesson.pk]
+                         if filetask.pk in self.planned_files]
+                rows.append(LessonRow(discipline, lesson, tests, files))
+        return rows
+
+    def rows(self):
+        return [StudentRow(student, self.student_rows(student)) for student in self.students]
+
+    def cells(self):
+        # Плоское представление для выгрузок: (учащийся, дисциплина, занятие, тип, состояние)
+        for student in self.students:
+            for row in self.student_rows(student):
+                for status in row.tests:
+                    yield student, row.discipline, row.lesson, 'test', status
+                for status in row.files:
+                    yield student, row.discipline, row.lesson, 'file', status
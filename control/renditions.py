@@ -0,0 +1,72 @@
+import os
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from study_control.settings import RENDITION_SIZES, RENDITION_QUALITY, RENDITION_RETRY
+
+# Формат Pillow -> расширение файла
+FORMATS = {
+    'JPEG': 'jpg',
+    'WEBP': 'webp',
+}
+
+
+def rendition_name(name, size, fmt):
+    # uploads/courses/<курс>/renditions/<имя>_<размер>.<расширение>
+    directory, filename = os.path.split(name)
+    return '{0}/renditions/{1}_{2}.{3}'.format(directory, os.path.splitext(filename)[0], size, FORMATS[fmt])
+
+
+def failure_key(name):
+    return 'rendition_failed:{0}'.format(name)
+
+
+def generate_renditions(name):
+    # Уменьшенные копии изображения фиксированных размеров в JPEG и WebP
+    with default_storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    for size, dimensions in RENDITION_SIZES.items():
+        thumbnail = ImageOps.fit(image, dimensions, Image.LANCZOS)
+        for fmt in FORMATS:
+            buffer = BytesIO()
+            thumbnail.save(buffer, fmt, quality=RENDITION_QUALITY)
+            path = rendition_name(name, size, fmt)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+    cache.delete(failure_key(name))
+
+
+def delete_renditions(name):
+    for size in RENDITION_SIZES:
+        for fmt in FORMATS:
+            path = rendition_name(name, size, fmt)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+
+
+def rendition_url(image, size, fmt='JPEG'):
+    # Копия создается при первом обращении, если ее еще нет на диске. Неудачная попытка
+    # запоминается в кеше на RENDITION_RETRY секунд и не повторяется при каждом просмотре.
+    # Вместо недоступной копии отдается JPEG-копия, а если нет и ее - оригинал.
+    if not image:
+        return ''
+    path = rendition_name(image.name, size, fmt)
+    if default_storage.exists(path):
+        return default_storage.url(path)
+    if not cache.get(failure_key(image.name)):
+        try:
+            generate_renditions(image.name)
+            return default_storage.url(path)
+        except (OSError, ValueError):
+            cache.set(failure_key(image.name), True, RENDITION_RETRY)
+    fallback = rendition_name(image.name, size, 'JPEG')
+    if fmt != 'JPEG' and default_storage.exists(fallback):
+        return default_storage.url(fallback)
+    return image.url
@@ -0,0 +1,163 @@
+import datetime
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from control.models import Discipline, Lesson, Test, FileTask, LessonPlan, TestPlan, FilePlan
+from control.outline import invalidate_group_outlines
+
+
+# Строка расписания группы: занятие, его время начала и интервалы доступности заданий
+PlanRow = namedtuple('PlanRow', ['discipline', 'lesson', 'start', 'is_owner', 'is_teacher', 'tests', 'files'])
+
+TaskPlan = namedtuple('TaskPlan', ['task', 'start', 'end'])
+
+
+def format_datetime(value):
+    if value:
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    return ""
+
+
+class PlanGrid:
+    # Расписание группы по всем занятиям и заданиям курса за постоянное число запросов.
+    # Планы хранятся в словарях по id занятия / задания.
+
+    def __init__(self, group):
+        self.group = group
+        self.lesson_plans = {}
+        for plan in LessonPlan.objects.filter(group=group).order_by('pk'):
+            self.lesson_plans.setdefault(plan.lesson_id, plan)
+        self.test_plans = {}
+        for plan in TestPlan.objects.filter(lessonplan__group=group).order_by('pk'):
+            self.test_plans.setdefault(plan.test_id, plan)
+        self.file_plans = {}
+        for plan in FilePlan.objects.filter(lessonplan__group=group).order_by('pk'):
+            self.file_plans.setdefault(plan.file_id, plan)
+
+    def rows(self, user):
+        course = self.group.course
+        is_owner = course.owner_id == user.pk
+        lessons = defaultdict(list)
+        for lesson in Lesson.objects.filter(discipline__course=course).order_by('pk'):
+            lessons[lesson.discipline_id].append(lesson)
+        tests = defaultdict(list)
+        for test in Test.objects.filter(lesson__discipline__course=course).order_by('pk'):
+            tests[test.lesson_id].append(test)
+        files = defaultdict(list)
+        for filetask in FileTask.objects.filter(lesson__discipline__course=course).order_by('pk'):
+            files[filetask.lesson_id].append(filetask)
+
+        rows = []
+        for discipline in Discipline.objects.filter(course=course).order_by('pk'):
+            is_teacher = discipline.teacher_id == user.pk
+            for lesson in lessons[discipline.pk]:
+                plan = self.lesson_plans.get(lesson.pk)
+                rows.append(PlanRow(discipline, lesson, format_datetime(plan and plan.start), is_owner, is_teacher,
+                                    [self.task_plan(test, self.test_plans) for test in tests[lesson.pk]],
+                                    [self.task_plan(filetask, self.file_plans) for filetask in files[lesson.pk]]))
+        return rows
+
+    @staticmethod
+    def task_plan(task, plans):
+        plan = plans.get(task.pk)
+        if plan is None:
+            return TaskPlan(task, "", "")
+        return TaskPlan(task, format_datetime(plan.start), format_datetime(plan.end))
+
+
+# Итог сохранения расписания: количество созданных и измененных планов
+ScheduleSummary = namedtuple('ScheduleSummary', ['lessons_created', 'lessons_updated', 'tasks_created',
+                                                 'tasks_updated'])
+
+
+def parse_datetime(string):
+    try:
+        return make_aware(datetime.datetime.strptime(string, '%Y-%m-%d %H:%M'))
+    except ValueError:
+        return None
+
+
+def parse_schedule(data):
+    # Поля формы group_plan.html: "<id занятия>", "test_start_<id>", "file_end_<id>" и т.д.
+    lessons = {}
+    tasks = {'test': defaultdict(dict), 'file': defaultdict(dict)}
+    for key, values in data.lists():
+        value = parse_datetime(values[0])
+        if key.isdigit():
+            lessons[int(key)] = value
+            continue
+        parts = key.split('_')
+        if len(parts) == 3 and parts[0] in tasks and parts[1] in ('start', 'end') and parts[2].isdigit():
+            tasks[parts[0]][int(parts[2])][parts[1]] = value
+    return lessons, tasks['test'], tasks['file']
+
+
+def apply_schedule(group, data):
+    # Сохраняет расписание группы: форма сравнивается с существующими планами,
+    # записываются только изменения, пачками и в одной транзакции.
+    lesson_starts, test_times, file_times = parse_schedule(data)
+    course_lessons = set(Lesson.objects.filter(discipline__course_id=group.course_id).values_list('pk', flat=True))
+    test_lessons = dict(Test.objects.filter(lesson_id__in=course_lessons, pk__in=test_times.keys())
+                        .values_list('pk', 'lesson_id'))
+    file_lessons = dict(FileTask.objects.filter(lesson_id__in=course_lessons, pk__in=file_times.keys())
+                        .values_list('pk', 'lesson_id'))
+    lesson_starts = {pk: start for pk, start in lesson_starts.items() if pk in course_lessons}
+
+    with transaction.atomic():
+        grid = PlanGrid(group)
+        lessons_created, lessons_updated = save_lesson_plans(group, grid, lesson_starts,
+                                                             set(test_lessons.values()) | set(file_lessons.values()))
+        tests_created, tests_updated = save_task_plans(TestPlan, 'test_id', grid.test_plans, grid.lesson_plans,
+                                                       test_lessons, test_times)
+        files_created, files_updated = save_task_plans(FilePlan, 'file_id', grid.file_plans, grid.lesson_plans,
+                                                       file_lessons, file_times)
+    if lessons_created or lessons_updated:
+        invalidate_group_outlines([group.pk])
+    return ScheduleSummary(lessons_created, lessons_updated, tests_created + files_created,
+                           tests_updated + files_updated)
+
+
+def save_lesson_plans(group, grid, starts, required):
+    created = []
+    updated = []
+    for lesson_id, start in starts.items():
+        plan = grid.lesson_plans.get(lesson_id)
+        if plan is None:
+            created.append(LessonPlan(group=group, lesson_id=lesson_id, start=start))
+        elif plan.start != start:
+            plan.start = start
+            updated.append(plan)
+    # Планы заданий ссылаются на план занятия, поэтому он создается и без времени начала
+    for lesson_id in required - set(starts) - set(grid.lesson_plans):
+        created.append(LessonPlan(group=group, lesson_id=lesson_id))
+
+    LessonPlan.objects.bulk_update(updated, ['start'])
+    LessonPlan.objects.bulk_create(created)
+    if created:
+        for plan in LessonPlan.objects.filter(group=group, lesson_id__in=[plan.lesson_id for plan in created]) \
+                .order_by('pk'):
+            grid.lesson_plans.setdefault(plan.lesson_id, plan)
+    return len(created), len(updated)
+
+
+def save_task_plans(model, task_field, plans, lesson_plans, task_lessons, times):
+    created = []
+    updated = []
+    for task_id, lesson_id in task_lessons.items():
+        plan = plans.get(task_id)
+        if plan is None:
+            plan = model(lessonplan=lesson_plans[lesson_id], **{task_field: task_id})
+        old = (plan.start, plan.end)
+        plan.start = times[task_id].get('start', plan.start)
+        plan.end = times[task_id].get('end', plan.end)
+        plan.check_datetimes()
+        if plan.pk is None:
+            created.append(plan)
+        elif (plan.start, plan.end) != old:
+            updated.append(plan)
+    model.objects.bulk_update(updated, ['start', 'end'])
+    model.objects.bulk_create(created)
+    return len(created), len(updated)
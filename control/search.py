@@ -0,0 +1,238 @@
+import html
+import re
+import time
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.html import strip_tags
+
+from control.models import Course, Discipline, Lesson, Test, Question, Answer, Enrollment, SearchDocument
+from study_control.settings import SEARCH_INDEX_RECHECK
+
+# Внешняя FTS5-таблица (SQLite) и FULLTEXT-индекс (MySQL) над SearchDocument
+FTS_TABLE = 'control_searchdocument_fts'
+FULLTEXT_INDEX = 'control_searchdocument_fulltext'
+
+# Вес заголовка относительно текста при ранжировании bm25
+TITLE_WEIGHT = 10.0
+
+# Наличие индекса запоминается в процессе и перепроверяется раз в SEARCH_INDEX_RECHECK секунд
+_index_ready = None
+_index_checked = 0.0
+
+
+def plain_text(value):
+    # Текст полей TinyMCE без разметки и HTML-сущностей
+    return re.sub(r'\s+', ' ', html.unescape(strip_tags(value or ''))).strip()
+
+
+def course_document(course):
+    return SearchDocument(kind=SearchDocument.COURSE, object_id=course.pk, course_id=course.pk,
+                          title=course.name[:256], body=plain_text(course.description))
+
+
+def lesson_document(lesson, course_id):
+    return SearchDocument(kind=SearchDocument.LESSON, object_id=lesson.pk, course_id=course_id,
+                          title=lesson.name[:256], body=plain_text(lesson.description))
+
+
+def question_document(question, course_id, answers):
+    text = plain_text(question.text)
+    body = ' '.join([text] + [plain_text(answer.text) for answer in answers])
+    return SearchDocument(kind=SearchDocument.QUESTION, object_id=question.pk, course_id=course_id,
+                          title=text[:256], body=body)
+
+
+def store(document):
+    SearchDocument.objects.update_or_create(kind=document.kind, object_id=document.object_id,
+                                            defaults={'course_id': document.course_id, 'title': document.title,
+                                                      'body': document.body})
+
+
+def index_question(question_id):
+    question = Question.objects.filter(pk=question_id).select_related('test__lesson__discipline').first()
+    if question is not None:
+        store(question_document(question, question.test.lesson.discipline.course_id, question.answer.all()))
+
+
+def rebuild_documents(batch_size=1000):
+    # Полное перестроение таблицы документов в одной транзакции: до ее завершения
+    # поиск видит прежние документы. Возвращает количество документов.
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        total = 0
+        documents = [course_document(course) for course in Course.objects.all().iterator()]
+        documents += [lesson_document(lesson, lesson.discipline.course_id)
+                      for lesson in Lesson.objects.select_related('discipline').iterator()]
+        SearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+        total += len(documents)
+
+        questions = Question.objects.select_related('test__lesson__discipline').prefetch_related('answer') \
+            .order_by('pk')
+        last_pk = 0
+        while True:
+            batch = list(questions.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            SearchDocument.objects.bulk_create([question_document(question, question.test.lesson.discipline.course_id,
+                                                                  question.answer.all()) for question in batch])
+            total += len(batch)
+            last_pk = batch[-1].pk
+        return total
+
+
+def index_ready():
+    global _index_ready, _index_checked
+    if _index_ready is None or time.monotonic() - _index_checked >= SEARCH_INDEX_RECHECK:
+        _index_checked = time.monotonic()
+        table = SearchDocument._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                _index_ready = FTS_TABLE in connection.introspection.table_names(cursor)
+            elif connection.vendor == 'mysql':
+                constraints = connection.introspection.get_constraints(cursor, table)
+                _index_ready = any(constraint.get('type') == 'fulltext' for constraint in constraints.values())
+            else:
+                _index_ready = False
+    return _index_ready
+
+
+def create_index():
+    # Создание полнотекстового индекса для текущей СУБД; для остальных СУБД поиск идет через LIKE
+    global _index_ready
+    table = SearchDocument._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5(title, body, content='{1}', "
+                           "content_rowid='id', tokenize='unicode61 remove_diacritics 2')".format(FTS_TABLE, table))
+            # Триггеры синхронизации внешней FTS5-таблицы с таблицей документов
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS {0}_ai AFTER INSERT ON {1} BEGIN "
+                           "INSERT INTO {0}(rowid, title, body) VALUES (new.id, new.title, new.body); END"
+                           .format(FTS_TABLE, table))
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS {0}_ad AFTER DELETE ON {1} BEGIN "
+                           "INSERT INTO {0}({0}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+                           "END".format(FTS_TABLE, table))
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS {0}_au AFTER UPDATE ON {1} BEGIN "
+                           "INSERT INTO {0}({0}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+                           "INSERT INTO {0}(rowid, title, body) VALUES (new.id, new.title, new.body); END"
+                           .format(FTS_TABLE, table))
+            cursor.execute("INSERT INTO {0}({0}) VALUES ('rebuild')".format(FTS_TABLE))
+        elif connection.vendor == 'mysql':
+            _index_ready = None
+            if not index_ready():
+                cursor.execute('ALTER TABLE {0} ADD FULLTEXT INDEX {1} (title, body)'.format(table, FULLTEXT_INDEX))
+    _index_ready = None
+    return index_ready()
+
+
+def visible_documents(user, kind=None):
+    # Описания курсов видны всем, занятия - учащимся курса,
+    # занятия и вопросы - заведующему курсом и преподавателям его дисциплин
+    documents = SearchDocument.objects.all()
+    if kind:
+        documents = documents.filter(kind=kind)
+    if user.is_superuser:
+        return documents
+    condition = Q(kind=SearchDocument.COURSE)
+    if user.is_authenticated:
+        studied = Enrollment.objects.filter(user=user, status=Enrollment.STUDENT).values_list('course_id', flat=True)
+        condition |= Q(kind=SearchDocument.LESSON, course_id__in=list(studied))
+        if user.is_staff:
+            managed = Course.objects.filter(Q(owner=user) | Q(discipline__teacher=user)).values_list('pk', flat=True)
+            condition |= Q(course_id__in=list(set(managed)))
+    return documents.filter(condition)
+
+
+def fts_query(text):
+    # Слова запроса как фразы FTS5 с поиском по префиксу; операторы пользователя не интерпретируются
+    return ' '.join('"{0}"*'.format(word) for word in re.findall(r'\w+', text)[:16])
+
+
+def ranked_ids(documents, text, limit):
+    if connection.vendor == 'sqlite':
+        match = fts_query(text)
+        if not match:
+            return []
+        sql = 'SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(FTS_TABLE)
+        params = [match]
+        if documents.query.where:
+            subquery, subparams = documents.values('pk').query.sql_with_params()
+            sql += ' AND rowid IN ({0})'.format(subquery)
+            params += list(subparams)
+        sql += ' ORDER BY bm25({0}, %s, 1.0) LIMIT %s'.format(FTS_TABLE)
+        params += [TITLE_WEIGHT, limit]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    table = SearchDocument._meta.db_table
+    against = 'MATCH ({0}.title, {0}.body) AGAINST (%s IN NATURAL LANGUAGE MODE)'.format(table)
+    documents = documents.extra(select={'score': against}, select_params=[text], where=[against], params=[text])
+    return list(documents.order_by('-score').values_list('pk', flat=True)[:limit])
+
+
+def search(user, text, kind=None, limit=20):
+    text = (text or '').strip()
+    if not text:
+        return []
+    documents = visible_documents(user, kind)
+    if index_ready():
+        ids = ranked_ids(documents, text, limit)
+        found = SearchDocument.objects.select_related('course').in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
+    return list(documents.filter(Q(title__icontains=text) | Q(body__icontains=text))
+                .select_related('course').order_by('-updated')[:limit])
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    store(course_document(instance))
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, **kwargs):
+    course_id = Discipline.objects.filter(pk=instance.discipline_id).values_list('course_id', flat=True).first()
+    store(lesson_document(instance, course_id))
+    questions = Question.objects.filter(test__lesson=instance).values_list('pk', flat=True)
+    SearchDocument.objects.filter(kind=SearchDocument.QUESTION, object_id__in=list(questions)) \
+        .exclude(course_id=course_id).update(course_id=course_id)
+
+
+@receiver(post_save, sender=Discipline)
+def discipline_saved(sender, instance, **kwargs):
+    lessons = list(Lesson.objects.filter(discipline=instance).values_list('pk', flat=True))
+    questions = list(Question.objects.filter(test__lesson__in=lessons).values_list('pk', flat=True))
+    SearchDocument.objects.filter(Q(kind=SearchDocument.LESSON, object_id__in=lessons) |
+                                  Q(kind=SearchDocument.QUESTION, object_id__in=questions)) \
+        .exclude(course_id=instance.course_id).update(course_id=instance.course_id)
+
+
+@receiver(post_save, sender=Test)
+def test_saved(sender, instance, **kwargs):
+    course_id = Lesson.objects.filter(pk=instance.lesson_id).values_list('discipline__course_id', flat=True).first()
+    questions = Question.objects.filter(test=instance).values_list('pk', flat=True)
+    SearchDocument.objects.filter(kind=SearchDocument.QUESTION, object_id__in=list(questions)) \
+        .exclude(course_id=course_id).update(course_id=course_id)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    index_question(instance.pk)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    index_question(instance.question_id)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, **kwargs):
+    SearchDocument.objects.filter(kind=SearchDocument.LESSON, object_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    SearchDocument.objects.filter(kind=SearchDocument.QUESTION, object_id=instance.pk).delete()
@@ -0,0 +1,91 @@
+// Загрузка решения частями с продолжением после обрыва связи
+var upload_form = document.getElementById('upload-form');
+var upload_status = document.getElementById('upload-status');
+var chunk_url = upload_form.dataset.chunkUrl;
+var chunk_size = parseInt(upload_form.dataset.chunkSize);
+var max_retries = 10;
+
+function uploadId(file) {
+    // Один и тот же файл получает тот же идентификатор, поэтому загрузку можно продолжить
+    let hash = 0;
+    let key = file.name + '|' + file.size + '|' + file.lastModified;
+    for (let i = 0; i < key.length; i++) {
+        hash = ((hash << 5) - hash + key.charCodeAt(i)) | 0;
+    }
+    return (hash >>> 0).toString(16) + '-' + file.size + '-' + file.lastModified;
+}
+
+function showStatus(text) {
+    upload_status.innerText = text;
+}
+
+function sendChunk(file, id, offset, retry) {
+    let token = document.getElementsByName("csrfmiddlewaretoken")[0].value;
+    let data = new FormData();
+    data.append('csrfmiddlewaretoken', token);
+    data.append('upload_id', id);
+    data.append('filename', file.name);
+    data.append('offset', offset);
+    data.append('total', file.size);
+    data.append('chunk', file.slice(offset, offset + chunk_size));
+    $.ajax({
+        type: 'POST',
+        url: chunk_url,
+        data: data,
+        processData: false,
+        contentType: false,
+        success: function(response) {
+            if (response['redirect']) {
+                document.location.replace(response['redirect']);
+                return;
+            }
+            showStatus('Загружено ' + Math.floor(response['offset'] * 100 / file.size) + '%');
+            sendChunk(file, id, response['offset'], 0);
+        },
+        error: function(xhr) {
+            if (xhr.status === 409 && xhr.responseJSON['offset'] !== offset) {
+                // Сервер принял другой объем данных: продолжаем с его смещения
+                sendChunk(file, id, xhr.responseJSON['offset'], retry);
+            }
+            else if (xhr.status === 409 && retry < max_retries) {
+                // Эту загрузку сейчас дописывает другой запрос: повтор с паузой
+                showStatus('Загрузка занята, повтор...');
+                setTimeout(function() { sendChunk(file, id, offset, retry + 1); }, 1000 * (retry + 1));
+            }
+            else if (xhr.status === 400) {
+                showStatus(xhr.responseJSON['error']);
+            }
+            else if (retry < max_retries) {
+                showStatus('Связь прервана, повтор...');
+                setTimeout(function() { resume(file, id, retry + 1); }, 2000 * (retry + 1));
+            }
+            else {
+                showStatus('Не удалось загрузить файл. Отправьте его еще раз - загрузка продолжится.');
+            }
+        }
+    });
+}
+
+function resume(file, id, retry) {
+    $.ajax({
+        type: 'GET',
+        url: chunk_url,
+        data: { upload_id: id },
+        success: function(response) { sendChunk(file, id, response['offset'], retry); },
+        error: function() {
+            if (retry < max_retries) {
+                setTimeout(function() { resume(file, id, retry + 1); }, 2000 * (retry + 1));
+            }
+        }
+    });
+}
+
+upload_form.addEventListener('submit', function(e) {
+    let input = upload_form.querySelector('input[type=file]');
+    if (!input.files.length || typeof FormData === 'undefined' || !Blob.prototype.slice) {
+        return;
+    }
+    e.preventDefault();
+    let file = input.files[0];
+    resume(file, uploadId(file), 0);
+});
@@ -151,7 +151,8 @@ document.getElementById("num_1").classList.add("bg-warning", "text-white");
 
         function sync(){
             let token = document.getElementsByName("csrfmiddlewaretoken")[0].value;
-            let msg = { csrfmiddlewaretoken: token };
+            let deadline = document.getElementById("deadline").value;
+            let msg = { csrfmiddlewaretoken: token, deadline: deadline };
             $.ajax({
                 type: 'POST',
                 url: document.getElementById("sync_url").value,
@@ -0,0 +1,96 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from control.middleware import QueryStats
+from control.models import Question, ResultQuestion, ResultAnswer, ResultTest, AnswerSnapshot
+from control.versions import version_answers
+
+
+# Итог записи попытки: сколько вопросов и ответов сохранено и сколько запросов к БД потребовалось
+SubmissionReport = namedtuple('SubmissionReport', ['questions', 'answers', 'queries'])
+
+
+def parse_given(data):
+    # Идентификаторы выбранных ответов из POST-данных формы теста (имя поля - id вопроса)
+    given = set()
+    for key, values in data.lists():
+        if not key.isdigit():
+            continue
+        given.update(int(value) for value in values if value.isdigit())
+    return given
+
+
+def claim_submission(result):
+    # Ответы попытки принимаются один раз. Условное обновление отметки внутри транзакции записи
+    # не пропускает и одновременную повторную отправку; при ошибке записи отметка откатывается.
+    if not ResultTest.objects.filter(pk=result.pk, submitted=False).update(submitted=True):
+        return False
+    result.submitted = True
+    return True
+
+
+def write_attempt(result, test, given, end_time=None):
+    # Попытка, привязанная к версии теста, хранит только выбранные ответы.
+    # Оценка считается тут же, по данным в памяти. Возвращает None, если ответы уже были приняты.
+    if result.version_id is None:
+        return write_legacy_attempt(result, test, given, end_time)
+    counter = QueryStats()
+    with connection.execute_wrapper(counter), transaction.atomic():
+        if not claim_submission(result):
+            return None
+        points = 0
+        chosen = []
+        questions = version_answers([result.version_id]).get(result.version_id, [])
+        correct = set(AnswerSnapshot.objects.filter(question__version=result.version_id, correct=True)
+                      .values_list('pk', flat=True))
+        for answer_ids in questions:
+            selected = {answer_id for answer_id in answer_ids if answer_id in given}
+            chosen.extend(selected)
+            if selected == correct.intersection(answer_ids):
+                points += 1
+        through = ResultTest.given_answers.through
+        through.objects.bulk_create([through(resulttest_id=result.pk, answersnapshot_id=answer_id)
+                                     for answer_id in chosen], ignore_conflicts=True)
+
+        result.end_time = end_time or timezone.now()
+        result.set_score(len(questions), points, test.pass_percent)
+        result.save(update_fields=['end_time', 'percent', 'passed', 'questions_count', 'correct_count'])
+    return SubmissionReport(len(questions), len(chosen), counter.count)
+
+
+def write_legacy_attempt(result, test, given, end_time=None):
+    # Попытка без версии (начата до перехода на версии тестов): снимок собирается
+    # в памяти с уже отмеченными ответами и записывается пачками в одной транзакции.
+    counter = QueryStats()
+    with connection.execute_wrapper(counter), transaction.atomic():
+        if not claim_submission(result):
+            return None
+        questions = list(Question.objects.filter(test=test).prefetch_related('answer').order_by('pk'))
+        result_questions = [ResultQuestion(test=result, text=question.text) for question in questions]
+        ResultQuestion.objects.bulk_create(result_questions)
+        if result_questions and result_questions[0].pk is None:
+            # Бэкенд не возвращает ключи после bulk_create (MySQL) - забираем последние записанные
+            ids = list(ResultQuestion.objects.filter(test=result).order_by('-pk')
+                       .values_list('pk', flat=True)[:len(result_questions)])
+            for result_question, pk in zip(result_questions, reversed(ids)):
+                result_question.pk = pk
+
+        result_answers = []
+        points = 0
+        for question, result_question in zip(questions, result_questions):
+            correct = True
+            for answer in question.answer.all():
+                result_answer = ResultAnswer(question=result_question, text=answer.text, correct=answer.correct,
+                                             given=answer.pk in given)
+                correct = correct and result_answer.correct == result_answer.given
+                result_answers.append(result_answer)
+            if correct:
+                points += 1
+        ResultAnswer.objects.bulk_create(result_answers)
+
+        result.end_time = end_time or timezone.now()
+        result.set_score(len(questions), points, test.pass_percent)
+        result.save(update_fields=['end_time', 'percent', 'passed', 'questions_count', 'correct_count'])
+    return SubmissionReport(len(result_questions), len(result_answers), counter.count)
@@ -0,0 +1,412 @@
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.db.models import Q, Count
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.formats import localize
+from django.utils.html import format_html, format_html_join
+
+from control.models import Direction, Course, Discipline, Lesson, Group, Test, FileTask, ResultTest, \
+    ResultFile, Enrollment
+
+# Столбец таблицы: поле для сортировки (None - без сортировки) и поля для поиска
+Column = namedtuple('Column', ['order', 'search'])
+
+# Наибольший размер страницы, отдаваемый за один запрос
+MAX_LENGTH = 100
+
+
+def full_name(user):
+    return '{0} {1} {2}'.format(user.last_name, user.first_name, user.profile.patronymic)
+
+
+def name_search(prefix):
+    return [prefix + 'last_name', prefix + 'first_name', prefix + 'profile__patronymic']
+
+
+def link_button(url, label):
+    return format_html('<a class="btn btn-primary" href="{0}">{1}</a>', url, label)
+
+
+def delete_form(url, token, label="Удалить"):
+    return format_html('<form action="{0}" method="post">'
+                       '<input type="hidden" name="csrfmiddlewaretoken" value="{1}">'
+                       '<button class="btn btn-danger" type="submit">{2}</button></form>', url, token, label)
+
+
+def as_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class DataTable:
+    # Серверная обработка таблиц jquery.dataTables: страница, сортировка и поиск выполняются в БД.
+    # Наследники задают columns, get_queryset() и row().
+
+    columns = []
+    # Таблица доступна только администраторам
+    superuser = False
+
+    def __init__(self, request, pk=None):
+        self.request = request
+        self.user = request.user
+        self.pk = pk
+        self.token = get_token(request)
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def row(self, obj):
+        raise NotImplementedError
+
+    def rows(self, page):
+        return [self.row(obj) for obj in page]
+
+    def restrict(self, queryset, condition):
+        # Ограничение по правам через подзапрос, чтобы соединения не дублировали строки
+        if self.user.is_superuser:
+            return queryset
+        return queryset.filter(pk__in=queryset.model.objects.filter(condition).values('pk'))
+
+    def search(self, queryset, value):
+        condition = Q()
+        for column in self.columns:
+            for field in column.search:
+                condition |= Q(**{field + '__icontains': value})
+        return queryset.filter(condition)
+
+    def ordering(self, params):
+        ordering = []
+        index = 0
+        while 'order[{0}][column]'.format(index) in params:
+            column = as_int(params.get('order[{0}][column]'.format(index)), -1)
+            if 0 <= column < len(self.columns) and self.columns[column].order:
+                desc = params.get('order[{0}][dir]'.format(index)) == 'desc'
+                ordering.append(('-' if desc else '') + self.columns[column].order)
+            index += 1
+        return ordering + ['pk']
+
+    def response(self):
+        params = self.request.GET
+        start = max(0, as_int(params.get('start'), 0))
+        length = as_int(params.get('length'), 10)
+        if length <= 0 or length > MAX_LENGTH:
+            length = MAX_LENGTH
+
+        queryset = self.get_queryset()
+        total = queryset.count()
+        value = params.get('search[value]', '').strip()
+        if value:
+            queryset = self.search(queryset, value)
+            filtered = queryset.count()
+        else:
+            filtered = total
+        page = queryset.order_by(*self.ordering(params))[start:start + length]
+        return JsonResponse({
+            'draw': as_int(params.get('draw'), 0),
+            'recordsTotal': total,
+            'recordsFiltered': filtered,
+            'data': self.rows(page),
+        })
+
+
+class UserTable(DataTable):
+    superuser = True
+    columns = [
+        Column('last_name', name_search('') + ['username']),
+        Column('is_staff', []),
+        Column('last_login', []),
+        Column(None, []),
+        Column(None, []),
+    ]
+
+    def get_queryset(self):
+        return User.objects.select_related('profile')
+
+    def row(self, user):
+        return [
+            full_name(user),
+            "Нет" if user.is_staff else "Да",
+            localize(timezone.localtime(user.last_login)) if user.last_login else "",
+            link_button(reverse('user_edit', kwargs={'pk': user.pk}), "Редактировать"),
+            delete_form(reverse('user_del', kwargs={'pk': user.pk}), self.token),
+        ]
+
+
+class DirectionTable(DataTable):
+    columns = [
+        Column('name', ['name']),
+        Column(None, []),
+        Column(None, []),
+    ]
+
+    def get_queryset(self):
+        return Direction.objects.all()
+
+    def row(self, direction):
+        row = [direction.name]
+        if self.user.is_superuser:
+            row += [link_button(reverse('direction_edit', kwargs={'pk': direction.pk}), "Редактировать"),
+                    delete_form(reverse('direction_del', kwargs={'pk': direction.pk}), self.token)]
+        return row
+
+
+class CourseTable(DataTable):
+    columns = [
+        Column('name', ['name']),
+        Column('owner__last_name', name_search('owner__')),
+        Column(None, []),
+        Column(None, []),
+        Column(None, []),
+        Column(None, []),
+    ]
+
+    def get_queryset(self):
+        return Course.objects.select_related('owner__profile')
+
+    def rows(self, page):
+        return super().rows(page.prefetch_related('discipline', 'group'))
+
+    def row(self, course):
+        row = [
+            course.name,
+            full_name(course.owner) if course.owner else "",
+            format_html_join('', '<div>{0}</div>', ((discipline.name,) for discipline in course.discipline.all())),
+            format_html_join('', '<div>{0}</div>', ((group.name,) for group in course.group.all())),
+        ]
+        if self.user.is_superuser:
+            row += [link_button(reverse('course_edit', kwargs={'slug': course.slug}), "Редактировать"),
+                    delete_form(reverse('course_del', kwargs={'slug': course.slug}), self.token)]
+        return row
+
+
+class DisciplineTable(DataTable):
+    columns = [
+        Column('name', ['name']),
+        Column('course__name', ['course__name']),
+        Column('teacher__last_name', name_search('teacher__')),
+        Column(None, []),
+        Column(None, []),
+    ]
+
+    def __init__(self, request, pk=None):
+        super().__init__(request, pk)
+        self.owner = self.user.is_superuser or Discipline.objects.filter(course__owner=self.user).exists()
+
+    def get_queryset(self):
+        return self.restrict(Discipline.objects.select_related('course', 'teacher__profile'),
+                             Q(teacher=self.user) | Q(course__owner=self.user))
+
+    def row(self, discipline):
+        row = [discipline.name, discipline.course.name, full_name(discipline.teacher) if discipline.teacher else ""]
+        if self.owner:
+            if self.user.is_superuser or discipline.course.owner_id == self.user.pk:
+                row += [link_button(reverse('discipline_edit', kwargs={'pk': discipline.pk}), "Редактировать"),
+                        delete_form(reverse('discipline_del', kwargs={'pk': discipline.pk}), self.token)]
+            else:
+                row += ["", ""]
+        return row
+
+
+class LessonTable(DataTable):
+    columns = [
+        Column('name', ['name']),
+        Column('discipline__name', ['discipline__name']),
+        Column('discipline__teacher__last_name', name_search('discipline__teacher__')),
+        Column(None, []),
+        Column(None, []),
+    ]
+
+    def get_queryset(self):
+        return self.restrict(Lesson.objects.select_related('discipline__teacher__profile'),
+                             Q(discipline__teacher=self.user) | Q(discipline__course__owner=self.user))
+
+    def row(self, lesson):
+        teacher = lesson.discipline.teacher
+        return [
+            lesson.name,
+            lesson.discipline.name,
+            full_name(teacher) if teacher else "",
+            link_button(reverse('lesson_edit', kwargs={'pk': lesson.pk}), "Редактировать"),
+            delete_form(reverse('lesson_del', kwargs={'pk': lesson.pk}), self.token),
+        ]
+
+
+class TaskTable(DataTable):
+    # Тесты и задания с загрузкой файла выводятся одинаково
+    columns = [
+        Column('name', ['name']),
+        Column('lesson__name', ['lesson__name']),
+        Column('lesson__discipline__name', ['lesson__discipline__name']),
+        Column('lesson__discipline__course__name', ['lesson__discipline__course__name']),
+        Column(None, []),
+        Column(None, []),
+        Column(None, []),
+    ]
+    model = None
+    urls = ()
+
+    def get_queryset(self):
+        return self.restrict(self.model.objects.select_related('lesson__discipline__course'),
+                             Q(lesson__discipline__teacher=self.user) | Q(lesson__discipline__course__owner=self.user))
+
+    def row(self, task):
+        results, edit, delete = self.urls
+        return [
+            task.name,
+            task.lesson.name,
+            task.lesson.discipline.name,
+            task.lesson.discipline.course.name,
+            link_button(reverse(results, kwargs={'pk': task.pk}), "Просмотреть"),
+            link_button(reverse(edit, kwargs={'pk': task.pk}), "Редактировать"),
+            delete_form(reverse(delete, kwargs={'pk': task.pk}), self.token),
+        ]
+
+
+class TestTable(TaskTable):
+    model = Test
+    urls = ('test_results', 'test_edit', 'test_del')
+
+
+class FileTable(TaskTable):
+    model = FileTask
+    urls = ('file_results', 'file_edit', 'file_del')
+
+
+class GroupTable(DataTable):
+    columns = [
+        Column('name', ['name']),
+        Column('course__name', ['course__name']),
+        Column('study_start', []),
+        Column(None, []),
+        Column('requests_count', []),
+        Column('students_count', []),
+        Column('occupied', []),
+        Column(None, []),
+        Column(None, []),
+        Column(None, []),
+    ]
+
+    def __init__(self, request, pk=None):
+        super().__init__(request, pk)
+        self.owner = self.user.is_superuser or Course.objects.filter(owner=self.user).exists()
+
+    def get_queryset(self):
+        groups = self.restrict(Group.objects.select_related('course'),
+                               Q(course__discipline__teacher=self.user) | Q(course__owner=self.user))
+        return groups.annotate(requests_count=Count('enrollment', filter=Q(enrollment__status=Enrollment.REQUEST)),
+                               students_count=Count('enrollment', filter=Q(enrollment__status=Enrollment.STUDENT)))
+
+    def row(self, group):
+        allowed = self.user.is_superuser or group.course.owner_id == self.user.pk
+        students = '{0} из {1}'.format(group.students_count, group.max_users)
+        # Места занимают и учащиеся, и заявки
+        seats = '{0} из {1}'.format(group.occupied, group.max_users)
+        if allowed:
+            requests = format_html('<a href="{0}">{1}</a>',
+                                   reverse('requests_group', kwargs={'pk': group.pk}), group.requests_count)
+            students = format_html('<a href="{0}">{1}</a>', reverse('students_group', kwargs={'pk': group.pk}),
+                                   students)
+        else:
+            requests = group.requests_count
+        row = [
+            group.name,
+            group.course.name,
+            group.get_status(),
+            link_button(reverse('group_statistics', kwargs={'pk': group.pk}), "Просмотреть"),
+            requests,
+            students,
+            seats,
+            link_button(reverse('group_plan', kwargs={'pk': group.pk}), "Настроить"),
+        ]
+        if self.owner:
+            if allowed:
+                row += [link_button(reverse('group_edit', kwargs={'pk': group.pk}), "Редактировать"),
+                        delete_form(reverse('group_del', kwargs={'pk': group.pk}), self.token)]
+            else:
+                row += ["", ""]
+        return row
+
+
+class TestResultTable(DataTable):
+    columns = [
+        Column('user__last_name', name_search('user__')),
+        Column(None, []),
+        Column('percent', []),
+        Column('passed', []),
+        Column(None, []),
+        Column(None, []),
+    ]
+
+    def get_queryset(self):
+        self.test = get_object_or_404(Test.objects.select_related('lesson__discipline'), pk=self.pk)
+        return ResultTest.objects.filter(test=self.test).select_related('user__profile')
+
+    def rows(self, page):
+        return super().rows(Enrollment.attach_groups(page, self.test.lesson.discipline.course_id))
+
+    def row(self, result):
+        return [
+            full_name(result.user),
+            result.get_user_group(),
+            "" if result.percent is None else result.percent,
+            "Да" if result.passed else "Нет",
+            format_html('<a href="{0}">Просмотреть</a>', reverse('test_detail', kwargs={'pk': result.pk})),
+            format_html('<form action="{0}" method="post">'
+                        '<input type="hidden" name="csrfmiddlewaretoken" value="{1}">'
+                        '<input hidden name="result" value="{2}">'
+                        '<button class="btn btn-danger" type="submit">Удалить</button></form>',
+                        reverse('test_results', kwargs={'pk': self.test.pk}), self.token, result.pk),
+        ]
+
+
+class FileResultTable(DataTable):
+    columns = [
+        Column('user__last_name', name_search('user__')),
+        Column(None, []),
+        Column(None, []),
+        Column('accepted', []),
+    ]
+
+    def get_queryset(self):
+        self.filetask = get_object_or_404(FileTask.objects.select_related('lesson__discipline'), pk=self.pk)
+        return ResultFile.objects.filter(filetask=self.filetask).select_related('user__profile')
+
+    def rows(self, page):
+        return super().rows(Enrollment.attach_groups(page, self.filetask.lesson.discipline.course_id))
+
+    def row(self, result):
+        if result.accepted is not None:
+            status = "Зачтено" if result.accepted else "Не зачтено"
+        else:
+            status = format_html(
+                '<div><input class="form-check-input" id="{0}_true" type="radio" name="{0}" value="1" '
+                'autocomplete="off"><label for="{0}_true">Зачтено</label></div>'
+                '<div><input class="form-check-input" id="{0}_false" type="radio" name="{0}" value="0" '
+                'autocomplete="off"><label for="{0}_false">Не зачтено</label></div>', result.pk)
+        return [
+            full_name(result.user),
+            result.get_user_group(),
+            format_html('<a target="_blank" href="{0}">Загрузить</a>', result.file.url) if result.file else "",
+            status,
+        ]
+
+
+TABLES = {
+    'users': UserTable,
+    'directions': DirectionTable,
+    'courses': CourseTable,
+    'disciplines': DisciplineTable,
+    'lessons': LessonTable,
+    'tests': TestTable,
+    'files': FileTable,
+    'groups': GroupTable,
+    'test_results': TestResultTable,
+    'file_results': FileResultTable,
+}
@@ -0,0 +1,68 @@
+import os
+
+from pytils.translit import slugify
+
+from control.export import test_result_rows, gradebook_rows, write_export
+from control.jobs import task
+from control.models import Course, Group, Test, ResultTest
+from control.renditions import generate_renditions
+from study_control.settings import JOBS_FILES_DIR
+
+# Количество попыток, удаляемых одним запросом при удалении курса
+DELETE_BATCH = 1000
+
+
+@task()
+def delete_course(job, course_id):
+    course = Course.objects.filter(pk=course_id).first()
+    if course is None:
+        return {'results': 0}
+    # Попытки тестов удаляются пачками, остальное - каскадным удалением курса
+    results = ResultTest.objects.filter(test__lesson__discipline__course=course)
+    total = results.count() + 1
+    deleted = 0
+    while True:
+        ids = list(results.values_list('pk', flat=True)[:DELETE_BATCH])
+        if not ids:
+            break
+        ResultTest.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+        job.report(deleted, total, 'Удалено попыток: {0}'.format(deleted))
+    job.report(deleted, total, 'Удаление курса "{0}"'.format(course.name))
+    course.delete()
+    return {'results': deleted}
+
+
+@task('generate_renditions')
+def course_renditions(job, name):
+    generate_renditions(name)
+
+
+def export_file(job, rows, total, fmt, filename, sheet):
+    # Выгрузка в JOBS_FILES_DIR; файл отдает JobFileView
+    fmt = 'xlsx' if fmt == 'xlsx' else 'csv'
+    os.makedirs(JOBS_FILES_DIR, exist_ok=True)
+    path = '{0}.{1}'.format(job.pk, fmt)
+
+    def counted():
+        for number, row in enumerate(rows):
+            if number % 500 == 0:
+                job.report(number, total + 1, 'Выгружено строк: {0}'.format(number))
+            yield row
+
+    write_export(counted(), os.path.join(JOBS_FILES_DIR, path), fmt, sheet)
+    return {'file': path, 'filename': '{0}.{1}'.format(filename, fmt)}
+
+
+@task()
+def export_test_results(job, test_id, fmt):
+    test = Test.objects.get(pk=test_id)
+    return export_file(job, test_result_rows(test), ResultTest.objects.filter(test=test).count(), fmt,
+                       slugify(test.name) or 'results', test.name)
+
+
+@task()
+def export_gradebook(job, group_id, fmt):
+    group = Group.objects.get(pk=group_id)
+    return export_file(job, gradebook_rows(group), group.occupied, fmt, slugify(str(group)) or 'gradebook',
+                       group.name)
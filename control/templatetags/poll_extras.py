@@ -4,6 +4,8 @@ import random
 
 from django.utils import timezone
 
+from control.renditions import rendition_url
+
 register = template.Library()
 
 @register.filter
@@ -67,4 +69,9 @@ def is_owner(course, user):
 
 @register.filter(name='is_teacher')
 def is_teacher(discipline, user):
-    return discipline.is_teacher(user)
\ No newline at end of file
+    return discipline.is_teacher(user)
+
+
+@register.simple_tag(name='rendition')
+def rendition(image, size, fmt='JPEG'):
+    return rendition_url(image, size, fmt)
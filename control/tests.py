@@ -1,3 +1,577 @@
+import datetime
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from control.dataset import DatasetConfig, build_dataset
+from control.export import test_result_rows, sheet_name, DEFAULT_SHEET
+from control import metrics, search
+from control.jobs import TASKS, execute
+from control.middleware import VIEW_TOTALS
+from control.renditions import rendition_name, rendition_url
+from control.uploads import append_chunk, lock_partial, partial_path, partial_size, remove_stale_partials
+from control.models import Direction, Course, Discipline, Lesson, Test, Question, Answer, FileTask, Group, \
+    Enrollment, LessonPlan, TestPlan, FilePlan, ResultTest, ResultFile, Job, SearchDocument
+
+# Размер тестовых данных: при N+1 число запросов растет вместе с ним и выходит за бюджет
+STUDENTS = 20
+LESSONS = 3
+QUESTIONS = 5
+ANSWERS = 4
+
+
+def seed():
+    # Курс с планом занятий, группой учащихся и их результатами
+    now = timezone.now()
+    today = datetime.date.today()
+    admin = User.objects.create_superuser('admin', 'admin@example.com', 'password', first_name='Админ',
+                                          last_name='Админов')
+    teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password', first_name='Учитель',
+                                       last_name='Учителев', is_staff=True)
+    students = [User.objects.create_user('student{0}'.format(number), password='password', first_name='Учащийся',
+                                         last_name='Номер {0}'.format(number)) for number in range(STUDENTS)]
+
+    direction = Direction.objects.create(name='Программирование')
+    course = Course.objects.create(name='Основы программирования', description='<p>Описание <b>курса</b></p>',
+                                   owner=teacher, direction=direction)
+    discipline = Discipline.objects.create(name='Алгоритмы', course=course, teacher=teacher)
+    group = Group.objects.create(name='Группа 1', course=course, max_users=STUDENTS + 10,
+                                 study_start=today - datetime.timedelta(days=10),
+                                 study_end=today + datetime.timedelta(days=30))
+    Enrollment.objects.bulk_create([Enrollment(user=student, group=group, course=course, status=Enrollment.STUDENT)
+                                    for student in students])
+    Group.recount_seats([group.pk])
+
+    tests, files = [], []
+    for number in range(LESSONS):
+        lesson = Lesson.objects.create(name='Занятие {0}'.format(number), discipline=discipline,
+                                       description='<p>Текст занятия {0}</p>'.format(number))
+        test = Test.objects.create(lesson=lesson, name='Тест {0}'.format(number))
+        for question_number in range(QUESTIONS):
+            question = Question.objects.create(test=test, text='<p>Вопрос {0}</p>'.format(question_number))
+            Answer.objects.bulk_create([Answer(question=question, text='Ответ {0}'.format(answer),
+                                               correct=answer == 0) for answer in range(ANSWERS)])
+        filetask = FileTask.objects.create(name='Задание {0}'.format(number), lesson=lesson, filetypes='1')
+        lessonplan = LessonPlan.objects.create(lesson=lesson, group=group, start=now - datetime.timedelta(days=1))
+        TestPlan.objects.create(test=test, lessonplan=lessonplan, start=now - datetime.timedelta(hours=1),
+                                end=now + datetime.timedelta(days=1))
+        FilePlan.objects.create(file=filetask, lessonplan=lessonplan, start=now - datetime.timedelta(hours=1),
+                                end=now + datetime.timedelta(days=1))
+        tests.append(test)
+        files.append(filetask)
+
+    for test in tests:
+        version = test.get_version()
+        ResultTest.objects.bulk_create([ResultTest(test=test, user=student, start_time=now, end_time=now,
+                                                   version=version, submitted=True) for student in students])
+        ResultTest.grade_many(ResultTest.objects.filter(test=test))
+    for filetask in files:
+        ResultFile.objects.bulk_create([ResultFile(filetask=filetask, user=student,
+                                                   file='files/{0}/{1}.txt'.format(filetask.pk, student.pk))
+                                        for student in students])
+    return admin, teacher, students, course, group, tests, files
+
+
+class QueryBudgetTestCase(TestCase):
+    # Основные представления на тестовых данных не должны превышать QUERY_BUDGETS
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.teacher, cls.students, cls.course, cls.group, cls.tests, cls.files = seed()
+
+    def setUp(self):
+        cache.clear()
+
+    def assertWithinBudget(self, name, url, user=None, status=200):
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status)
+        budget = settings.QUERY_BUDGETS[name]
+        self.assertLessEqual(len(queries), budget, '{0}: {1} SQL queries, budget {2}:\n{3}'.format(
+            name, len(queries), budget, '\n'.join(query['sql'] for query in queries)))
+        return response
+
+    def test_index(self):
+        self.assertWithinBudget('index', reverse('index'), self.students[0])
+
+    def test_course(self):
+        self.assertWithinBudget('course', reverse('course', kwargs={'slug': self.course.slug}), self.students[0])
+
+    def test_lesson(self):
+        lesson = self.tests[0].lesson
+        self.assertWithinBudget('lesson', reverse('lesson', kwargs={'slug': self.course.slug, 'pk': lesson.pk}),
+                                self.students[0])
+
+    def test_test(self):
+        test = self.tests[0]
+        ResultTest.objects.filter(test=test, user=self.students[0]).delete()
+        self.assertWithinBudget('test', reverse('test', kwargs={'slug': self.course.slug, 'pk': test.pk}),
+                                self.students[0])
+
+    def test_search(self):
+        self.assertWithinBudget('search', reverse('search') + '?q=курс', self.students[0])
+
+    def test_test_results(self):
+        self.assertWithinBudget('test_results', reverse('test_results', kwargs={'pk': self.tests[0].pk}), self.admin)
+
+    def test_file_results(self):
+        self.assertWithinBudget('file_results', reverse('file_results', kwargs={'pk': self.files[0].pk}), self.admin)
+
+    def test_group_plan(self):
+        self.assertWithinBudget('group_plan', reverse('group_plan', kwargs={'pk': self.group.pk}), self.teacher)
+
+    def test_group_statistics(self):
+        self.assertWithinBudget('group_statistics', reverse('group_statistics', kwargs={'pk': self.group.pk}),
+                                self.teacher)
+
+    def test_tables(self):
+        self.client.force_login(self.admin)
+        for name in ('users', 'courses', 'disciplines', 'lessons', 'tests', 'files', 'groups'):
+            response = self.assertWithinBudget('settings_table', reverse('settings_table', kwargs={'name': name})
+                                               + '?draw=1&start=0&length=100')
+            self.assertEqual(response.json()['draw'], 1)
+        for name, pk in (('test_results', self.tests[0].pk), ('file_results', self.files[0].pk)):
+            response = self.assertWithinBudget('settings_table', reverse('settings_table',
+                                                                         kwargs={'name': name, 'pk': pk}))
+            self.assertEqual(response.json()['recordsTotal'], STUDENTS)
+
+
+class QueryBudgetMiddlewareTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='password')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_totals(self):
+        before = VIEW_TOTALS['index'].requests if 'index' in VIEW_TOTALS else 0
+        self.client.get(reverse('index'))
+        self.assertEqual(VIEW_TOTALS['index'].requests, before + 1)
+        self.assertGreater(VIEW_TOTALS['index'].queries, 0)
+
+    def test_over_budget(self):
+        with self.settings(QUERY_BUDGETS={'index': 0}), self.assertLogs('control.budget', logging.WARNING) as logs:
+            self.client.get(reverse('index'))
+        self.assertIn('index', logs.output[0])
+
+
+class DatasetTestCase(TestCase):
+
+    def test_build_dataset(self):
+        config = DatasetConfig(directions=1, courses=2, teachers=2, disciplines=1, lessons=2, questions=3,
+                               answers=2, groups=1, students=4, attempts=1)
+        dataset = build_dataset(config)
+        self.assertEqual(len(dataset.courses), 2)
+        self.assertEqual(len(dataset.students), 8)
+        self.assertEqual(Enrollment.objects.count(), 8)
+        self.assertEqual(Group.objects.get(pk=dataset.groups[0].pk).occupied, 4)
+        self.assertEqual(ResultTest.objects.count(), 8 * 2)
+        self.assertEqual(ResultTest.given_answers.through.objects.count(), 8 * 2 * 3)
+        self.assertEqual(ResultFile.objects.count(), 8 * 2)
+
+
+class RenditionTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_failed_generation(self):
+        # Неудачная попытка не повторяется при каждом просмотре; вместо WebP отдается JPEG-копия
+        image = mock.Mock(url='/media/uploads/courses/course/image.png')
+        image.name = 'uploads/courses/course/image.png'
+        jpeg = rendition_name(image.name, 'card', 'JPEG')
+        with mock.patch('control.renditions.generate_renditions', side_effect=OSError) as generate, \
+                mock.patch('control.renditions.default_storage') as storage:
+            storage.exists.side_effect = lambda path: path == jpeg
+            storage.url.side_effect = lambda path: '/media/' + path
+            self.assertEqual(rendition_url(image, 'card', 'WEBP'), '/media/' + jpeg)
+            self.assertEqual(rendition_url(image, 'card', 'WEBP'), '/media/' + jpeg)
+            self.assertEqual(rendition_url(image, 'preview', 'WEBP'), image.url)
+        self.assertEqual(generate.call_count, 1)
+
+
+class UploadTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch('control.uploads.PARTIAL_DIR', directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User(pk=1)
+
+    def test_append_chunk(self):
+        self.assertEqual(append_chunk(self.user, 'upload', 0, SimpleUploadedFile('chunk', b'abc')), 3)
+        # Часть с неверным смещением и часть, пришедшая во время записи другой, не дописываются
+        self.assertEqual(append_chunk(self.user, 'upload', 0, SimpleUploadedFile('chunk', b'abc')), 3)
+        writer = open(partial_path(self.user, 'upload'), 'ab')
+        self.assertTrue(lock_partial(writer))
+        self.assertEqual(append_chunk(self.user, 'upload', 3, SimpleUploadedFile('chunk', b'def')), 3)
+        writer.close()
+        self.assertEqual(append_chunk(self.user, 'upload', 3, SimpleUploadedFile('chunk', b'def')), 6)
+
+    def test_stale_lock(self):
+        # Блокировка процесса, завершившегося во время записи, снимается вместе с ним
+        append_chunk(self.user, 'upload', 0, SimpleUploadedFile('chunk', b'abc'))
+        path = partial_path(self.user, 'upload')
+        subprocess.run([sys.executable, '-c', 'import fcntl, os; partial = open({0!r}, "ab"); '
+                        'fcntl.flock(partial.fileno(), fcntl.LOCK_EX); os._exit(1)'.format(path)])
+        # Файл блокировки, оставшийся от прежней версии, запись тоже не останавливает
+        open(path + '.lock', 'w').close()
+        self.assertEqual(append_chunk(self.user, 'upload', 3, SimpleUploadedFile('chunk', b'def')), 6)
+
+    def test_remove_stale_partials(self):
+        append_chunk(self.user, 'old', 0, SimpleUploadedFile('chunk', b'abc'))
+        append_chunk(self.user, 'new', 0, SimpleUploadedFile('chunk', b'abc'))
+        day_ago = time.time() - 24 * 60 * 60
+        os.utime(partial_path(self.user, 'old'), (day_ago, day_ago))
+        self.assertEqual(remove_stale_partials(60 * 60), 1)
+        self.assertEqual(partial_size(self.user, 'old'), 0)
+        self.assertEqual(partial_size(self.user, 'new'), 3)
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, search, '_index_ready', None)
+
+    def test_index_recheck(self):
+        # Наличие индекса перепроверяется по истечении SEARCH_INDEX_RECHECK, без перезапуска процесса
+        search._index_ready, search._index_checked = False, time.monotonic()
+        with CaptureQueriesContext(connection) as queries:
+            search.index_ready()
+        self.assertEqual(len(queries), 0)
+        search._index_checked -= settings.SEARCH_INDEX_RECHECK
+        with CaptureQueriesContext(connection) as queries:
+            search.index_ready()
+        self.assertEqual(len(queries), 1)
+
+    def test_rebuild_is_atomic(self):
+        Course.objects.create(name='Курс', description='<p>Описание</p>', owner=User.objects.create_user('owner'))
+        with mock.patch('control.search.course_document', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            search.rebuild_documents()
+        self.assertTrue(SearchDocument.objects.filter(kind=SearchDocument.COURSE).exists())
+
+
+class ExportTestCase(TestCase):
+
+    def test_sheet_name(self):
+        self.assertEqual(sheet_name('Тест [1]: a/b\\c*?'), 'Тест 1 abc')
+        self.assertEqual(sheet_name('?*[]'), DEFAULT_SHEET)
+        self.assertEqual(sheet_name("'Итоги'"), 'Итоги')
+        self.assertEqual(len(sheet_name('x' * 40)), 31)
+
+
+class MetricsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('teacher', password='password', is_staff=True)
+        cls.student = User.objects.create_user('student', password='password')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = mock.patch('control.metrics.METRICS_DIR', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_staff_only(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_token(self):
+        with mock.patch('control.views.METRICS_TOKEN', 'secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_render(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('study_control_http_requests_total{status="200",view="index"}', text)
+        self.assertIn('study_control_http_request_duration_seconds_bucket{view="index",le="+Inf"}', text)
+        self.assertIn('study_control_cache_hit_ratio{cache="catalogue"}', text)
+        self.assertIn('study_control_active_test_attempts 0', text)
+
+    def test_processes_are_summed(self):
+        # Файл другого рабочего процесса складывается с показателями текущего
+        metrics.inc('upload_bytes_total', 100)
+        with open(os.path.join(self.directory, '{0}.json'.format(os.getppid())), 'w', encoding='utf-8') as file:
+            json.dump({'counters': [['upload_bytes_total', {}, 50]], 'histograms': []}, file)
+        before = metrics.REGISTRY.counters[('upload_bytes_total', ())]
+        counters, histograms = metrics.aggregate()
+        self.assertEqual(counters[('upload_bytes_total', ())], before + 50)
+
+    def write_process_file(self, pid, modified=None):
+        path = os.path.join(self.directory, '{0}.json'.format(pid))
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'counters': [['upload_bytes_total', {}, 50]], 'histograms': []}, file)
+        if modified is not None:
+            os.utime(path, (modified, modified))
+        return '{0}.json'.format(pid)
+
+    def test_prune(self):
+        # Удаляется файл завершившегося процесса; файл живого, но давно простаивающего процесса остается
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+        stale = time.time() - 2 * 60 * 60
+        self.write_process_file(finished.pid)
+        idle = self.write_process_file(os.getppid(), stale)
+        metrics.aggregate()
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([idle, '{0}.json'.format(os.getpid())]))
+
+    def test_prune_without_pid_check(self):
+        # Если процесс проверить нельзя, файл удаляется по METRICS_TTL
+        stale = time.time() - 2 * 60 * 60
+        old = self.write_process_file(os.getppid(), stale)
+        with mock.patch('control.metrics.process_exists', return_value=None):
+            metrics.aggregate()
+        self.assertNotIn(old, os.listdir(self.directory))
+
+
+class ProfilerTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.teacher, cls.students, cls.course, cls.group, cls.tests, cls.files = seed()
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch('control.profiler.PROFILE_DIR', directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_off(self):
+        self.client.force_login(self.students[0])
+        response = self.client.get(reverse('index') + '?profile=1')
+        self.assertNotIn('X-Profile', response)
+
+    def test_profile(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('group_statistics', kwargs={'pk': self.group.pk}) + '?profile=1')
+        self.assertEqual(response.status_code, 200)
+        detail = self.client.get(response['X-Profile'])
+        self.assertEqual(detail.status_code, 200)
+        profile = detail.context['profile']
+        self.assertEqual(profile['view'], 'group_statistics')
+        self.assertTrue(profile['queries'])
+        self.assertTrue(detail.context['functions'])
+        download = self.client.get(reverse('profile_download', kwargs={'profile_id': profile['id']}))
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('.prof', download['Content-Disposition'])
+        download.close()
+
+
+class JobTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.teacher, cls.students, cls.course, cls.group, cls.tests, cls.files = seed()
+
+    def test_idempotency_key(self):
+        job = Job.enqueue('export_test_results', {'test_id': self.tests[0].pk}, key='export')
+        self.assertEqual(Job.enqueue('export_test_results', {'test_id': self.tests[0].pk}, key='export').pk, job.pk)
+        job.finish()
+        self.assertEqual(Job.enqueue('export_test_results', key='export').pk, job.pk)
+        self.assertNotEqual(Job.enqueue('export_test_results', key='export', key_ttl=0).pk, job.pk)
+
+    def test_priority(self):
+        low = Job.enqueue('export_test_results', {'test_id': self.tests[0].pk})
+        high = Job.enqueue('export_test_results', {'test_id': self.tests[1].pk}, priority=10)
+        self.assertEqual(Job.claim('test').pk, high.pk)
+        self.assertEqual(Job.claim('test').pk, low.pk)
+        self.assertIsNone(Job.claim('test'))
+
+    def test_retry(self):
+        def broken(job):
+            raise ValueError('broken')
+
+        with mock.patch.dict(TASKS, {'broken': broken}):
+            job = Job.enqueue('broken', max_attempts=2)
+            job = execute(Job.claim('test'))
+            self.assertEqual(job.status, Job.QUEUED)
+            self.assertGreater(job.run_at, timezone.now())
+            self.assertIsNone(Job.claim('test'))
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            job = execute(Job.claim('test'))
+            self.assertEqual(job.status, Job.FAILED)
+            self.assertIn('broken', job.error)
+
+    def test_review_files(self):
+        # Оценки решений сохраняются сразу, без фоновой задачи
+        results = list(ResultFile.objects.filter(filetask=self.files[0]).order_by('pk')[:2])
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('file_results', kwargs={'pk': self.files[0].pk}),
+                         {'csrfmiddlewaretoken': '', str(results[0].pk): '1', str(results[1].pk): '0'})
+        self.assertEqual([result.accepted for result in ResultFile.objects.filter(pk__in=[r.pk for r in results])
+                         .order_by('pk')], [True, False])
+        self.assertFalse(Job.objects.exists())
+
+    def test_background_export(self):
+        # GET только отдает файл; задача выгрузки ставится отправкой формы
+        self.client.force_login(self.admin)
+        url = reverse('test_export', kwargs={'pk': self.tests[0].pk})
+        self.client.get(url, {'format': 'csv', 'background': 1})
+        self.assertFalse(Job.objects.exists())
+        self.client.post(url, {'format': 'xlsx'})
+        self.assertEqual(Job.objects.get().name, 'export_test_results')
+
+    def test_course_delete(self):
+        self.client.force_login(self.teacher)
+        with mock.patch('control.models.JOBS_EAGER', True):
+            self.client.post(reverse('course_del', kwargs={'slug': self.course.slug}))
+        self.assertFalse(Course.objects.filter(pk=self.course.pk).exists())
+        self.assertFalse(ResultTest.objects.filter(test__in=self.tests).exists())
+
+
+class EnrollmentTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.teacher, cls.students, cls.course, cls.group, cls.tests, cls.files = seed()
+        cls.applicants = [User.objects.create_user('applicant{0}'.format(number), password='password')
+                          for number in range(2)]
+
+    def occupied(self):
+        return Group.objects.get(pk=self.group.pk).occupied
+
+    def request_seat(self, user):
+        self.client.force_login(user)
+        return self.client.post(reverse('request', kwargs={'slug': self.course.slug}), {'group_id': self.group.pk})
+
+    def test_request_approve_remove(self):
+        first, second = self.applicants
+        self.request_seat(first)
+        self.request_seat(second)
+        self.request_seat(second)
+        self.assertEqual(self.occupied(), STUDENTS + 2)
+
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('requests_group', kwargs={'pk': self.group.pk}),
+                         {'csrfmiddlewaretoken': '', str(first.pk): '1', str(second.pk): '0'})
+        self.assertEqual(self.occupied(), STUDENTS + 1)
+        self.assertTrue(Enrollment.objects.filter(user=first, group=self.group, status=Enrollment.STUDENT).exists())
+
+        self.request_seat(second)
+        self.assertEqual(self.occupied(), STUDENTS + 2)
+        self.client.post(reverse('unrequest', kwargs={'slug': self.course.slug}), {'group_id': self.group.pk})
+        self.assertEqual(self.occupied(), STUDENTS + 1)
+
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('students_group', kwargs={'pk': self.group.pk}), {'user_id': first.pk})
+        self.assertEqual(self.occupied(), STUDENTS)
+        Enrollment.objects.filter(user=self.students[0]).delete()
+        self.assertEqual(self.occupied(), STUDENTS - 1)
+
+    def test_groups_table(self):
+        # Заявка занимает место, но не считается учащимся
+        self.request_seat(self.applicants[0])
+        self.client.force_login(self.admin)
+        row = self.client.get(reverse('settings_table', kwargs={'name': 'groups'})).json()['data'][0]
+        self.assertIn('{0} из {1}'.format(STUDENTS, self.group.max_users), row[5])
+        self.assertEqual(row[6], '{0} из {1}'.format(STUDENTS + 1, self.group.max_users))
+
+    def test_full_group(self):
+        # Заявка сверх max_users отклоняется и не занимает места
+        Group.objects.filter(pk=self.group.pk).update(max_users=STUDENTS + 1)
+        self.request_seat(self.applicants[0])
+        response = self.request_seat(self.applicants[1])
+        self.assertEqual(self.occupied(), STUDENTS + 1)
+        self.assertFalse(Enrollment.objects.filter(user=self.applicants[1]).exists())
+        self.assertIn('не осталось свободных мест', ' '.join(str(message) for message in
+                                                            get_messages(response.wsgi_request)))
+
+
+class SubmissionTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.teacher, cls.students, cls.course, cls.group, cls.tests, cls.files = seed()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_post(self):
+        # Повторная отправка с тем же подписанным сроком не дописывает ответы в принятую попытку
+        test, student = self.tests[0], self.students[0]
+        ResultTest.objects.filter(test=test, user=student).delete()
+        self.client.force_login(student)
+        url = reverse('test', kwargs={'slug': self.course.slug, 'pk': test.pk})
+        page = self.client.get(url)
+        deadline = page.context['deadline']
+        response = self.client.post(url, {'deadline': deadline})
+        self.assertEqual(response.status_code, 200)
+
+        data = {'deadline': deadline}
+        for question in page.context['questions']:
+            data[str(question.id)] = [str(answer.id) for answer in question.answers]
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 400)
+        result = ResultTest.objects.get(test=test, user=student)
+        self.assertTrue(result.submitted)
+        self.assertEqual(result.percent, 0)
+        self.assertFalse(result.given_answers.exists())
+
+    def test_close_expired(self):
+        # Неотправленная попытка закрывается по истечении времени, выполняемая сейчас не меняется
+        test, student = Test.objects.get(pk=self.tests[0].pk), self.students[0]
+        ResultTest.objects.filter(test=test, user__in=self.students[:2]).delete()
+        now = timezone.now()
+        expired = ResultTest.objects.create(test=test, user=student, start_time=now - datetime.timedelta(
+            minutes=test.time + 5), end_time=now, version=test.get_version())
+        running = ResultTest.objects.create(test=test, user=self.students[1], start_time=now, end_time=now,
+                                            version=test.get_version())
+        self.assertFalse(test.is_passed(student))
+        self.assertEqual(ResultTest.close_expired(), 1)
+        expired.refresh_from_db()
+        running.refresh_from_db()
+        self.assertTrue(expired.submitted)
+        self.assertEqual(expired.percent, 0)
+        self.assertFalse(running.submitted)
+        self.assertIsNone(running.percent)
 
-# Create your tests here.
+    def test_readers_do_not_grade(self):
+        # Просмотр прогресса и выгрузка пропускают неоцененные попытки и ничего не записывают
+        test = self.tests[0]
+        ResultTest.objects.filter(test=test).update(percent=None, passed=False, submitted=False)
+        self.client.force_login(self.teacher)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(test.is_passed(self.students[0]))
+            self.client.get(reverse('group_statistics', kwargs={'pk': self.group.pk}))
+        self.assertFalse([query for query in queries if query['sql'].startswith(('UPDATE', 'INSERT'))
+                          and 'control_resulttest' in query['sql']])
+        self.assertEqual(len(list(test_result_rows(test))), 1)
@@ -0,0 +1,156 @@
+import os
+import re
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировка через msvcrt
+    fcntl = None
+    import msvcrt
+
+from django.core.files import File
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from control import metrics
+from study_control.settings import EXTENSIONS, MAX_FILE_SIZE, MEDIA_ROOT, UPLOAD_PARTIAL_TTL
+
+# MAX_FILE_SIZE задается в мегабайтах
+MAX_UPLOAD_BYTES = MAX_FILE_SIZE * 1024 * 1024
+
+# Запас на остальные поля формы при проверке заголовка Content-Length
+FORM_OVERHEAD = 64 * 1024
+
+UPLOAD_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Каталог незавершенных загрузок: <id пользователя>/<id загрузки>.part
+PARTIAL_DIR = os.path.join(MEDIA_ROOT, 'uploads', 'partial')
+
+
+def check_extension(filetask, filename):
+    exts = EXTENSIONS[filetask.filetypes]
+    if exts[0] == "*" or filename.rsplit('.', 1)[-1].lower() in exts:
+        return None
+    return "Формат файла не соответствует требованиям."
+
+
+def check_size(size):
+    if size > MAX_UPLOAD_BYTES:
+        return "Размер файла превышает {0} Мб.".format(MAX_FILE_SIZE)
+    return None
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    # Проверяет тип и размер файла по мере поступления данных и прерывает
+    # загрузку при первом нарушении, не дожидаясь получения всего файла.
+
+    def __init__(self, request, filetask, max_size=MAX_UPLOAD_BYTES):
+        super().__init__(request)
+        self.filetask = filetask
+        self.max_size = max_size
+        self.received = 0
+        self.error = None
+
+    def abort(self, error):
+        self.error = error
+        raise StopUpload(connection_reset=True)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > self.max_size + FORM_OVERHEAD:
+            self.error = check_size(content_length - FORM_OVERHEAD)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.error:
+            self.abort(self.error)
+        error = check_extension(self.filetask, self.file_name or '')
+        if error:
+            self.abort(error)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.abort(check_size(self.received))
+        return raw_data
+
+    def file_complete(self, file_size):
+        metrics.inc('upload_bytes_total', file_size)
+        return None
+
+
+def partial_path(user, upload_id):
+    return os.path.join(PARTIAL_DIR, str(user.pk), '{0}.part'.format(upload_id))
+
+
+def partial_size(user, upload_id):
+    path = partial_path(user, upload_id)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def lock_partial(partial):
+    # Монопольная блокировка открытого файла без ожидания. Блокировку держит открытый файл:
+    # она снимается при его закрытии, в том числе когда процесс завершается аварийно.
+    try:
+        if fcntl is not None:
+            fcntl.flock(partial.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            partial.seek(0)
+            msvcrt.locking(partial.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def append_chunk(user, upload_id, offset, chunk):
+    # Дописывает часть файла, если она продолжает уже полученные данные.
+    # Проверка смещения и запись выполняются под блокировкой файла; пока другой запрос
+    # дописывает ту же загрузку, возвращается текущий размер. Возвращает размер принятых данных.
+    path = partial_path(user, upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as partial:
+        if not lock_partial(partial):
+            return partial_size(user, upload_id)
+        partial.seek(0, os.SEEK_END)
+        if offset != partial.tell():
+            return partial.tell()
+        for data in chunk.chunks():
+            partial.write(data)
+        return partial.tell()
+
+
+def remove_stale_partials(max_age=UPLOAD_PARTIAL_TTL):
+    # Удаляет незавершенные загрузки, не менявшиеся max_age секунд.
+    # Вызывается периодически обработчиком фоновых задач. Возвращает количество удаленных файлов.
+    if not os.path.isdir(PARTIAL_DIR):
+        return 0
+    expired = time.time() - max_age
+    removed = 0
+    for directory in os.listdir(PARTIAL_DIR):
+        directory = os.path.join(PARTIAL_DIR, directory)
+        if not os.path.isdir(directory):
+            continue
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            try:
+                if os.path.getmtime(path) < expired:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        try:
+            # Каталог, созданный только что для новой загрузки, не удаляется
+            if os.path.getmtime(directory) < expired:
+                os.rmdir(directory)
+        except OSError:
+            pass
+    return removed
+
+
+def complete_upload(result, user, upload_id, filename):
+    # Собранный файл сохраняется как решение учащегося, временный файл удаляется
+    path = partial_path(user, upload_id)
+    with open(path, 'rb') as partial:
+        result.file.save(os.path.basename(filename), File(partial), save=False)
+    result.accepted = None
+    result.save()
+    os.remove(path)
@@ -29,6 +29,8 @@ urlpatterns = [
     path('registration', Registration.as_view(), name='registration'),
     path("logout/", LogoutView.as_view(), {'next_page': '/'}, name="logout"),
     path('sync', SyncTime.as_view(), name='sync'),
+    path('search', SearchView.as_view(), name='search'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 
 
     path('course/<slug:slug>', CourseDetail.as_view(), name='course'),
@@ -37,6 +39,7 @@ urlpatterns = [
     path('course/<slug:slug>/lesson/<int:pk>', login_required(LessonDetail.as_view()), name='lesson'),
     path('course/<slug:slug>/test/<int:pk>', login_required(TestView.as_view()), name='test'),
     path('course/<slug:slug>/file/<int:pk>', login_required(FileView.as_view()), name='file'),
+    path('course/<slug:slug>/file/<int:pk>/upload', login_required(FileChunkView.as_view()), name='file_chunk'),
 
 
 
@@ -63,6 +66,17 @@ urlpatterns = [
     path('settings/groups/<int:pk>/students', login_required(GroupStudents.as_view()), name='students_group'),
     path('settings/groups/<int:pk>/plan', login_required(GroupSPlan.as_view()), name='group_plan'),
     path('settings/groups/<int:pk>/statistics', login_required(GroupStatistics.as_view()), name='group_statistics'),
+    path('settings/groups/<int:pk>/export', login_required(GroupExportView.as_view()), name='group_export'),
+
+    path('settings/profiles', login_required(ProfileList.as_view()), name='settings_profiles'),
+    path('settings/profiles/<slug:profile_id>', login_required(ProfileDetailView.as_view()), name='profile_detail'),
+    path('settings/profiles/<slug:profile_id>/download', login_required(ProfileDownloadView.as_view()),
+         name='profile_download'),
+    path('settings/jobs', login_required(JobList.as_view()), name='settings_jobs'),
+    path('settings/jobs/<int:pk>', login_required(JobStatusView.as_view()), name='job_status'),
+    path('settings/jobs/<int:pk>/file', login_required(JobFileView.as_view()), name='job_file'),
+    path('settings/table/<slug:name>', login_required(TableView.as_view()), name='settings_table'),
+    path('settings/table/<slug:name>/<int:pk>', login_required(TableView.as_view()), name='settings_table'),
 
     path('settings/users', login_required(UserAdmin.as_view()), name='settings_users'),
     path('settings/users/add', login_required(UserAdd.as_view()), name='user_add'),
@@ -82,6 +96,7 @@ urlpatterns = [
     path('settings/test/<int:pk>/del', login_required(TestDel.as_view()), name='test_del'),
     path('settings/test/<int:pk>/results', login_required(TestResultsView.as_view()), name='test_results'),
     path('settings/test/<int:pk>/detail-result', login_required(TestDetailView.as_view()), name='test_detail'),
+    path('settings/test/<int:pk>/export', login_required(TestExportView.as_view()), name='test_export'),
 
     path('settings/files', login_required(FileAdmin.as_view()), name='settings_files'),
     path('settings/file/add', login_required(FileAdd.as_view()), name='file_add'),
@@ -89,6 +104,7 @@ urlpatterns = [
     path('settings/file/<int:pk>/del', login_required(FileDel.as_view()), name='file_del'),
     path('settings/file/<int:pk>/results', login_required(FileResultsView.as_view()), name='file_results'),
     path('settings/file/<int:pk>/detail-result', login_required(FileDetailView.as_view()), name='file_detail'),
+    path('settings/file/<int:pk>/download', login_required(FileDownloadView.as_view()), name='file_download'),
 
 
     path('settings/question/add/<int:pk>', login_required(QuestionAdd.as_view()), name='question_add'),
@@ -0,0 +1,106 @@
+import hashlib
+import json
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+
+from control.metrics import cache_lookup
+from control.models import Answer, QuestionSnapshot, AnswerSnapshot, TestVersion, TestVersionQuestion
+from study_control.settings import TEST_PAYLOAD_TIMEOUT
+
+
+def question_digest(text, answers):
+    # Хеш содержимого вопроса: текст и упорядоченные пары (ответ, верный)
+    payload = json.dumps([text, [[answer, bool(correct)] for answer, correct in answers]], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def store_questions(contents):
+    # Сохраняет недостающие версии вопросов, возвращает {digest: pk}
+    unique = {question_digest(text, answers): (text, answers) for text, answers in contents}
+    stored = dict(QuestionSnapshot.objects.filter(digest__in=unique.keys()).values_list('digest', 'pk'))
+    missing = [digest for digest in unique if digest not in stored]
+    if missing:
+        QuestionSnapshot.objects.bulk_create([QuestionSnapshot(digest=digest, text=unique[digest][0])
+                                              for digest in missing], ignore_conflicts=True)
+        created = dict(QuestionSnapshot.objects.filter(digest__in=missing).values_list('digest', 'pk'))
+        AnswerSnapshot.objects.bulk_create([AnswerSnapshot(question_id=created[digest], position=position,
+                                                           text=text, correct=correct)
+                                            for digest in missing
+                                            for position, (text, correct) in enumerate(unique[digest][1])],
+                                           ignore_conflicts=True)
+        stored.update(created)
+    return stored
+
+
+def get_or_create_version(test_id, contents):
+    # contents - список (текст вопроса, [(текст ответа, верный), ...]) в порядке показа
+    digests = [question_digest(text, answers) for text, answers in contents]
+    digest = hashlib.sha256(' '.join(digests).encode('ascii')).hexdigest()
+    version = TestVersion.objects.filter(test_id=test_id, digest=digest).first()
+    if version is not None:
+        return version
+    with transaction.atomic():
+        stored = store_questions(contents)
+        try:
+            with transaction.atomic():
+                version = TestVersion.objects.create(test_id=test_id, digest=digest)
+        except IntegrityError:
+            return TestVersion.objects.get(test_id=test_id, digest=digest)
+        TestVersionQuestion.objects.bulk_create([TestVersionQuestion(version=version, question_id=stored[question],
+                                                                     position=position)
+                                                 for position, question in enumerate(digests)])
+    return version
+
+
+def build_version(test):
+    questions = test.question.all().order_by('pk').prefetch_related(
+        Prefetch('answer', queryset=Answer.objects.order_by('pk')))
+    contents = [(question.text, [(answer.text, answer.correct) for answer in question.answer.all()])
+                for question in questions]
+    return get_or_create_version(test.pk, contents)
+
+
+def version_answers(version_ids):
+    # {version_id: [[pk ответов вопроса 1], [pk ответов вопроса 2], ...]}
+    questions = {}
+    for version_id, question_id in TestVersionQuestion.objects.filter(version_id__in=version_ids) \
+            .order_by('version_id', 'position').values_list('version_id', 'question_id'):
+        questions.setdefault(version_id, []).append(question_id)
+    answers = {}
+    for answer_id, question_id in AnswerSnapshot.objects.filter(question__version__in=version_ids).distinct() \
+            .order_by('question_id', 'position').values_list('pk', 'question_id'):
+        answers.setdefault(question_id, []).append(answer_id)
+    return {version_id: [answers.get(question_id, []) for question_id in question_ids]
+            for version_id, question_ids in questions.items()}
+
+
+# Вопрос страницы прохождения теста с заранее посчитанным режимом ответа
+PayloadQuestion = namedtuple('PayloadQuestion', ['id', 'text', 'answers', 'correct_count', 'multiple'])
+
+PayloadAnswer = namedtuple('PayloadAnswer', ['id', 'text'])
+
+
+def build_payload(version_id):
+    questions = []
+    for question in TestVersion(pk=version_id).get_questions():
+        answers = list(question.answer.all())
+        correct_count = sum(1 for answer in answers if answer.correct)
+        if correct_count == 0:
+            continue
+        questions.append(PayloadQuestion(question.pk, question.text,
+                                         [PayloadAnswer(answer.pk, answer.text) for answer in answers],
+                                         correct_count, correct_count > 1))
+    return questions
+
+
+def test_payload(version_id):
+    # Версии неизменяемы, поэтому кеш не нужно сбрасывать при редактировании теста
+    key = 'test_payload:{0}'.format(version_id)
+    payload = cache_lookup('test_payload', cache.get(key))
+    if payload is None:
+        payload = build_payload(version_id)
+        cache.set(key, payload, TEST_PAYLOAD_TIMEOUT)
+    return payload
@@ -1,24 +1,44 @@
-from datetime import datetime, timedelta
+import os
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import AuthenticationForm
 
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Q, Case, When, Value
+from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse, Http404, \
+    HttpResponseForbidden, FileResponse
 from django.shortcuts import render, redirect
 
 # Create your views here.
 from django.urls import reverse
-from django.utils.timezone import make_aware
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.generic import TemplateView, DetailView, UpdateView, CreateView
+from pytils.translit import slugify
 
 from control.forms import RegistrationForm, CourseForm, EditUser, ProfileForm, GroupAddForm, DisciplineAddForm, \
     LessonAddForm, TestAddForm, QuestionAddForm, DirectionAddForm, AnswerFormSet, FileTaskAddForm, ResultFileAddForm
 from control.models import *
-from study_control.settings import EXTENSIONS
+from control.archive import stream_zip, submission_entries
+from control.export import export_response, test_result_rows, gradebook_rows
+from control.progress import ProgressMatrix
+from control.submission import write_attempt, parse_given
+from control.versions import test_payload
+from control.catalogue import course_catalogue, my_courses
+from control.outline import course_outline
+from control.schedule import PlanGrid, apply_schedule
+from control.tables import TABLES
+from control.search import search
+from control import metrics
+from control.profiler import list_profiles, load_profile, profile_path, top_functions, repeated_queries
+from control.deadline import make_deadline, read_deadline, seconds_left, is_expired
+from control.uploads import LimitedUploadHandler, UPLOAD_ID, check_extension, check_size, partial_size, \
+    partial_path, append_chunk, complete_upload
+from study_control.settings import EXTENSIONS, UPLOAD_CHUNK_SIZE, METRICS_TOKEN, PROFILE_PARAMETER, \
+    PROFILE_TOP_FUNCTIONS, JOBS_FILES_DIR
 
 
 class Index(TemplateView):
@@ -26,14 +46,12 @@ class Index(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['all_courses'] = Course.objects.all()
-        a_groups = Group.objects.filter(study_start__gt=timezone.now()).values('course').distinct()
-        context['avaible_courses'] = context['all_courses'].filter(id__in=a_groups)
+        catalogue = course_catalogue()
+        context['all_courses'] = catalogue.courses
+        context['avaible_courses'] = catalogue.available
         if self.request.user.is_authenticated:
-            my_groups = Group.objects.filter(study_end__gt=timezone.now()).values('course').distinct().filter(
-                students=self.request.user.id)
-            context['my_courses'] = context['all_courses'].filter(id__in=my_groups)
-        context['directions'] = Direction.objects.all()
+            context['my_courses'] = my_courses(catalogue, self.request.user)
+        context['directions'] = catalogue.directions
         return context
 
 
@@ -92,8 +110,8 @@ class Request(View):
     # Запрос на включение в список группы
     def post(self, request, *args, **kwargs):
         group = Group.objects.get(pk=request.POST.get('group_id'))
-        user = request.user
-        group.requests.add(user)
+        if not group.request_seat(request.user):
+            messages.error(request, "В группе не осталось свободных мест.")
         return redirect('course', slug=kwargs['slug'])
 
 
@@ -101,18 +119,116 @@ class Unrequest(View):
     # Запрос на удаление заявки в список группы
     def post(self, request, *args, **kwargs):
         group = Group.objects.get(pk=request.POST.get('group_id'))
-        user = request.user
-        group.requests.remove(user)
+        group.cancel_request(request.user)
         return redirect('course', slug=kwargs['slug'])
 
 
 class UserAdmin(TemplateView):
     template_name = 'control/settings/users.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['users'] = User.objects.all()
-        return context
+
+class TableView(View):
+    # Данные для таблиц страниц настроек (серверная обработка jquery.dataTables)
+
+    def get(self, request, *args, **kwargs):
+        table = TABLES.get(kwargs['name'])
+        if table is None:
+            raise Http404
+        if not request.user.is_staff or (table.superuser and not request.user.is_superuser):
+            return HttpResponseForbidden()
+        return table(request, kwargs.get('pk')).response()
+
+
+class MetricsView(View):
+    # Показатели в текстовом формате Prometheus: для сотрудников или сборщика с METRICS_TOKEN
+
+    def get(self, request, *args, **kwargs):
+        token = request.META.get('HTTP_AUTHORIZATION', '')
+        scraper = METRICS_TOKEN and constant_time_compare(token, 'Bearer {0}'.format(METRICS_TOKEN))
+        if not request.user.is_staff and not scraper:
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ProfileList(View):
+    # Сохраненные профили запросов (см. ProfilerMiddleware)
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+        return render(request, 'control/settings/profiles.html', {'profiles': list_profiles(),
+                                                                  'parameter': PROFILE_PARAMETER})
+
+
+class ProfileDetailView(View):
+    # Сводка профиля: самые долгие функции, повторяющиеся SQL-запросы и все запросы по порядку
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+        profile = load_profile(kwargs['profile_id'])
+        if profile is None:
+            raise Http404
+        return render(request, 'control/settings/profile_detail.html', {
+            'profile': profile,
+            'functions': top_functions(profile['id'], PROFILE_TOP_FUNCTIONS),
+            'repeated': repeated_queries(profile['queries']),
+        })
+
+
+class ProfileDownloadView(View):
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+        profile = load_profile(kwargs['profile_id'])
+        if profile is None:
+            raise Http404
+        return FileResponse(open(profile_path(profile['id'], 'prof'), 'rb'), as_attachment=True,
+                            filename='{0}-{1}.prof'.format(profile['view'] or 'request', profile['id'][:8]))
+
+
+class JobList(View):
+    # Фоновые задачи: сотрудник видит свои, администратор - все
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+        jobs = Job.objects.all() if request.user.is_superuser else Job.objects.filter(user=request.user)
+        return render(request, 'control/settings/jobs.html', {'jobs': jobs.order_by('-pk')[:100]})
+
+
+def get_job(request, pk):
+    job = Job.objects.filter(pk=pk).first()
+    if job is None or not (request.user.is_superuser or (request.user.is_staff and job.user_id == request.user.pk)):
+        raise Http404
+    return job
+
+
+class JobStatusView(View):
+    # Ход выполнения задачи для индикатора на странице (опрашивается из base_settings.html)
+
+    def get(self, request, *args, **kwargs):
+        job = get_job(request, kwargs['pk'])
+        result = job.get_result() if job.status == Job.DONE else None
+        return JsonResponse({
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'progress': job.progress,
+            'message': job.message,
+            'file': reverse('job_file', kwargs={'pk': job.pk}) if result and 'file' in result else None,
+        })
+
+
+class JobFileView(View):
+
+    def get(self, request, *args, **kwargs):
+        job = get_job(request, kwargs['pk'])
+        result = job.get_result() if job.status == Job.DONE else None
+        if not result or 'file' not in result:
+            raise Http404
+        return FileResponse(open(os.path.join(JOBS_FILES_DIR, result['file']), 'rb'), as_attachment=True,
+                            filename=result['filename'])
 
 
 class UserAdd(View):
@@ -186,11 +302,6 @@ class UserDel(View):
 class DirectionAdmin(TemplateView):
     template_name = 'control/settings/directions.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['directions'] = Direction.objects.all()
-        return context
-
 
 class DirectionAdd(View):
 
@@ -229,10 +340,16 @@ class DirectionDel(View):
 class CourseAdmin(TemplateView):
     template_name = 'control/settings/courses.html'
 
+
+class SearchView(TemplateView):
+    template_name = 'control/search.html'
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        context['courses'] = Course.objects.all()
+        context['query'] = self.request.GET.get('q', '')
+        context['kind'] = self.request.GET.get('kind', '')
+        context['kinds'] = SearchDocument.KINDS
+        context['results'] = search(self.request.user, context['query'], context['kind'] or None)
         return context
 
 
@@ -246,6 +363,10 @@ class CourseDetail(DetailView):
         if self.request.user.is_authenticated:
             context['is_student'] = self.request.user.profile.is_study(self.object)
             context['is_request'] = self.request.user.profile.is_request(self.object)
+            context['requested_groups'] = set(Enrollment.objects.filter(
+                user=self.request.user, course=self.object, status=Enrollment.REQUEST).values_list('group_id', flat=True))
+            if context['is_student']:
+                context['outline'] = course_outline(context['is_student'])
         return context
 
 
@@ -280,7 +401,9 @@ class CourseDel(View):
     def post(self, request, *args, **kwargs):
         if request.user.is_staff:
             course = Course.objects.get(slug=kwargs['slug'])
-            course.delete()
+            Job.enqueue('delete_course', {'course_id': course.pk}, key='delete_course:{0}'.format(course.pk),
+                        priority=5, user=request.user)
+            messages.info(request, 'Курс "{0}" будет удален в фоновом режиме.'.format(course.name))
         return redirect('settings_courses')
 
 
@@ -289,11 +412,7 @@ class GroupAdmin(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_superuser:
-            context['groups'] = Group.objects.all()
-        else:
-            context['groups'] = Group.objects.all().filter(Q(course__discipline__teacher=self.request.user) |
-                                                           Q(course__owner=self.request.user))
+        context['owner'] = self.request.user.is_superuser or Course.objects.filter(owner=self.request.user).exists()
         return context
 
 
@@ -354,7 +473,7 @@ class GroupStudents(View):
     def post(self, request, *args, **kwargs):
         group = Group.objects.get(pk=kwargs['pk'])
         user = User.objects.get(pk=request.POST.get("user_id"))
-        group.students.remove(user)
+        group.remove_student(user)
         return redirect('students_group', pk=kwargs['pk'])
 
 
@@ -372,13 +491,8 @@ class DisciplineAdmin(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_superuser:
-            context['disciplines'] = Discipline.objects.all()
-        else:
-            owner = Discipline.objects.all().filter(course__owner=self.request.user).count() > 0
-            context['disciplines'] = Discipline.objects.all().filter(Q(teacher=self.request.user) |
-                                                                     Q(course__owner=self.request.user))
-            context['owner'] = owner
+        if not self.request.user.is_superuser:
+            context['owner'] = Discipline.objects.filter(course__owner=self.request.user).exists()
         return context
 
 
@@ -427,34 +541,35 @@ class DisciplineDel(View):
 
 class LessonDetail(DetailView):
     template_name = 'control/lesson.html'
-    model = Lesson
+    queryset = Lesson.objects.select_related('discipline__course')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        group = self.request.user.profile.is_study(self.object.discipline.course)
-        context['testplans'] = self.object.get_plan(group).testplan.all().filter(start__isnull=False,
-                                                                                end__isnull=False,
-                                                                                test__in=self.object.test.all())
-        context['fileplans'] = self.object.get_plan(group).fileplan.all().filter(start__isnull=False,
-                                                                                end__isnull=False,
-                                                                                file__in=self.object.filetask.all())
-
+        user = self.request.user
+        group = user.profile.is_study(self.object.discipline.course)
+        plan = self.object.get_plan(group)
+        if plan is None:
+            context['testplans'], context['fileplans'] = [], []
+            return context
+        context['testplans'] = plan.testplan.filter(start__isnull=False, end__isnull=False,
+                                                    test__lesson=self.object).select_related('test')
+        context['fileplans'] = plan.fileplan.filter(start__isnull=False, end__isnull=False,
+                                                    file__lesson=self.object).select_related('file')
+        # Результаты учащегося по заданиям занятия загружаются сразу, а не фильтрами шаблона на каждое задание
+        context['passed_tests'] = set(ResultTest.objects.filter(user=user, test__lesson=self.object, passed=True)
+                                      .values_list('test_id', flat=True))
+        file_results = {}
+        for filetask_id, accepted in ResultFile.objects.filter(user=user, filetask__lesson=self.object) \
+                .order_by('pk').values_list('filetask_id', 'accepted'):
+            file_results.setdefault(filetask_id, accepted)
+        context['passed_files'] = {pk for pk, accepted in file_results.items() if accepted}
+        context['sended_files'] = {pk for pk, accepted in file_results.items() if accepted is None}
         return context
 
 
 class LessonAdmin(TemplateView):
     template_name = 'control/settings/lessons.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        if self.request.user.is_superuser:
-            context['lessons'] = Lesson.objects.all()
-        else:
-            context['lessons'] = Lesson.objects.all().filter(Q(discipline__teacher=self.request.user) |
-                                                             Q(discipline__course__owner=self.request.user))
-
-        return context
-
 
 class LessonAdd(View):
 
@@ -503,16 +618,6 @@ class LessonDel(View):
 class TestAdmin(TemplateView):
     template_name = 'control/settings/tests.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['tests'] = Test.objects.all()
-        if self.request.user.is_superuser:
-            context['tests'] = Test.objects.all()
-        else:
-            context['tests'] = Test.objects.all().filter(Q(lesson__discipline__teacher=self.request.user) |
-                                                         Q(lesson__discipline__course__owner=self.request.user))
-        return context
-
 
 class TestAdd(CreateView):
     model = Test
@@ -649,60 +754,50 @@ class TestView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(TestView, self).get_context_data(**kwargs)
-        context['questions'] = Question.objects.filter(answer__correct=True, test=kwargs['object']).distinct()
+        context['questions'] = test_payload(self.version.pk)
+        context['deadline'] = self.deadline
         return context
 
     def get(self, request, *args, **kwargs):
         test_id = kwargs['pk']
         test = Test.objects.all().filter(id=test_id).first()
-        user_try = request.user.resulttest.all().count() + 1
+        user_try = request.user.resulttest.filter(test_id=test_id).count() + 1
 
         if test.is_passed(request.user):
             messages.error(request, 'Вы уже успешно выполнили это задание - %s' % test.name)
             return redirect(test.lesson.get_absolute_url())
 
         if test.tryes >= user_try:
+            self.version = test.get_version()
             result = ResultTest(user=request.user, test=test, start_time=timezone.now(),
-                                end_time=timezone.now())
+                                end_time=timezone.now(), version=self.version)
             result.save()
         else:
             messages.error(request, 'Вы израсходовали все попытки - %s' % test.name)
             return redirect(test.lesson.get_absolute_url())
 
-        request.session['try'] = user_try
-        request.session['start_test_time'] = str(datetime.datetime.now())
-        request.session['test'] = str(test.id)
+        self.deadline = make_deadline(result, test)
         return super().get(self, request, *args, **kwargs)
 
     def post(self, request, **kwargs):
         if request.POST:
-            data = dict(request.POST)
-            del data['question_id']
-            del data['csrfmiddlewaretoken']
-
+            deadline = read_deadline(request.POST.get('deadline'))
+            if deadline is None:
+                return HttpResponseBadRequest('Неверные данные теста.', content_type='text/plain')
+            result_id, deadline = deadline
             test = Test.objects.all().filter(id=kwargs['pk']).first()
-            result = ResultTest.objects.filter(user=request.user, test=test).order_by('-start_time').first()
-            result.end_time = timezone.now()
-
-            questions = Question.objects.all().filter(test_id=kwargs['pk'])
-            resultadic = {}
-            for question in questions:
-                q = ResultQuestion(test=result, text=question.text)
-                q.save()
-                answers = question.answer.all()
-                for answer in answers:
-                    a = ResultAnswer(question=q, text=answer.text, correct=answer.correct)
-                    a.save()
-                    resultadic[str(answer.id)] = str(a.id)
-
-            if len(data):
-                for key in data.keys():
-                    for id_ans in data[key]:
-                        ra = ResultAnswer.objects.get(pk=int(resultadic[str(id_ans)]))
-                        ra.given = True
-                        ra.save()
-            result.save()
-            if test.pass_percent > result.get_percent():
+            result = ResultTest.objects.filter(pk=result_id, user=request.user, test=test).first()
+            if result is None:
+                return HttpResponseBadRequest('Попытка не найдена.', content_type='text/plain')
+            # Ответы, отправленные после истечения времени, не учитываются
+            expired = is_expired(deadline)
+            given = set() if expired else parse_given(request.POST)
+            if result.submitted or write_attempt(result, test, given) is None:
+                return HttpResponseBadRequest('Ответы на эту попытку уже приняты.', content_type='text/plain')
+            metrics.inc('submissions_total', kind='tests')
+            if expired:
+                return HttpResponse('Время на выполнение теста истекло. Тест не пройден.', content_type='text/plain')
+            if not result.passed:
                 msg = 'Тест не пройден.'
             else:
                 msg = 'Тест пройден.'
@@ -710,37 +805,20 @@ class TestView(DetailView):
 
 
 class SyncTime(View):
+    # Оставшееся время теста вычисляется только по подписанному сроку, без обращения к БД и сессии
     def post(self, request, **kwargs):
-        if request.POST:
-            data_response = {'min': '0', 'sec': '0'}
-            start_test_time = request.session.get('start_test_time')
-            if start_test_time is None:
-                return HttpResponse(JsonResponse(data_response), content_type="application/json")
-            then = datetime.datetime.strptime(start_test_time, '%Y-%m-%d %H:%M:%S.%f')
-            now = datetime.datetime.now()
-            delta_now = now - then
-            test_id = request.session.get('test')
-            if test_id is None:
-                return HttpResponse(JsonResponse(data_response), content_type="application/json")
-            test = Test.objects.filter(id=test_id).first()
-            if test is None:
-                return HttpResponse(JsonResponse(data_response), content_type="application/json")
-            over_time = timedelta(minutes=test.time)
-            delta = over_time - delta_now
-            total_seconds = delta.total_seconds()
-            data_response = {'min': total_seconds // 60, 'sec': int(total_seconds % 60)}
-            return HttpResponse(JsonResponse(data_response), content_type="application/json")
+        data_response = {'min': 0, 'sec': 0}
+        deadline = read_deadline(request.POST.get('deadline'))
+        if deadline is not None:
+            total_seconds = seconds_left(deadline[1])
+            data_response = {'min': total_seconds // 60, 'sec': total_seconds % 60}
+        return JsonResponse(data_response)
 
 
 class TestResultsView(DetailView):
     model = Test
     template_name = 'control/settings/test_results.html'
 
-    def get_context_data(self, **kwargs):
-        context = super(TestResultsView, self).get_context_data(**kwargs)
-        context['resulttests'] = ResultTest.objects.all().filter(test=kwargs['object'])
-        return context
-
     def post(self, request, **kwargs):
         if request.POST:
             if request.user.is_staff:
@@ -749,6 +827,26 @@ class TestResultsView(DetailView):
         return redirect('test_results', pk=kwargs['pk'])
 
 
+class TestExportView(View):
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return redirect('settings_tests')
+        test = Test.objects.get(pk=kwargs['pk'])
+        return export_response(test_result_rows(test), slugify(test.name) or 'results',
+                               request.GET.get('format'), test.name)
+
+    def post(self, request, *args, **kwargs):
+        # Выгрузка в фоне: файл готовит обработчик run_jobs
+        if not request.user.is_staff:
+            return redirect('settings_tests')
+        test = Test.objects.get(pk=kwargs['pk'])
+        Job.enqueue('export_test_results', {'test_id': test.pk, 'fmt': request.POST.get('format')},
+                    user=request.user)
+        messages.info(request, 'Выгрузка результатов поставлена в очередь.')
+        return redirect('settings_jobs')
+
+
 class TestDetailView(DetailView):
     model = ResultTest
     template_name = 'control/settings/test_detail.html'
@@ -767,16 +865,6 @@ class TestDetailView(DetailView):
 class FileAdmin(TemplateView):
     template_name = 'control/settings/files.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['files'] = FileTask.objects.all()
-        if self.request.user.is_superuser:
-            context['files'] = FileTask.objects.all()
-        else:
-            context['files'] = FileTask.objects.all().filter(Q(lesson__discipline__teacher=self.request.user) |
-                                                             Q(lesson__discipline__course__owner=self.request.user))
-        return context
-
 
 class FileAdd(CreateView):
     model = FileTask
@@ -825,20 +913,35 @@ class FileResultsView(DetailView):
     def get_context_data(self, **kwargs):
         context = super(FileResultsView, self).get_context_data(**kwargs)
 
-        context['resultfiles'] = ResultFile.objects.all().filter(filetask=kwargs['object'])
+        context['groups'] = Group.objects.filter(course__discipline__lesson=kwargs['object'].lesson_id)
         return context
 
     def post(self, request, **kwargs):
         data = request.POST.copy()
         data.pop('csrfmiddlewaretoken')
-        data.pop('table_length')
-        for key, value in data.items():
-            result = ResultFile.objects.get(pk=key)
-            result.accepted = int(value)
-            result.save()
+        data.pop('table_length', None)
+        # Оценки всех решений формы записываются одним запросом
+        marks = {int(key): int(value) == True for key, value in data.items() if key.isdigit()}
+        accepted = [pk for pk, mark in marks.items() if mark]
+        ResultFile.objects.filter(pk__in=marks).update(accepted=Case(When(pk__in=accepted, then=Value(True)),
+                                                                     default=Value(False)))
         return redirect('settings_files')
 
 
+class FileDownloadView(View):
+    # Архив всех решений задания, передаваемый потоком по мере чтения файлов
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return redirect('settings_files')
+        filetask = FileTask.objects.get(pk=kwargs['pk'])
+        group = Group.objects.filter(pk=request.GET.get('group') or None).first()
+        entries = submission_entries(filetask, group=group, ungraded=bool(request.GET.get('ungraded')))
+        response = StreamingHttpResponse(stream_zip(entries), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="{0}.zip"'.format(slugify(filetask.name) or 'files')
+        return response
+
+
 class FileDetailView(UpdateView):
     model = ResultFile
     template_name = 'control/settings/file_detail.html'
@@ -854,27 +957,44 @@ class FileDetailView(UpdateView):
         return context
 
 
+@method_decorator(csrf_exempt, name='dispatch')
 class FileView(View):
+    # Проверка CSRF выполняется в post() после подключения обработчика загрузки:
+    # CsrfViewMiddleware читает request.POST и тем самым принял бы файл целиком
 
-    def get(self, request, *args, **kwargs):
-        object = FileTask.objects.get(pk=self.kwargs['pk'])
-        result = ResultFile.objects.filter(filetask=object, user=request.user).first()
-        exts = EXTENSIONS[object.filetypes]
+    def get_context(self, form, filetask):
+        exts = EXTENSIONS[filetask.filetypes]
         if exts[0] == "*":
             exts = "Любой"
         else:
             exts = ", ".join(exts)
+        return {'form': form, 'filetask': filetask, 'exts': exts, 'chunk_size': UPLOAD_CHUNK_SIZE}
+
+    @method_decorator(csrf_protect)
+    def get(self, request, *args, **kwargs):
+        object = FileTask.objects.get(pk=self.kwargs['pk'])
+        result = ResultFile.objects.filter(filetask=object, user=request.user).first()
         if result:
             form = ResultFileAddForm(instance=result)
         else:
             form = ResultFileAddForm(request.GET or None)
             form.fields['filetask'].initial = object.id
             form.fields['filetask'].queryset = FileTask.objects.filter(pk=object.id)
-        return render(request, 'control/file.html', {'form': form, 'filetask':object,
-                                                     'exts':exts})
+        return render(request, 'control/file.html', self.get_context(form, object))
 
     def post(self, request, *args, **kwargs):
         object = FileTask.objects.get(pk=self.kwargs['pk'])
+        handler = LimitedUploadHandler(request, object)
+        request.upload_handlers.insert(0, handler)
+        return self.save_file(request, object, handler)
+
+    @method_decorator(csrf_protect)
+    def save_file(self, request, object, handler):
+        if handler.error:
+            form = ResultFileAddForm(initial={'filetask': object.id})
+            form.fields['filetask'].queryset = FileTask.objects.filter(pk=object.id)
+            messages.error(request, handler.error)
+            return render(request, 'control/file.html', self.get_context(form, object))
         form = ResultFileAddForm(request.POST, request.FILES)
         form.fields['filetask'].initial = object.id
         form.fields['filetask'].queryset = FileTask.objects.filter(pk=self.kwargs['pk'])
@@ -890,11 +1010,65 @@ class FileView(View):
                 result.user = request.user
             result.accepted = None
             result.save()
+            metrics.inc('submissions_total', kind='files')
             messages.error(request, "Ответ сохранен")
             return redirect('lesson', slug=object.lesson.discipline.course.slug, pk=object.lesson.id )
         else:
             messages.error(request, "Проверьте поля формы.")
-        return render(request, 'control/file.html', {'form': form, })
+        return render(request, 'control/file.html', self.get_context(form, object))
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class FileChunkView(View):
+    # Загрузка решения частями с возможностью продолжить прерванную загрузку.
+    # GET возвращает количество уже принятых байт, POST дописывает следующую часть.
+
+    def get(self, request, *args, **kwargs):
+        upload_id = request.GET.get('upload_id', '')
+        if not UPLOAD_ID.match(upload_id):
+            return JsonResponse({'error': 'Неверный идентификатор загрузки.'}, status=400)
+        return JsonResponse({'offset': partial_size(request.user, upload_id)})
+
+    def post(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, LimitedUploadHandler(request, FileTask(filetypes='1'),
+                                                               max_size=UPLOAD_CHUNK_SIZE))
+        return self.save_chunk(request, *args, **kwargs)
+
+    @method_decorator(csrf_protect)
+    def save_chunk(self, request, *args, **kwargs):
+        filetask = FileTask.objects.get(pk=kwargs['pk'])
+        upload_id = request.POST.get('upload_id', '')
+        filename = request.POST.get('filename', '')
+        chunk = request.FILES.get('chunk')
+        try:
+            offset = int(request.POST.get('offset', ''))
+            total = int(request.POST.get('total', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Неверные параметры загрузки.'}, status=400)
+        if not UPLOAD_ID.match(upload_id) or chunk is None:
+            return JsonResponse({'error': 'Неверные параметры загрузки.'}, status=400)
+        error = check_extension(filetask, filename) or check_size(total)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+
+        size = append_chunk(request.user, upload_id, offset, chunk)
+        if size != offset + chunk.size:
+            # Часть не продолжает принятые данные: клиент продолжит с указанного смещения
+            return JsonResponse({'offset': size}, status=409)
+        if size < total:
+            return JsonResponse({'offset': size})
+        if size > total:
+            os.remove(partial_path(request.user, upload_id))
+            return JsonResponse({'error': 'Размер файла не совпадает с заявленным.'}, status=400)
+
+        result = ResultFile.objects.filter(filetask=filetask, user=request.user).first()
+        if result is None:
+            result = ResultFile(filetask=filetask, user=request.user)
+        complete_upload(result, request.user, upload_id, filename)
+        metrics.inc('submissions_total', kind='files')
+        messages.error(request, "Ответ сохранен")
+        return JsonResponse({'offset': size, 'redirect': reverse('lesson', kwargs={
+            'slug': filetask.lesson.discipline.course.slug, 'pk': filetask.lesson.id})})
 
 
 class GroupSPlan(DetailView):
@@ -903,44 +1077,35 @@ class GroupSPlan(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(GroupSPlan, self).get_context_data(**kwargs)
+        context['rows'] = PlanGrid(context['group']).rows(self.request.user)
         return context
 
     def post(self, request, **kwargs):
-        data = dict(request.POST)
-        del data['table_length']
-        del data['csrfmiddlewaretoken']
         group = Group.objects.get(pk=kwargs['pk'])
-        for key, dt in data.items():
-            if key.isalnum():
-                curr_datetime = self.get_date(dt[0])
-                lesson = Lesson.objects.get(pk=key)
-                lesson_plan, created = LessonPlan.objects.get_or_create(group=group, lesson=lesson)
-                lesson_plan.start = curr_datetime
-                lesson_plan.save()
-            else:
-                curr_datetime = self.get_date(dt[0])
-                info_datetime = key.split("_")
-                if info_datetime[0] == 'test':
-                    task = Test.objects.get(pk=info_datetime[2])
-                    task_plan, created = TestPlan.objects.get_or_create(test=task, lessonplan=task.lesson.get_plan(group))
-                elif info_datetime[0] == 'file':
-                    task = FileTask.objects.get(pk=info_datetime[2])
-                    task_plan, created = FilePlan.objects.get_or_create(file=task, lessonplan=task.lesson.get_plan(group))
-
-                if info_datetime[1] == "start":
-                    task_plan.start = curr_datetime
-                elif info_datetime[1] == "end":
-                    task_plan.end = curr_datetime
-                task_plan.check_datetimes()
-                task_plan.save()
-
+        summary = apply_schedule(group, request.POST)
+        messages.info(request, "Расписание сохранено. Занятий добавлено: {0}, изменено: {1}. "
+                               "Заданий добавлено: {2}, изменено: {3}.".format(*summary))
         return redirect('group_plan', pk=kwargs['pk'])
 
-    def get_date(self, string):
-        try:
-            return make_aware(datetime.datetime.strptime(string, '%Y-%m-%d %H:%M'))
-        except ValueError:
-            return None
+
+class GroupExportView(View):
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return redirect('settings_groups')
+        group = Group.objects.select_related('course').get(pk=kwargs['pk'])
+        return export_response(gradebook_rows(group), slugify(str(group)) or 'gradebook',
+                               request.GET.get('format'), group.name)
+
+    def post(self, request, *args, **kwargs):
+        # Выгрузка в фоне: файл готовит обработчик run_jobs
+        if not request.user.is_staff:
+            return redirect('settings_groups')
+        Job.enqueue('export_gradebook', {'group_id': kwargs['pk'], 'fmt': request.POST.get('format')},
+                    user=request.user)
+        messages.info(request, 'Выгрузка ведомости поставлена в очередь.')
+        return redirect('settings_jobs')
+
 
 class GroupStatistics(DetailView):
     model = Group
@@ -948,6 +1113,6 @@ class GroupStatistics(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(GroupStatistics, self).get_context_data(**kwargs)
-
+        context['rows'] = ProgressMatrix(context['group']).rows()
         return context
 
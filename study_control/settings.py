@@ -34,12 +34,14 @@ INSTALLED_APPS = [
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
+    'control.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'control.middleware.ProfilerMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -90,6 +92,14 @@ DATABASES = {
 
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'study_control',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -160,8 +170,93 @@ TINYMCE_DEFAULT_CONFIG = {
 
 LOGIN_URL = '/login'
 
+# Максимальный размер файла решения, Мб
 MAX_FILE_SIZE = 5
 
+# Размер части файла при загрузке решения частями, байт
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Незавершенная загрузка, не получавшая частей дольше этого времени, удаляется обработчиком run_jobs, сек.
+UPLOAD_PARTIAL_TTL = 24 * 60 * 60
+
+# Время хранения подготовленных вопросов теста в кеше, сек.
+TEST_PAYLOAD_TIMEOUT = 60 * 60
+
+# Допустимое опоздание отправки теста после истечения времени, сек.
+TEST_DEADLINE_GRACE = 30
+
+# Время хранения структуры курса для учащихся группы в кеше, сек.
+COURSE_OUTLINE_TIMEOUT = 60 * 60 * 24
+
+# Время хранения списка курсов главной страницы в кеше, сек.
+CATALOGUE_TIMEOUT = 60 * 60
+
+# Размеры уменьшенных копий изображений курсов (ширина, высота) и качество сжатия
+RENDITION_SIZES = {
+    'card': (400, 300),
+    'preview': (200, 150),
+}
+RENDITION_QUALITY = 80
+# Пауза перед повторной попыткой создать копии, если изображение не удалось обработать, сек.
+RENDITION_RETRY = 60 * 60
+
+# Как часто процесс заново проверяет наличие полнотекстового индекса поиска, сек.
+# (после build_search_index процессы переходят на индекс без перезапуска)
+SEARCH_INDEX_RECHECK = 5 * 60
+
+# Допустимое число SQL-запросов на один запрос к представлению (имя URL).
+# Превышение пишется в лог control.budget и проверяется тестами control/tests.py.
+# Значения - замер на тестовых данных (QueryBudgetTestCase) с запасом в 2 запроса.
+QUERY_BUDGETS = {
+    'index': 8,
+    'course': 12,
+    'lesson': 12,
+    'test': 15,
+    'search': 7,
+    'test_results': 5,
+    'file_results': 6,
+    'group_plan': 13,
+    'group_statistics': 16,
+    'settings_table': 8,
+}
+
+# Показатели для Prometheus (адрес metrics): каталог, в который процессы сервера
+# записывают свои счетчики, и период записи, сек.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+# Файлы завершившихся процессов удаляются при чтении; без проверки процесса (не POSIX)
+# и для временных файлов - по времени последнего обновления, сек.
+METRICS_TTL = 60 * 60
+# Границы корзин гистограмм времени обработки запроса, сек., и числа SQL-запросов на запрос
+METRICS_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+# Токен для сборщика показателей (заголовок Authorization: Bearer <токен>);
+# без него показатели доступны только сотрудникам
+METRICS_TOKEN = None
+
+# Профилирование запроса сотрудником: адрес страницы с параметром ?profile=1.
+# Профили (.prof и SQL-запросы) хранятся в PROFILE_DIR, не больше PROFILE_KEEP последних.
+PROFILE_PARAMETER = 'profile'
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_KEEP = 50
+PROFILE_TOP_FUNCTIONS = 40
+
+# Фоновые задачи (control.jobs). В продакшене обязателен запущенный обработчик - команда run_jobs:
+# без него не выполняются удаление курсов, выгрузки в фоне и закрытие просроченных попыток тестов.
+# JOBS_EAGER - выполнять задачу сразу при постановке, без обработчика (для разработки и тестов).
+JOBS_EAGER = False
+# Число одновременно выполняемых задач и пауза между опросами очереди, сек.
+JOBS_CONCURRENCY = 4
+JOBS_POLL_INTERVAL = 1
+# Попытки выполнения и пауза перед первым повтором, сек. (удваивается с каждой попыткой)
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 30
+# Задача без отклика обработчика дольше этого времени, сек., возвращается в очередь
+JOBS_TIMEOUT = 5 * 60
+# Сколько секунд после успешного выполнения ключ идемпотентности возвращает ту же задачу
+JOBS_KEY_TTL = 10 * 60
+# Файлы, созданные задачами (выгрузки); отдаются только поставившему задачу
+JOBS_FILES_DIR = os.path.join(BASE_DIR, 'job_files')
+
 FILE_CHOISE_EXTENSIONS = (
     ('1', "Все типы файлов"),
     ('2', "Изображения"),
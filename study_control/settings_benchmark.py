@@ -0,0 +1,9 @@
+from study_control.settings import *
+
+# Настройки для manage.py benchmark: замеры на SQLite, независимо от настроек MySQL
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'benchmark.sqlite3'),
+    }
+}